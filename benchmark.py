@@ -0,0 +1,154 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+import pandas as pd
+from modules.synthetic_pbip import SyntheticPbipGenerator, SIZE_TIERS
+from modules.tmdl_parser import TmdlParser
+from modules.m_analyzer import MCodeAnalyzer
+from modules.dax_analyzer import DaxAnalyzer
+from modules.dax_graph import DaxDependencyGraph
+from modules.model_audit import build_audit_sheets
+from modules.report_logic import PBIPReport
+from modules.usage_integrator import UsageIntegrator
+from modules.excel_manager import ExcelManager
+
+# ==============================================================================
+# CONFIGURACIÓN
+# ==============================================================================
+# Escalas a medir (ver SIZE_TIERS en modules/synthetic_pbip.py)
+TIERS = ["pequeno", "mediano"]
+# Repeticiones por etapa: se guarda el mejor tiempo (el menos afectado por ruido)
+REPEAT = 3
+BASELINE_FILE = "benchmark_baseline.json"
+# Una etapa es regresión si tarda más de BASELINE * REGRESSION_FACTOR y la diferencia supera MIN_DELTA_S
+REGRESSION_FACTOR = 1.25
+MIN_DELTA_S = 0.05
+SEED = 0
+
+
+def _quiet(fn):
+    """Ejecuta fn sin la salida por consola de los módulos (prints de progreso)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+
+def _best_of(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = _quiet(fn)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _analyze_m(model):
+    m_analyzer = MCodeAnalyzer(model)
+    for name, table in model.tables.items():
+        _, _, steps, code = m_analyzer.resolve_source_info(table["m_code"], name)
+        m_analyzer.resolve_lineage(name)
+        for col in table["columns"]: m_analyzer.trace_column(col, steps, code)
+
+
+def _analyze_dax(model):
+    analyzer = DaxAnalyzer(model.global_objects, model.tables, model.measures)
+    for measure in model.measures.values(): analyzer.get_dependencies(measure["expression"])
+    return analyzer
+
+
+def run_tier(tier, work_dir, repeat):
+    """Genera el PBIP sintético de una escala y mide cada etapa. Devuelve {etapa: segundos}."""
+    spec = SIZE_TIERS[tier]
+    tier_dir = os.path.join(work_dir, tier)
+    if os.path.exists(tier_dir): shutil.rmtree(tier_dir)
+    start = time.perf_counter()
+    paths = SyntheticPbipGenerator(seed=SEED, **spec).write(tier_dir)
+    timings = {"generar_pbip": time.perf_counter() - start}
+
+    def parse():
+        model = TmdlParser(paths["model"]); model.parse_model(jobs=1)
+        return model
+    timings["parse_model"], model = _best_of(parse, repeat)
+    timings["m_analyzer"], _ = _best_of(lambda: _analyze_m(model), repeat)
+    timings["dax_analyzer"], dax = _best_of(lambda: _analyze_dax(model), repeat)
+    timings["dax_grafo"], _ = _best_of(lambda: DaxDependencyGraph(model.measures, dax), repeat)
+    timings["auditoria_modelo"], sheets = _best_of(lambda: build_audit_sheets(model), repeat)
+    timings["informe_pbir"], rows = _best_of(lambda: PBIPReport(paths["pbir"]).run(), repeat)
+    timings["informe_legacy"], _ = _best_of(lambda: PBIPReport(paths["legacy"]).run(), repeat)
+    df_visuals = pd.DataFrame(rows)
+    timings["usage_integrator"], _ = _best_of(lambda: UsageIntegrator(df_visuals, model).generate_inventory_sheet(), repeat)
+    excel_path = os.path.join(tier_dir, "benchmark.xlsx")
+    timings["escritura_excel"], _ = _best_of(lambda: ExcelManager(excel_path).write_sheets(sheets), repeat)
+    sizes = {"tablas": len(model.tables), "medidas": len(model.measures),
+             "columnas": len(model.column_index), "filas_visuales": len(rows)}
+    return {name: round(seconds, 4) for name, seconds in timings.items()}, sizes
+
+
+def compare(results, baseline):
+    """Lista de regresiones (escala, etapa, base, actual) respecto al baseline guardado."""
+    regressions = []
+    for tier, data in results["escalas"].items():
+        base_tier = baseline.get("escalas", {}).get(tier)
+        if not base_tier: continue
+        for stage, seconds in data["etapas"].items():
+            base = base_tier["etapas"].get(stage)
+            if base is None or stage == "generar_pbip": continue
+            if seconds > base * REGRESSION_FACTOR and seconds - base > MIN_DELTA_S:
+                regressions.append((tier, stage, base, seconds))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de las etapas del analizador sobre PBIP sintéticos")
+    parser.add_argument("--tiers", nargs="+", choices=list(SIZE_TIERS), default=TIERS, help="Escalas a medir")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Repeticiones por etapa (se guarda la mejor)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Archivo JSON de referencia")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como nuevo baseline")
+    parser.add_argument("--output", help="Guardar también los resultados de esta ejecución en JSON")
+    parser.add_argument("--workdir", help="Carpeta donde generar los PBIP (por defecto, una temporal que se borra)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    work_dir = args.workdir or tempfile.mkdtemp(prefix="pbip_bench_")
+    results = {"fecha": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+               "plataforma": platform.platform(), "repeticiones": args.repeat, "escalas": {}}
+    try:
+        for tier in args.tiers:
+            print(f"--- Escala '{tier}' {SIZE_TIERS[tier]} ---")
+            timings, sizes = run_tier(tier, work_dir, args.repeat)
+            results["escalas"][tier] = {"tamano": sizes, "etapas": timings}
+            for stage, seconds in timings.items(): print(f"  {stage:<20} {seconds:>9.3f} s")
+    finally:
+        if not args.workdir: shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f: json.dump(results, f, ensure_ascii=False, indent=2)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f: baseline = json.load(f)
+        regressions = compare(results, baseline)
+        if regressions:
+            print(f"REGRESIONES respecto a {args.baseline} (umbral x{REGRESSION_FACTOR}, mínimo {MIN_DELTA_S} s):")
+            for tier, stage, base, seconds in regressions:
+                print(f"  [{tier}] {stage}: {base:.3f} s -> {seconds:.3f} s (x{seconds / base:.2f})")
+        else:
+            print(f"Sin regresiones respecto a {args.baseline}.")
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f: json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Baseline guardado en: {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
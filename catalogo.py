@@ -0,0 +1,53 @@
+import argparse
+import pandas as pd
+from modules.audit_catalog import AuditCatalog, DEFAULT_CATALOG_PATH
+
+# ==============================================================================
+# CONFIGURACIÓN
+# ==============================================================================
+# Catálogo que rellenan main.py --catalog y objetos_visuales.py --catalog
+CATALOG_PATH = DEFAULT_CATALOG_PATH
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas sobre el catálogo histórico de auditorías (SQLite)")
+    parser.add_argument("--db", default=CATALOG_PATH, help="Archivo SQLite del catálogo")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("ejecuciones", help="Ejecuciones registradas")
+    p.add_argument("--modelo")
+    p = sub.add_parser("historial", help="Versiones de un objeto ('Tabla[Columna]', medida, tabla...)")
+    p.add_argument("nombre"); p.add_argument("--tipo"); p.add_argument("--modelo")
+    p.add_argument("--atributos", action="store_true", help="Mostrar los atributos de cada versión")
+    p = sub.add_parser("sin-uso-desde", help="Desde qué ejecución una columna no se usa en ninguna medida")
+    p.add_argument("columna", help="'Tabla[Columna]'"); p.add_argument("--modelo")
+    p = sub.add_parser("parametro", help="Modelos que usan un parámetro y en qué consultas")
+    p.add_argument("nombre")
+    p = sub.add_parser("dependientes", help="Medidas que dependen de una medida, columna ('Tabla[Columna]') o tabla ('Tabla: X')")
+    p.add_argument("nombre")
+    p = sub.add_parser("cambios", help="Objetos nuevos, modificados o eliminados en una ejecución")
+    p.add_argument("modelo"); p.add_argument("--run", type=int, help="Ejecución (por defecto, la última del modelo)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    catalog = AuditCatalog(args.db)
+    try:
+        if args.command == "ejecuciones": df = catalog.runs(args.modelo)
+        elif args.command == "historial":
+            df = catalog.history(args.nombre, args.tipo, args.modelo)
+            if not args.atributos: df = df.drop(columns="attrs")
+        elif args.command == "sin-uso-desde": df = catalog.unused_since(args.columna, args.modelo)
+        elif args.command == "parametro": df = catalog.parameter_users(args.nombre)
+        elif args.command == "dependientes": df = catalog.dependents(args.nombre)
+        else: df = catalog.changes(args.modelo, args.run)
+    finally:
+        catalog.close()
+    if df.empty: print("Sin resultados.")
+    else:
+        with pd.option_context("display.max_rows", None, "display.max_colwidth", 120, "display.width", 200):
+            print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
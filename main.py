@@ -1,113 +1,186 @@
+import argparse
+import os
 import pandas as pd
-from modules.tmdl_parser import TmdlParser, OriginType
-from modules.m_analyzer import MCodeAnalyzer
-from modules.dax_analyzer import DaxAnalyzer
+from modules.tmdl_parser import TmdlParser
+from modules.model_audit import AuditMemo, build_audit_sheets
+from modules.batch_audit import BatchAudit
+from modules.model_diff import ModelDiff
+from modules.git_history import GitHistoryAudit, GitError, HISTORY_COLUMNS, HISTORY_SHEET, repo_location
 from modules.excel_manager import ExcelManager
+from modules.output_sinks import OUTPUT_FORMATS, missing_dependency
+from modules.audit_catalog import AuditCatalog, catalog_objects, DEFAULT_CATALOG_PATH
+from modules.parse_cache import ParseCache, DEFAULT_CACHE_DIR
+from modules.metrics import metrics, add_metrics_arguments, enable_from_args
+from modules.watch import FolderPoller, IncrementalModel, SheetRefresher, POLL_INTERVAL, watch
 
 # ==============================================================================
 # CONFIGURACIÓN
 # ==============================================================================
 ROOT_FOLDER = r"C:\Ruta\A\Tu\Modelo.SemanticModel\definition"
 OUTPUT_EXCEL = "AUDITORIA_MODELO_OBS.xlsx"
+# Procesos para parsear los archivos TMDL (1 = serie). Los modelos pequeños se parsean siempre en serie.
+PARSE_JOBS = os.cpu_count() or 1
+# Caché persistente de parseo (compartida con objetos_visuales.py). Desactivable con --no-cache
+USE_CACHE = True
+CACHE_DIR = DEFAULT_CACHE_DIR
+# Modo lote (--batch): carpeta raíz con muchos *.SemanticModel y formato de salida
+BATCH_OUTPUT_MODE = "combined"   # "combined" (un libro con columna Modelo) o "per-model"
+BATCH_OUTPUT_DIR = "AUDITORIAS_LOTE"
+# Formato de salida: "xlsx" (un libro), "csv" o "parquet" (carpeta con un archivo por hoja; parquet requiere pyarrow)
+OUTPUT_FORMAT = "xlsx"
+# Catálogo SQLite con el historial de auditorías (None = no registrar; activable con --catalog)
+CATALOG_PATH = None
+# Modo --diff: informe de cambios entre dos versiones del modelo
+DIFF_OUTPUT = "CAMBIOS_MODELO.xlsx"
+# Modo --history: métricas por commit leyendo el modelo (y el informe, si se indica) del repositorio git
+HISTORY_OUTPUT = "HISTORIAL_MODELO.xlsx"
+HISTORY_REPORT = None   # carpeta *.Report del mismo repositorio (opcional)
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Auditoría de modelo semántico (TMDL + M + DAX)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignorar la caché de parseo y reparsear todo el modelo")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Carpeta de la caché de parseo")
+    parser.add_argument("--batch", metavar="RAIZ", help="Auditar todos los modelos semánticos bajo esta carpeta")
+    parser.add_argument("--batch-output", choices=["combined", "per-model"], default=BATCH_OUTPUT_MODE,
+                        help="Modo lote: un libro combinado o un libro por modelo")
+    parser.add_argument("--output", help="Archivo de salida (o carpeta en modo lote 'per-model')")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help="Formato de salida: libro xlsx, o carpeta con un csv/parquet por hoja")
+    parser.add_argument("--catalog", nargs="?", const=DEFAULT_CATALOG_PATH, default=CATALOG_PATH, metavar="SQLITE",
+                        help="Registrar la ejecución en el catálogo histórico (consultas con catalogo.py)")
+    parser.add_argument("--watch", nargs="?", type=float, const=POLL_INTERVAL, metavar="SEGUNDOS",
+                        help="Mantener el modelo en memoria y regenerar la salida con cada cambio en la carpeta (Ctrl+C para salir)")
+    parser.add_argument("--diff", nargs=2, metavar=("ANTERIOR", "NUEVO"),
+                        help="Comparar dos carpetas definition del modelo y escribir el informe de cambios")
+    parser.add_argument("--history", nargs="?", const="HEAD", metavar="REVISION",
+                        help="Métricas por commit del modelo desde el historial git (sin checkout); por defecto HEAD")
+    parser.add_argument("--max-commits", type=int, help="Modo historial: solo los N commits más recientes")
+    parser.add_argument("--history-report", default=HISTORY_REPORT, metavar="RUTA",
+                        help="Modo historial: carpeta *.Report del mismo repositorio para añadir métricas de visuales")
+    parser.add_argument("--jobs", type=int, default=PARSE_JOBS, help="Procesos para parseo y auditoría")
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+def run_batch(args, cache):
+    batch = BatchAudit(args.batch, jobs=args.jobs, cache=cache, catalog=bool(args.catalog))
+    results = batch.run()
+    if args.catalog:
+        catalog = AuditCatalog(args.catalog)
+        try:
+            for name, definition in batch.models:
+                if name in batch.catalog_objects:
+                    catalog.record_run(name, batch.catalog_objects[name], source=definition, script="main.py --batch")
+        finally:
+            catalog.close()
+    if args.batch_output == "combined":
+        batch.write_combined(results, args.output or OUTPUT_EXCEL, args.format)
+    else:
+        batch.write_per_model(results, args.output or BATCH_OUTPUT_DIR, os.path.basename(OUTPUT_EXCEL), args.format)
+    failed = [r["Modelo"] for r in batch.summary if r["Estado"] != "OK"]
+    print(f"Lote terminado: {len(batch.summary) - len(failed)} modelos OK, {len(failed)} con errores {failed if failed else ''}")
+
+def run_watch(args, cache):
+    """Modo vigilancia: cada cambio reparsea solo los archivos TMDL tocados y recalcula lo que depende de ellos."""
+    model = IncrementalModel(ROOT_FOLDER, jobs=args.jobs, cache=cache)
+    try: model.load()
+    finally:
+        if cache is not None: cache.close()
+    memo = AuditMemo()
+    refresher = SheetRefresher(args.output or OUTPUT_EXCEL, args.format)
+
+    def refresh(changed=None):
+        if changed is not None and not model.refresh(changed): return
+        if not model.model.tables:
+            print("El modelo no tiene tablas; se espera al siguiente cambio."); return
+        sheets = build_audit_sheets(model.model, memo)
+        print(f"Recalculado: {memo.stats.get('tablas_m', 0)} tablas M, {memo.stats.get('expresiones_dax', 0)} expresiones DAX, "
+              f"{memo.stats.get('medidas_uso', 0)} medidas en el uso de columnas.")
+        refresher.write(sheets)
+
+    refresh()
+    watch(FolderPoller([ROOT_FOLDER]), refresh, args.watch)
+
+def run_diff(args, cache):
+    """Modo diff: solo se leen y parsean los archivos que difieren entre las dos versiones."""
+    old_root, new_root = args.diff
+    for root in (old_root, new_root):
+        if not os.path.isdir(root):
+            print(f"ERROR: La ruta no existe: {root}"); return
+    diff = ModelDiff(old_root, new_root, cache)
+    with metrics.stage("diff"): diff.run()
+    if diff.changes: print(diff.report())
+    with metrics.stage("escritura_excel"): ExcelManager(args.output or DIFF_OUTPUT, args.format).write_sheets(diff.sheets())
+
+def run_history(args, cache):
+    """Modo historial: árboles y blobs se leen con un único 'git cat-file --batch'; el parseo se reutiliza por SHA de blob."""
+    try:
+        repo, model_path = repo_location(ROOT_FOLDER)
+        report_path = None
+        if args.history_report:
+            report_repo, report_path = repo_location(args.history_report)
+            if os.path.realpath(report_repo) != os.path.realpath(repo):
+                print(f"ERROR: El informe no está en el mismo repositorio que el modelo ({report_repo})."); return
+        history = GitHistoryAudit(repo, model_path, report_path, args.history, args.max_commits, cache)
+        rows = history.run()
+    except GitError as e:
+        print(f"ERROR: {e}"); return
+    with metrics.stage("escritura_excel"):
+        ExcelManager(args.output or HISTORY_OUTPUT, args.format).write_sheets({HISTORY_SHEET: pd.DataFrame(rows, columns=HISTORY_COLUMNS)})
+
+def main(argv=None):
+    args = parse_args(argv)
+    missing = missing_dependency(args.format)
+    if missing: print(f"ERROR: {missing}"); return
+    enable_from_args(args, script="main.py", jobs=args.jobs, cache=USE_CACHE and not args.no_cache)
+    try: run(args)
+    finally: metrics.finish(args.metrics)
+
+def run(args):
+    cache = ParseCache(args.cache_dir) if USE_CACHE and not args.no_cache else None
+    if args.diff:
+        try: run_diff(args, cache)
+        finally:
+            if cache is not None: cache.close()
+        return
     print("--- Iniciando Auditoría Avanzada (TMDL + M + DAX) ---")
+    if args.batch:
+        try:
+            with metrics.stage("lote"): run_batch(args, cache)
+        finally:
+            if cache is not None: cache.close()
+        return
+
+    if args.watch is not None:
+        run_watch(args, cache)
+        return
+
+    if args.history:
+        try:
+            with metrics.stage("historial"): run_history(args, cache)
+        finally:
+            if cache is not None: cache.close()
+        return
+
     model = TmdlParser(ROOT_FOLDER)
-    model.parse_model()
+    try:
+        with metrics.stage("parseo_modelo"): model.parse_model(jobs=args.jobs, cache=cache)
+    finally:
+        if cache is not None:
+            metrics.count("cache.aciertos", cache.hits); metrics.count("cache.fallos", cache.misses)
+            cache.close()
     if not model.tables: return
 
-    dax_analyzer = DaxAnalyzer(model.global_objects, model.tables, model.measures)
-    m_analyzer = MCodeAnalyzer(model)
-    
-    print("Generando reportes...")
-    df_relaciones = pd.DataFrame(model.relationships)
-    
-    # --- FORZAR ORDEN DE COLUMNAS EN RELACIONES ---
-    if not df_relaciones.empty:
-        cols_order = ["Tabla Origen", "Columna Origen", "Columna Destino", "Tabla Destino", "Tipo Relacion", "Activo?"]
-        # Asegurar que solo seleccionamos columnas que existen
-        cols_to_select = [c for c in cols_order if c in df_relaciones.columns]
-        df_relaciones = df_relaciones[cols_to_select]
-
-    rows_m = []
-    table_id = 0
-    for tbl_name, data in model.tables.items():
-        table_id += 1
-        m_code = data["m_code"]
-        tbl_type, tbl_path, steps, resolved_code = m_analyzer.resolve_source_info(m_code)
-        
-        for col in data["columns"]:
-            trans_desc, col_type = m_analyzer.trace_column(col, steps, resolved_code)
-            final_path = tbl_path; final_type = tbl_type
-            
-            if col_type == "Transformación": final_type = "Transformación (Power Query)"
-            elif col_type == "Expand":
-                final_type = "Join/Expand"
-                if "Expandido de:" in trans_desc: final_path = trans_desc.replace("Expandido de: ", "")
-                else: final_path = "Tabla Relacionada"
-            
-            if not m_code: final_type = "DAX / Interno"; trans_desc = "Columna Calculada o Estática"
-
-            rows_m.append({
-                "Nombre Tabla": tbl_name, "Nombre Columna": col, "Transformacion": trans_desc,
-                "Origen": final_path, "Tipo_Origen": final_type, "Color_ID": table_id
-            })
-            
-    df_transf_m = pd.DataFrame(rows_m)
-    if not df_transf_m.empty:
-        df_transf_m = df_transf_m[["Nombre Tabla", "Nombre Columna", "Transformacion", "Origen", "Tipo_Origen", "Color_ID"]]
-    
-    rows_deps = []
-    for m_name, m_data in model.measures.items():
-        deps = dax_analyzer.get_dependencies(m_data["expression"])
-        if not deps: rows_deps.append({"Medida": m_name, "Tabla Home": m_data["home_table"], "Dependencia": "Hardcoded", "Tipo Origen": "N/A", "Expresion": m_data["expression"][:100]})
-        for dn, dt in deps: rows_deps.append({"Medida": m_name, "Tabla Home": m_data["home_table"], "Dependencia": dn, "Tipo Origen": dt.value, "Expresion": m_data["expression"][:5000]})
-    df_deps = pd.DataFrame(rows_deps)
-    
-    # REPORTE PIVOT_LONGER
-    col_usage_map = {} 
-    if not df_deps.empty:
-        deps_cols = df_deps[df_deps["Tipo Origen"] == OriginType.COLUMN.value]
-        for _, row in deps_cols.iterrows():
-            col_name_full = row["Dependencia"]
-            measure_name = row["Medida"]
-            if col_name_full not in col_usage_map: col_usage_map[col_name_full] = set()
-            col_usage_map[col_name_full].add(measure_name)
-
-    rows_usage = []
-    for t_name, t_data in model.tables.items():
-        for c_name in t_data["columns"]:
-            full_name = f"{t_name}[{c_name}]"
-            if full_name in col_usage_map and col_usage_map[full_name]:
-                sorted_measures = sorted(list(col_usage_map[full_name]))
-                for m_use in sorted_measures:
-                    rows_usage.append({"Tabla": t_name, "Columna": c_name, "Estado Uso": "Usada", "Medida": m_use})
-            else:
-                rows_usage.append({"Tabla": t_name, "Columna": c_name, "Estado Uso": "No usada en medida", "Medida": ""})
-    
-    df_used = pd.DataFrame(rows_usage)
-
-    # Inventario
-    rows_inv = []
-    for t, data in model.tables.items():
-        rows_inv.append({"Tabla Pertenencia": t,"Nombre": t, "Tipo": "Tabla", "Expresion": data["m_code"][:5000] if data["m_code"] else ""})
-        for c in data["columns"]:
-            rows_inv.append({ "Tabla Pertenencia": t,"Nombre": c,  "Tipo": "Columna","Expresion": ""})
-    for m, data in model.measures.items():
-        rows_inv.append({"Tabla Pertenencia": data["home_table"],"Nombre": m,"Tipo": "Medida", "Expresion": data["expression"][:5000]})
-    
-    df_inv = pd.DataFrame(rows_inv)
-
-    # Escritura Excel
-    excel_mgr = ExcelManager(OUTPUT_EXCEL)
-    sheets = {
-        "Relaciones": df_relaciones,
-        "Transformaciones M": df_transf_m,
-        "Dependencias DAX": df_deps,
-        "Resumen Columnas Usadas": df_used,
-        "Inventario": df_inv
-    }
-    excel_mgr.write_sheets(sheets)
+    with metrics.stage("auditoria"): sheets = build_audit_sheets(model)
+
+    if args.catalog:
+        model_name = os.path.basename(os.path.dirname(os.path.normpath(ROOT_FOLDER))).replace(".SemanticModel", "")
+        catalog = AuditCatalog(args.catalog)
+        try: catalog.record_run(model_name, catalog_objects(sheets, model), source=ROOT_FOLDER, script="main.py")
+        finally: catalog.close()
+
+    # Escritura (Excel por defecto)
+    excel_mgr = ExcelManager(args.output or OUTPUT_EXCEL, args.format)
+    with metrics.stage("escritura_excel"): excel_mgr.write_sheets(sheets)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from .m_analyzer import ParameterSubstitutor
+from .metrics import metrics
+
+DEFAULT_CATALOG_PATH = "catalogo_auditoria.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY, model TEXT NOT NULL, started TEXT NOT NULL,
+    source TEXT, script TEXT, objects INTEGER, changed INTEGER, removed INTEGER);
+CREATE INDEX IF NOT EXISTS ix_runs_model ON runs(model, run_id);
+CREATE TABLE IF NOT EXISTS objects (
+    object_id INTEGER PRIMARY KEY, model TEXT NOT NULL, kind TEXT NOT NULL,
+    owner TEXT NOT NULL, name TEXT NOT NULL,
+    UNIQUE (model, kind, owner, name));
+CREATE INDEX IF NOT EXISTS ix_objects_name ON objects(kind, name);
+CREATE TABLE IF NOT EXISTS states (
+    object_id INTEGER NOT NULL REFERENCES objects(object_id), digest TEXT NOT NULL, attrs TEXT NOT NULL,
+    first_run INTEGER NOT NULL, last_run INTEGER NOT NULL,
+    PRIMARY KEY (object_id, first_run));
+CREATE INDEX IF NOT EXISTS ix_states_last_run ON states(last_run);
+-- Estado vigente: el visto en la última ejecución de su modelo
+CREATE VIEW IF NOT EXISTS current_states AS
+    SELECT o.model, o.kind, o.owner, o.name, s.attrs, s.first_run, s.last_run
+    FROM states s JOIN objects o USING (object_id)
+    WHERE s.last_run = (SELECT MAX(r.run_id) FROM runs r WHERE r.model = o.model);
+"""
+
+RX_QUALIFIED = re.compile(r"^(.*)\[(.*)\]$")
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and value != value): return None
+    return value
+
+
+def _rows(df, columns):
+    """Filas de df (solo las columnas pedidas) como tuplas de tipos Python; NaN -> None."""
+    if df is None or df.empty or any(c not in df.columns for c in columns): return []
+    return [tuple(_clean(v) for v in row) for row in zip(*(df[c].tolist() for c in columns))]
+
+
+def catalog_objects(sheets, model=None):
+    """
+    Objetos de una ejecución para el catálogo: {(tipo, propietario, nombre): atributos}.
+    Salen de las hojas de la auditoría de modelo (main.py) o de la de visuales (objetos_visuales.py);
+    con el modelo parseado se añaden además los parámetros y las consultas que los usan.
+    """
+    objects = {}
+    def add(kind, owner, name, **attrs): objects.setdefault((kind, owner or "", name or ""), {}).update(attrs)
+
+    for owner, name, kind, expr in _rows(sheets.get("Inventario"), ["Tabla Pertenencia", "Nombre", "Tipo", "Expresion"]):
+        add(kind.lower(), "" if kind == "Tabla" else owner, name, expresion=expr or "")
+    for table, col, trans, origin, origin_type, lineage in _rows(sheets.get("Transformaciones M"), [
+            "Nombre Tabla", "Nombre Columna", "Transformacion", "Origen", "Tipo_Origen", "Linaje Consultas"]):
+        add("columna", table, col, transformacion=trans, origen=origin, tipo_origen=origin_type, linaje=lineage or "")
+    # Uso en medidas: las directas por nombre y las indirectas solo contadas (si no, cualquier cambio
+    # en una medida base crearía una versión nueva de todas las columnas que alcanza)
+    usage = {}
+    for table, col, measure, use in _rows(sheets.get("Resumen Columnas Usadas"), ["Tabla", "Columna", "Medida", "Tipo Uso"]):
+        direct, indirect = usage.setdefault((table, col), ([], [0]))
+        if use == "Directa": direct.append(measure)
+        elif use == "Indirecta": indirect[0] += 1
+    for (table, col), (direct, indirect) in usage.items():
+        add("columna", table, col, usada=bool(direct or indirect[0]), medidas_directas=direct, medidas_indirectas=indirect[0])
+    for measure, dep, dep_type in _rows(sheets.get("Dependencias DAX"), ["Medida", "Dependencia", "Tipo Origen"]):
+        if dep != "Hardcoded": add("dependencia", measure, dep, tipo=dep_type)
+    for t1, c1, c2, t2, rel_type, active in _rows(sheets.get("Relaciones"), [
+            "Tabla Origen", "Columna Origen", "Columna Destino", "Tabla Destino", "Tipo Relacion", "Activo?"]):
+        add("relacion", t1, f"{t1}[{c1}] -> {t2}[{c2}]", tipo=rel_type, activa=active)
+
+    # Uso en visuales (objetos_visuales.py)
+    visual_uses = {}
+    for page, title, visual, value, value_type in _rows(sheets.get("Detalle Visuales"), [
+            "Nombre_Pag", "Titulo", "Objeto Visual", "Valor", "Tipo_Valor"]):
+        key = (page, f"{visual} | {title or ''} | {value}")
+        visual_uses.setdefault(key, [value_type, 0])[1] += 1
+    for (page, name), (value_type, times) in visual_uses.items(): add("uso_visual", page, name, tipo=value_type, veces=times)
+    for table, name, kind, count in _rows(sheets.get("Inventario y Uso"), ["Tabla", "Nombre Objeto", "Tipo", "Conteo Visuales"]):
+        add(kind.lower(), table, name, conteo_visuales=int(count or 0))
+
+    if model is not None and model.parameters:
+        substitutor = ParameterSubstitutor(model.parameters)
+        queries = {name: data["m_code"] for name, data in model.tables.items()}
+        queries.update(getattr(model, "expressions", {}))
+        users = {name: [] for name in model.parameters}
+        for query, code in queries.items():
+            for param in substitutor.apply(code or "")[1]: users[param].append(query)
+        for name, value in model.parameters.items(): add("parametro", "", name, valor=value, consultas=sorted(users[name]))
+    return objects
+
+
+class AuditCatalog:
+    """
+    Catálogo SQLite con el historial de las auditorías, para preguntas entre ejecuciones y modelos.
+    - runs: una fila por ejecución (modelo, fecha, origen).
+    - objects: identidad estable de cada objeto (modelo, tipo, propietario, nombre).
+    - states: versiones de cada objeto con su intervalo de validez [first_run, last_run]. Si un objeto
+      no cambia entre dos ejecuciones solo se alarga last_run, así que el catálogo crece con los
+      cambios y no con el número de ejecuciones.
+    Cada ejecución se inserta con executemany dentro de una única transacción.
+    """
+    def __init__(self, path=DEFAULT_CATALOG_PATH):
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ------------------------------------------------------------------
+    def record_run(self, model_name, objects, source=None, script=None, started=None):
+        """Registra una ejecución. objects: {(tipo, propietario, nombre): atributos} (ver catalog_objects)."""
+        started = started or datetime.now().isoformat(timespec="seconds")
+        states = {}
+        for key, attrs in objects.items():
+            text = json.dumps(attrs, ensure_ascii=False, sort_keys=True, default=str)
+            states[key] = (hashlib.sha1(text.encode("utf-8")).hexdigest(), text)
+
+        with metrics.stage("catalogo"), self.conn:
+            prev_run = self.conn.execute("SELECT MAX(run_id) FROM runs WHERE model=?", (model_name,)).fetchone()[0]
+            run_id = self.conn.execute("INSERT INTO runs (model, started, source, script) VALUES (?, ?, ?, ?)",
+                                       (model_name, started, source, script)).lastrowid
+            self.conn.executemany("INSERT OR IGNORE INTO objects (model, kind, owner, name) VALUES (?, ?, ?, ?)",
+                                  [(model_name,) + key for key in states])
+            ids = {(kind, owner, name): oid for oid, kind, owner, name in self.conn.execute(
+                "SELECT object_id, kind, owner, name FROM objects WHERE model=?", (model_name,))}
+            open_states = {}    # object_id -> (rowid, digest) de las versiones vistas en la ejecución anterior
+            if prev_run is not None:
+                open_states = {oid: (rowid, digest) for rowid, oid, digest in self.conn.execute(
+                    "SELECT rowid, object_id, digest FROM states WHERE last_run=?", (prev_run,))}
+
+            extend, insert = [], []
+            for key, (digest, text) in states.items():
+                oid = ids[key]
+                previous = open_states.get(oid)
+                if previous is not None and previous[1] == digest: extend.append((run_id, previous[0]))
+                else: insert.append((oid, digest, text, run_id, run_id))
+            # Por rowid: con 'last_run=?' SQLite elige el índice de last_run y recorre todas las versiones abiertas
+            self.conn.executemany("UPDATE states SET last_run=? WHERE rowid=?", extend)
+            self.conn.executemany("INSERT INTO states (object_id, digest, attrs, first_run, last_run) VALUES (?, ?, ?, ?, ?)", insert)
+            removed = len(set(open_states) - {ids[key] for key in states})
+            self.conn.execute("UPDATE runs SET objects=?, changed=?, removed=? WHERE run_id=?",
+                              (len(states), len(insert), removed, run_id))
+        metrics.count("catalogo.estados_nuevos", len(insert))
+        summary = {"run_id": run_id, "objetos": len(states), "sin_cambios": len(extend),
+                   "nuevos_o_cambiados": len(insert), "eliminados": removed}
+        print(f"Catálogo ({self.path}): ejecución {run_id} de '{model_name}': {len(insert)} objetos nuevos o "
+              f"cambiados, {len(extend)} sin cambios, {removed} eliminados.")
+        return summary
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def _query(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        return pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+
+    def runs(self, model=None):
+        sql = "SELECT run_id, model, started, source, script, objects, changed, removed FROM runs"
+        if model: return self._query(sql + " WHERE model=? ORDER BY run_id", (model,))
+        return self._query(sql + " ORDER BY run_id")
+
+    @staticmethod
+    def _split_name(name):
+        # 'Tabla[Columna]' -> ('Tabla', 'Columna'); un nombre suelto no filtra por propietario
+        match = RX_QUALIFIED.match(name)
+        return (match.group(1).strip("'"), match.group(2)) if match else (None, name)
+
+    def history(self, name, kind=None, model=None):
+        """Versiones de un objeto (o de todos los que se llamen así) con sus intervalos de validez."""
+        owner, short = self._split_name(name)
+        sql = """SELECT o.model, o.kind, o.owner, o.name, s.first_run, r1.started AS desde,
+                        s.last_run, r2.started AS hasta, s.attrs
+                 FROM objects o JOIN states s USING (object_id)
+                 JOIN runs r1 ON r1.run_id = s.first_run JOIN runs r2 ON r2.run_id = s.last_run
+                 WHERE o.name=?"""
+        params = [short]
+        for column, value in (("o.owner", owner), ("o.kind", kind), ("o.model", model)):
+            if value is not None: sql += f" AND {column}=?"; params.append(value)
+        return self._query(sql + " ORDER BY o.model, o.kind, o.owner, s.first_run", params)
+
+    def unused_since(self, column, model=None):
+        """
+        Para una columna 'Tabla[Columna]' sin uso en medidas en la última ejecución de cada modelo:
+        ejecución y fecha desde la que está sin usar (inicio del último tramo de versiones sin uso).
+        """
+        rows = []
+        for m, versions in self.history(column, kind="columna", model=model).groupby("model", sort=True):
+            last_model_run = self.conn.execute("SELECT MAX(run_id) FROM runs WHERE model=?", (m,)).fetchone()[0]
+            since = None
+            for version in versions.itertuples():
+                used = json.loads(version.attrs).get("usada")
+                if used is None: continue
+                if used: since = None
+                elif since is None: since = version
+            current = versions["last_run"].max() == last_model_run
+            if since is not None and current:
+                rows.append({"model": m, "columna": column, "sin_uso_desde_run": since.first_run, "fecha": since.desde})
+            else:
+                rows.append({"model": m, "columna": column, "sin_uso_desde_run": None,
+                             "fecha": "En uso" if current else "Ya no existe en el modelo"})
+        return pd.DataFrame(rows)
+
+    def parameter_users(self, name):
+        """Modelos cuya última ejecución tiene el parámetro 'name', con su valor y las consultas que lo usan."""
+        df = self._query("SELECT model, attrs FROM current_states WHERE kind='parametro' AND name=? ORDER BY model", (name,))
+        attrs = [json.loads(a) for a in df.pop("attrs")]
+        df["valor"] = [a.get("valor") for a in attrs]
+        df["consultas"] = [", ".join(a.get("consultas", [])) for a in attrs]
+        return df
+
+    def dependents(self, name):
+        """Medidas que dependen directamente de 'name' (medida, 'Tabla[Columna]' o 'Tabla: X') en la última ejecución."""
+        owner, short = self._split_name(name)
+        if owner is not None: name = f"{owner}[{short}]"
+        return self._query("""SELECT model, owner AS medida, json_extract(attrs, '$.tipo') AS tipo FROM current_states
+                              WHERE kind='dependencia' AND name=? ORDER BY model, owner""", (name,))
+
+    def changes(self, model, run_id=None):
+        """Objetos añadidos, modificados o eliminados en una ejecución (por defecto, la última) de un modelo."""
+        runs = [r for (r,) in self.conn.execute("SELECT run_id FROM runs WHERE model=? ORDER BY run_id", (model,))]
+        if not runs: return pd.DataFrame()
+        run_id = run_id or runs[-1]
+        prev = max((r for r in runs if r < run_id), default=None)
+        changed = self._query("""
+            SELECT o.kind, o.owner, o.name,
+                   CASE WHEN EXISTS (SELECT 1 FROM states p WHERE p.object_id = s.object_id AND p.first_run < s.first_run)
+                        THEN 'Modificado' ELSE 'Nuevo' END AS cambio
+            FROM states s JOIN objects o USING (object_id) WHERE s.first_run=? AND o.model=?""", (run_id, model))
+        if prev is None: return changed
+        removed = self._query("""
+            SELECT o.kind, o.owner, o.name, 'Eliminado' AS cambio
+            FROM states s JOIN objects o USING (object_id)
+            WHERE s.last_run=? AND o.model=?
+              AND NOT EXISTS (SELECT 1 FROM states n WHERE n.object_id = s.object_id AND n.first_run=?)""",
+            (prev, model, run_id))
+        return pd.concat([changed, removed], ignore_index=True).sort_values(["cambio", "kind", "owner", "name"], ignore_index=True)
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import pickle
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from .tmdl_parser import TmdlParser, PARSER_VERSION, parse_tmdl_bytes, read_relationships
+from .model_audit import AUDIT_SHEETS, build_audit_sheets
+from .excel_manager import ExcelManager
+from .output_sinks import SheetStream
+from .audit_catalog import catalog_objects
+from .metrics import metrics
+
+SUMMARY_SHEET = "Resumen Lote"
+
+
+def discover_models(root):
+    """
+    Busca todas las carpetas 'definition' de modelos semánticos bajo root.
+    Devuelve una lista ordenada de (nombre del modelo, ruta de definition). El nombre es el de la
+    carpeta del modelo; si se repite bajo carpetas distintas se usa su ruta relativa a root
+    (p. ej. 'A/Ventas' y 'B/Ventas'), de modo que cada modelo tiene una clave única en el lote.
+    """
+    found = []
+    for subdir, dirs, files in os.walk(root):
+        if os.path.basename(subdir) != "definition": continue
+        parent = os.path.basename(os.path.dirname(subdir))
+        if parent.endswith(".SemanticModel") or any(f.endswith(".tmdl") for f in files):
+            rel = os.path.relpath(os.path.dirname(subdir), root).replace(os.sep, "/")
+            found.append((parent.replace(".SemanticModel", ""), rel.replace(".SemanticModel", ""), subdir))
+            dirs[:] = []   # no descender dentro de la definición
+    counts = {}
+    for name, _, _ in found: counts[name.lower()] = counts.get(name.lower(), 0) + 1
+    return sorted((name if counts[name.lower()] == 1 else rel, definition) for name, rel, definition in found)
+
+
+def file_label(name):
+    """Nombre de modelo apto para nombre de archivo (las claves de modelos repetidos llevan '/')."""
+    return name.replace("/", "__")
+
+
+def _parse_job(content):
+    """Trabajo del pool: parsea un contenido TMDL; devuelve (parcial, None) o (None, error) sin abortar el lote."""
+    try: return parse_tmdl_bytes(content), None
+    except Exception as e: return None, f"{type(e).__name__}: {e}"
+
+
+def _model_files(definition):
+    rel_file = os.path.join(definition, "relationships.tmdl")
+    files = []
+    for subdir, dirs, names in os.walk(definition):
+        for name in names:
+            if name.endswith('.tmdl') and "relationships.tmdl" not in name:
+                files.append(os.path.join(subdir, name))
+    return files, (rel_file if os.path.exists(rel_file) else None)
+
+
+def _audit_job(name, definition, payloads, relationships, with_catalog=False):
+    """Trabajo del pool: monta el modelo desde los parciales y genera sus hojas (y sus objetos de catálogo)."""
+    start = time.perf_counter()
+    model = TmdlParser(definition)
+    model.load_partials([pickle.loads(p) for p in payloads], relationships)
+    sheets = build_audit_sheets(model) if model.tables else {}
+    stats = {"Tablas": len(model.tables), "Medidas": len(model.measures)}
+    objects = catalog_objects(sheets, model) if with_catalog else None
+    return sheets, stats, time.perf_counter() - start, objects
+
+
+class BatchAudit:
+    """
+    Auditoría de muchos modelos semánticos en una sola ejecución.
+    - Descubre todas las carpetas 'definition' bajo root.
+    - Parsea cada contenido TMDL distinto una sola vez (los archivos idénticos entre modelos,
+      como expresiones compartidas, se deduplican por hash) en un pool de procesos compartido.
+    - Audita los modelos en paralelo en el mismo pool; un fallo no detiene el lote.
+    """
+    def __init__(self, root, jobs=None, cache=None, catalog=False):
+        self.root = root
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache = cache
+        self.catalog = catalog
+        self.summary = []
+        self.models = []
+        self.catalog_objects = {}   # modelo -> objetos para AuditCatalog (si catalog=True)
+
+    def run(self):
+        self.models = models = discover_models(self.root)
+        print(f"Modelos encontrados: {len(models)} en {self.root}")
+        if not models: return {}
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            start = time.perf_counter()
+            with metrics.stage("parseo_compartido"): payloads, relationships, failed = self._parse_all(models, pool)
+            metrics.count("lote.modelos", len(models))
+            print(f"Parseo compartido completado en {time.perf_counter() - start:.2f} s")
+            results = {}
+            futures = {}
+            for name, definition in models:
+                if name in failed: continue
+                futures[pool.submit(_audit_job, name, definition, payloads[name], relationships[name], self.catalog)] = name
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    sheets, stats, seconds, objects = fut.result()
+                    results[name] = sheets
+                    if objects is not None: self.catalog_objects[name] = objects
+                    self._record(name, "OK", seconds, stats=stats)
+                    print(f"[{name}] auditado en {seconds:.2f} s")
+                except Exception as e:
+                    self._record(name, "ERROR", 0.0, error=f"{type(e).__name__}: {e}")
+                    print(f"[{name}] ERROR: {e}")
+            for name, error in failed.items():
+                self._record(name, "ERROR", 0.0, error=error)
+
+        order = {name: i for i, (name, _) in enumerate(models)}
+        self.summary.sort(key=lambda r: order[r["Modelo"]])
+        return {name: results[name] for name, _ in models if name in results}
+
+    def _record(self, name, status, seconds, stats=None, error=""):
+        row = {"Modelo": name, "Estado": status, "Tablas": 0, "Medidas": 0,
+               "Segundos": round(seconds, 3), "Error": error}
+        row.update(stats or {})
+        self.summary.append(row)
+
+    def _parse_all(self, models, pool):
+        """Lee todos los archivos, deduplica por contenido y parsea cada contenido distinto una vez."""
+        by_digest = {}          # digest -> bytes pendientes de parsear
+        parsed = {}             # digest (o ruta si vino de caché) -> parcial serializado
+        model_digests, relationships, failed = {}, {}, {}
+        states = {}             # digest -> FileState para guardar en caché
+        for name, definition in models:
+            try:
+                files, rel_file = _model_files(definition)
+                digests = []
+                for fp in files:
+                    if self.cache is not None:
+                        hit, value = self.cache.lookup("tmdl", PARSER_VERSION, fp)
+                        if hit:
+                            key = f"cache:{fp}"
+                            parsed[key] = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                            digests.append(key); continue
+                        digest, content = value.digest, value.content
+                        states.setdefault(digest, []).append(value)
+                    else:
+                        with open(fp, 'rb') as f: content = f.read()
+                        digest = hashlib.sha1(content).hexdigest()
+                    if digest not in parsed: by_digest.setdefault(digest, content)
+                    digests.append(digest)
+                model_digests[name] = digests
+                relationships[name] = read_relationships(rel_file, self.cache) if rel_file else []
+            except Exception as e:
+                failed[name] = f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+
+        # Cada modelo recibe su propia copia (pickle) del parcial: el merge asigna ids por modelo
+        total = sum(len(d) for d in model_digests.values())
+        print(f"Archivos TMDL: {total} en total, {len(by_digest)} contenidos distintos a parsear.")
+        pending = list(by_digest.items())
+        chunksize = max(1, len(pending) // (self.jobs * 4))
+        errors = {}             # digest -> error de parseo (solo fallan los modelos que lo contienen)
+        for (digest, _), (partial, error) in zip(pending, pool.map(_parse_job, [c for _, c in pending], chunksize=chunksize)):
+            if error is not None: errors[digest] = error; continue
+            parsed[digest] = pickle.dumps(partial, pickle.HIGHEST_PROTOCOL)
+            for state in states.get(digest, []):
+                self.cache.store("tmdl", PARSER_VERSION, state, partial)
+
+        for name, digests in list(model_digests.items()):
+            error = next((errors[d] for d in digests if d in errors), None)
+            if error is not None:
+                failed[name] = f"Error al parsear TMDL: {error}"
+                del model_digests[name]
+        payloads = {name: [parsed[d] for d in digests] for name, digests in model_digests.items()}
+        return payloads, relationships, failed
+
+    # ------------------------------------------------------------------
+    def write_combined(self, results, output_path, output_format="xlsx"):
+        """
+        Un único libro: cada hoja encadena todos los modelos con una columna 'Modelo'.
+        Los modelos se escriben por lotes (SheetStream), sin concatenar antes todas sus hojas.
+        """
+        sheets = {}
+        for sheet in AUDIT_SHEETS:
+            frames = [(name, model_sheets.get(sheet)) for name, model_sheets in results.items()]
+            frames = [(name, df) for name, df in frames if df is not None and not df.empty]
+            columns = ["Modelo"] + list(dict.fromkeys(c for _, df in frames for c in df.columns))
+            sheets[sheet] = SheetStream(columns, (df.assign(Modelo=name) for name, df in frames))
+        sheets[SUMMARY_SHEET] = pd.DataFrame(self.summary)
+        ExcelManager(output_path, output_format).write_sheets(sheets)
+
+    def write_per_model(self, results, output_dir, suffix, output_format="xlsx"):
+        """Un libro por modelo en output_dir, más un libro con el resumen del lote."""
+        os.makedirs(output_dir, exist_ok=True)
+        for name, model_sheets in results.items():
+            ExcelManager(os.path.join(output_dir, f"{file_label(name)}_{suffix}"), output_format).write_sheets(model_sheets)
+        ExcelManager(os.path.join(output_dir, f"RESUMEN_LOTE_{suffix}"), output_format).write_sheets(
+            {SUMMARY_SHEET: pd.DataFrame(self.summary)})
@@ -1,37 +1,85 @@
 import re
 from .tmdl_parser import OriginType
+from .metrics import metrics
+
+# Lexer DAX de una sola pasada (el orden de las alternativas importa)
+RX_DAX_TOKEN = re.compile(r'''
+    (?P<comment>//[^\n]*|--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>"(?:[^"]|"")*"?)
+  | (?P<quoted>'(?:[^']|'')*'?)
+  | (?P<bracket>\[(?:[^\]]|\]\])*\]?)
+  | (?P<ident>[^\W\d][\w.]*)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ws>\s+)
+  | (?P<op>.)
+''', re.DOTALL | re.VERBOSE)
+
+# Palabras reservadas que nunca son nombres de tabla sin comillas
+DAX_KEYWORDS = {"var", "return", "define", "evaluate", "measure", "order", "by", "asc", "desc",
+                "in", "not", "and", "or", "true", "false", "start", "at"}
+
+
+def tokenize_dax(expression):
+    """Tokens significativos (tipo, texto) de una expresión DAX, sin espacios ni comentarios."""
+    return [(m.lastgroup, m.group()) for m in RX_DAX_TOKEN.finditer(expression)
+            if m.lastgroup not in ("ws", "comment")]
+
+
+def _unquote(kind, text):
+    # 'Mi Tabla' -> Mi Tabla ('' escapa la comilla); [Mi Columna] -> Mi Columna (]] escapa el corchete)
+    if kind == "quoted": return text[1:-1].replace("''", "'").strip() if text.endswith("'") else text[1:].strip()
+    if kind == "bracket": return text[1:-1].replace("]]", "]").strip() if text.endswith("]") else text[1:].strip()
+    return text
+
 
 class DaxAnalyzer:
+    """
+    Extrae las referencias de una expresión DAX (tablas, columnas y medidas) recorriendo sus
+    tokens una sola vez. Las cadenas, los comentarios, los nombres de VAR y las llamadas a
+    función no cuentan como referencias. Los nombres se resuelven con diccionarios en minúsculas.
+    """
     def __init__(self, model_context, tables_data, measures_data):
         self.context = model_context
         self.tables_lower = {t.lower(): t for t in self.context["tables"]}
         self.measures_lower = {m.lower(): m for m in self.context["measures"]}
+        # (tabla, columna) en minúsculas -> nombre real de la columna
+        self.columns_lower = {(t.lower(), c.lower()): c for t, c in self.context["columns"]}
 
     def get_dependencies(self, expression):
-        deps = []
         if not expression: return []
-        
-        expression = re.sub(r'//.*|--.*|/\*.*?\*/', '', expression, flags=re.DOTALL)
-        
-        for table_lower, original_name in self.tables_lower.items():
-            pattern = r"\b" + re.escape(original_name) + r"\b(?!\[)"
-            if re.search(pattern, expression, re.IGNORECASE):
-                deps.append((f"Tabla: {original_name}", OriginType.TABLE))
-
-        rx_cols = re.finditer(r"('?)([^'\[\]\r\n\(\),]+)\1\s*\[([^\]]+)\]", expression)
-        
-        for m in rx_cols:
-            raw_table = m.group(2).strip()
-            col_name = m.group(3).strip()
-            if raw_table.lower() in self.tables_lower:
-                real_table_name = self.tables_lower[raw_table.lower()]
-                deps.append((f"{real_table_name}[{col_name}]", OriginType.COLUMN))
-        
-        rx_measures = re.finditer(r"\[([^\]]+)\]", expression)
-        for m in rx_measures:
-            raw_measure = m.group(1).strip()
-            if raw_measure.lower() in self.measures_lower:
-                real_measure_name = self.measures_lower[raw_measure.lower()]
-                deps.append((real_measure_name, OriginType.MEASURE))
-
-        return list(set(deps))
+        metrics.count("dax.expresiones")
+        deps = {}    # dict: sin duplicados y en orden de aparición
+        variables = set()
+        tokens = tokenize_dax(expression)
+        n = len(tokens)
+        i = 0
+        while i < n:
+            kind, text = tokens[i]
+            nxt = tokens[i + 1] if i + 1 < n else (None, "")
+
+            if kind == "ident" and text.lower() == "var" and nxt[0] == "ident":
+                variables.add(nxt[1].lower()); i += 2; continue
+
+            if kind in ("ident", "quoted"):
+                name = _unquote(kind, text)
+                lower = name.lower()
+                if kind == "ident" and (nxt[1] == "(" or lower in variables or lower in DAX_KEYWORDS):
+                    i += 1; continue
+                table = self.tables_lower.get(lower)
+                if table is not None and nxt[0] == "bracket":
+                    # Tabla[Columna] (o Tabla[Medida], referencia cualificada a una medida)
+                    ref = _unquote("bracket", nxt[1])
+                    column = self.columns_lower.get((lower, ref.lower()))
+                    measure = self.measures_lower.get(ref.lower())
+                    if column is not None or measure is None:
+                        deps[(f"{table}[{column or ref}]", OriginType.COLUMN)] = None
+                    if measure is not None: deps[(measure, OriginType.MEASURE)] = None
+                    i += 2; continue
+                if table is not None: deps[(f"Tabla: {table}", OriginType.TABLE)] = None
+                i += 1; continue
+
+            if kind == "bracket":
+                measure = self.measures_lower.get(_unquote(kind, text).lower())
+                if measure is not None: deps[(measure, OriginType.MEASURE)] = None
+            i += 1
+        return list(deps)
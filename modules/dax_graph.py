@@ -0,0 +1,156 @@
+from .tmdl_parser import OriginType
+
+
+class DaxDependencyGraph:
+    """
+    Grafo de dependencias DAX de todo el modelo, construido una sola vez.
+    - Nodos enteros: columnas/tablas que alguna medida referencia y medidas, con la misma
+      clave (nombre, OriginType) que devuelve DaxAnalyzer.get_dependencies.
+    - Aristas medida -> referencia directa (incluidas medida -> medida).
+    - Componentes fuertemente conexas (Tarjan iterativo) para detectar ciclos y cierres
+      transitivos como bitsets (int), calculados una vez por componente en orden topológico.
+    """
+    def __init__(self, measures, dax_analyzer):
+        self.keys = []          # id -> (nombre, OriginType)
+        self.ids = {}           # (nombre, OriginType) -> id
+        self.edges = []         # id -> [ids referenciados directamente]
+        deps = {name: dax_analyzer.get_dependencies(data["expression"]) for name, data in measures.items()}
+        # Columnas y tablas primero: con ids bajos, el cierre filtrado por leaf_mask es un entero pequeño
+        for refs in deps.values():
+            for key in refs:
+                if key[1] != OriginType.MEASURE: self._node(key)
+        self.leaf_mask = (1 << len(self.keys)) - 1
+        for name in deps:
+            self._node((name, OriginType.MEASURE))
+        for name, refs in deps.items():
+            self.edges[self.ids[(name, OriginType.MEASURE)]] = [self._node(dep) for dep in refs]
+        self._component, self._closure, self.cycles = self._close()
+        self._dependents = {}
+
+    def _node(self, key):
+        node = self.ids.get(key)
+        if node is None:
+            node = self.ids[key] = len(self.keys)
+            self.keys.append(key); self.edges.append([])
+        return node
+
+    def _close(self):
+        """Tarjan iterativo. Las componentes salen en orden topológico inverso (sumideros primero)."""
+        n = len(self.keys)
+        index, low = [-1] * n, [0] * n
+        on_stack = [False] * n
+        stack, counter = [], 0
+        component, closures, cycles = [0] * n, [], []
+        for root in range(n):
+            if index[root] != -1: continue
+            work = [(root, 0)]
+            while work:
+                v, i = work.pop()
+                if i == 0:
+                    index[v] = low[v] = counter; counter += 1
+                    stack.append(v); on_stack[v] = True
+                edges = self.edges[v]
+                while i < len(edges):
+                    w = edges[i]; i += 1
+                    if index[w] == -1:
+                        work.append((v, i)); work.append((w, 0))
+                        break
+                    if on_stack[w] and index[w] < low[v]: low[v] = index[w]
+                else:
+                    if low[v] == index[v]:
+                        members = []
+                        while True:
+                            w = stack.pop(); on_stack[w] = False; members.append(w)
+                            if w == v: break
+                        closures.append(self._component_closure(members, component, closures, len(closures)))
+                        if len(members) > 1 or v in self.edges[v]:
+                            cycles.append(sorted(self.keys[m][0] for m in members))
+                    if work:
+                        parent = work[-1][0]
+                        if low[v] < low[parent]: low[parent] = low[v]
+        return component, closures, cycles
+
+    def _component_closure(self, members, component, closures, comp_id):
+        bits = 0
+        for v in members: component[v] = comp_id
+        for v in members:
+            for w in self.edges[v]:
+                bits |= 1 << w
+                if component[w] != comp_id: bits |= closures[component[w]]
+        return bits
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def direct(self, measure):
+        """Referencias directas de una medida (mismo formato que get_dependencies)."""
+        node = self.ids.get((measure, OriginType.MEASURE))
+        return [] if node is None else [self.keys[w] for w in self.edges[node]]
+
+    def requires(self, measure):
+        """Todo lo que necesita una medida, directa o indirectamente, en orden de id."""
+        node = self.ids.get((measure, OriginType.MEASURE))
+        if node is None: return []
+        return [self.keys[w] for w in _iter_bits(self._closure[self._component[node]]) if w != node]
+
+    def required_by(self, name, kind=OriginType.COLUMN):
+        """Medidas que necesitan (directa o indirectamente) la columna, tabla o medida dada."""
+        target = self.ids.get((name, kind))
+        if target is None: return []
+        if target not in self._dependents:
+            bit = 1 << target
+            found = [self.keys[v][0] for v, key in enumerate(self.keys)
+                     if key[1] == OriginType.MEASURE and v != target
+                     and self._closure[self._component[v]] & bit]
+            self._dependents[target] = found
+        return self._dependents[target]
+
+    def measure_columns(self, measure):
+        """Columnas (ids) que necesita una medida, directa o indirectamente, y si cada una es directa."""
+        node = self.ids.get((measure, OriginType.MEASURE))
+        if node is None: return [], []
+        direct = set(self.edges[node])
+        columns = [w for w in _iter_bits(self._closure[self._component[node]] & self.leaf_mask)
+                   if self.keys[w][1] == OriginType.COLUMN]
+        return columns, [w in direct for w in columns]
+
+    def column_usage_pairs(self):
+        """
+        Pares (id de columna, id de medida, directa?) como listas paralelas para todas las columnas
+        alcanzadas por alguna medida (self.keys[id] da el nombre). Recorre el cierre de cada medida
+        una vez, sin una consulta inversa por columna.
+        """
+        columns, measures, direct_flags = [], [], []
+        for v, (name, kind) in enumerate(self.keys):
+            if kind != OriginType.MEASURE: continue
+            direct = set(self.edges[v])
+            for w in _iter_bits(self._closure[self._component[v]] & self.leaf_mask):
+                if self.keys[w][1] == OriginType.COLUMN:
+                    columns.append(w); measures.append(v); direct_flags.append(w in direct)
+        return columns, measures, direct_flags
+
+    def used_columns(self):
+        """Columnas ('Tabla[Columna]') que necesita alguna medida: la unión de todos los cierres."""
+        bits = 0
+        for closure in self._closure: bits |= closure
+        return {self.keys[w][0] for w in _iter_bits(bits & self.leaf_mask) if self.keys[w][1] == OriginType.COLUMN}
+
+    def max_depth(self):
+        """
+        Longitud de la cadena más larga de medidas (1 = medidas que solo usan columnas; una medida que usa
+        otra suma un nivel; un ciclo cuenta como un nivel). Las componentes están numeradas de sumideros a
+        fuentes, así que basta recorrerlas en orden.
+        """
+        depth = {}
+        nodes = sorted((self._component[v], v) for v, key in enumerate(self.keys) if key[1] == OriginType.MEASURE)
+        for comp, v in nodes:
+            below = [depth.get(self._component[w], 0) for w in self.edges[v]
+                     if self.keys[w][1] == OriginType.MEASURE and self._component[w] != comp]
+            depth[comp] = max(depth.get(comp, 1), 1 + max(below, default=0))
+        return max(depth.values(), default=0)
+
+def _iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
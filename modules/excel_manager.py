@@ -1,27 +1,30 @@
 import pandas as pd
 import os
+from .output_sinks import create_sink, sheet_batches
+from .metrics import metrics
 
 class ExcelManager:
-    def __init__(self, output_path):
+    def __init__(self, output_path, output_format="xlsx"):
         self.output_path = output_path
+        self.output_format = output_format
 
     def write_sheets(self, data_dict):
         """
-        Escribe múltiples DataFrames en un archivo Excel.
-        data_dict: Diccionario donde la clave es el nombre de la hoja y el valor es el DataFrame.
+        Escribe múltiples hojas en el formato de salida (xlsx por defecto; csv o parquet como carpeta).
+        data_dict: Diccionario donde la clave es el nombre de la hoja y el valor es un DataFrame
+        o un SheetStream (columnas + lotes de filas) para escribir sin materializar la hoja.
         """
         try:
-            with pd.ExcelWriter(self.output_path, engine='openpyxl') as writer:
-                for sheet_name, df in data_dict.items():
-                    if not df.empty:
-                        df.to_excel(writer, sheet_name=sheet_name, index=False)
-                        print(f"Hoja '{sheet_name}' escrita con {len(df)} filas.")
-                    else:
-                        # Opcional: Escribir hoja vacía o con mensaje
-                        pd.DataFrame(["Sin datos"]).to_excel(writer, sheet_name=sheet_name, index=False)
-                        print(f"Hoja '{sheet_name}' escrita (vacía/sin datos).")
-            print(f"Proceso completado. Archivo guardado en: {self.output_path}")
+            sink = create_sink(self.output_format, self.output_path)
+            for sheet_name, data in data_dict.items():
+                columns, frames = sheet_batches(data)
+                with metrics.stage(sheet_name): rows = sink.write_sheet(sheet_name, columns, frames)
+                metrics.count("excel.filas", rows)
+                if rows: print(f"Hoja '{sheet_name}' escrita con {rows} filas.")
+                else: print(f"Hoja '{sheet_name}' escrita (vacía/sin datos).")
+            sink.close()
+            print(f"Proceso completado. Archivo guardado en: {sink.path}")
         except PermissionError:
             print(f"ERROR: No se puede escribir en {self.output_path}. Cierra el archivo si lo tienes abierto e inténtalo de nuevo.")
         except Exception as e:
-            print(f"ERROR al escribir Excel: {e}")
+            print(f"ERROR al escribir la salida ({self.output_format}): {e}")
@@ -0,0 +1,277 @@
+import io
+import os
+import subprocess
+import time
+from .tmdl_parser import TmdlParser, PARSER_VERSION, parse_tmdl_bytes
+from .dax_analyzer import DaxAnalyzer
+from .dax_graph import DaxDependencyGraph
+from .model_audit import MemoDependencies
+from .report_logic import LegacySectionStream, ReportPage, REPORT_PARSER_VERSION, load_json_bytes
+from .visual_logic import VisualObject
+from .usage_integrator import SymbolIndex
+from .multi_report import visual_frame
+from .metrics import metrics
+
+HISTORY_SHEET = "Historial Commits"
+HISTORY_COLUMNS = [
+    "Commit", "Fecha", "Autor", "Mensaje", "Estado", "Archivos TMDL", "Archivos Parseados",
+    "Tablas", "Columnas", "Medidas", "Relaciones", "Columnas Sin Uso", "Profundidad Dependencias", "Ciclos DAX",
+    "Visuales", "Campos Visuales", "Campos Sin Modelo", "Columnas Sin Uso Total", "Segundos",
+]
+REL_FILE = "relationships.tmdl"
+_TREE_MODE = b"40000"
+_SUBMODULE_MODE = b"160000"
+# Separador de campos en la salida de git log (no aparece en nombres ni mensajes)
+_FIELD_SEP = "\x1f"
+
+
+class GitError(RuntimeError):
+    pass
+
+
+def _git(repo, *args):
+    try:
+        result = subprocess.run(["git", "-C", repo, *args], capture_output=True, check=True)
+    except FileNotFoundError:
+        raise GitError("No se encontró el ejecutable 'git' en el PATH.")
+    except subprocess.CalledProcessError as e:
+        raise GitError(f"git {' '.join(args)}: {e.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout.decode("utf-8", "replace")
+
+
+def repo_location(path):
+    """(raíz del repositorio, ruta relativa con '/') de una carpeta dentro de una copia de trabajo de git."""
+    top = _git(path, "rev-parse", "--show-toplevel").strip()
+    rel = os.path.relpath(os.path.realpath(path), os.path.realpath(top))
+    return top, "" if rel == "." else rel.replace(os.sep, "/")
+
+
+def parse_tree(data):
+    """Entradas (nombre, sha, es_árbol) de un objeto tree de git (formato binario); omite submódulos."""
+    entries, i = [], 0
+    while i < len(data):
+        space = data.index(b" ", i)
+        nul = data.index(b"\0", space)
+        mode = data[i:space]
+        if mode != _SUBMODULE_MODE:
+            entries.append((data[space + 1:nul].decode("utf-8", "surrogateescape"), data[nul + 1:nul + 21].hex(), mode == _TREE_MODE))
+        i = nul + 21
+    return entries
+
+
+class GitObjectReader:
+    """
+    Lectura de objetos git (commits, árboles y blobs) por SHA con un único proceso 'git cat-file --batch'
+    que vive mientras dura el recorrido. Los árboles se memorizan por SHA: un subárbol que no cambia
+    entre commits se lista una sola vez.
+    """
+    def __init__(self, repo):
+        self.repo = repo
+        try:
+            self.proc = subprocess.Popen(["git", "-C", repo, "cat-file", "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except FileNotFoundError:
+            raise GitError("No se encontró el ejecutable 'git' en el PATH.")
+        self.objects = 0
+        self.bytes = 0
+        self._trees = {}
+        self._files = {}
+
+    def read(self, sha):
+        """(tipo, bytes) del objeto; GitError si no existe."""
+        self.proc.stdin.write(sha.encode("ascii") + b"\n")
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().split()
+        if len(header) != 3: raise GitError(f"Objeto git no encontrado: {sha}")
+        size = int(header[2])
+        data = self.proc.stdout.read(size)
+        self.proc.stdout.read(1)    # salto de línea tras el contenido
+        self.objects += 1; self.bytes += size
+        return header[1].decode("ascii"), data
+
+    def tree(self, sha):
+        if sha not in self._trees:
+            kind, data = self.read(sha)
+            if kind != "tree": raise GitError(f"{sha} no es un árbol ({kind})")
+            self._trees[sha] = parse_tree(data)
+        return self._trees[sha]
+
+    def subtree(self, root, path):
+        """SHA del árbol en la ruta relativa (con '/') bajo el árbol root, o None si no existe."""
+        sha = root
+        for part in filter(None, path.split("/")):
+            sha = next((s for name, s, is_tree in self.tree(sha) if name == part and is_tree), None)
+            if sha is None: return None
+        return sha
+
+    def files(self, sha):
+        """{ruta relativa: SHA del blob} de todo el árbol, memorizado por SHA de cada subárbol."""
+        if sha not in self._files:
+            found = {}
+            for name, child, is_tree in self.tree(sha):
+                if is_tree: found.update((f"{name}/{rel}", blob) for rel, blob in self.files(child).items())
+                else: found[name] = child
+            self._files[sha] = found
+        return self._files[sha]
+
+    def close(self):
+        if self.proc.stdin: self.proc.stdin.close()
+        self.proc.wait()
+
+
+class BlobResults:
+    """Resultados de parseo por SHA de blob: en memoria y, opcionalmente, en la ParseCache (direccionada por contenido)."""
+    def __init__(self, reader, cache=None):
+        self.reader = reader
+        self.cache = cache
+        self.memory = {}
+        self.parsed = 0
+
+    def get(self, namespace, version, sha, build):
+        key = (namespace, sha)
+        if key in self.memory: return self.memory[key]
+        hit, value = self.cache.get_object(namespace, version, sha) if self.cache is not None else (False, None)
+        if not hit:
+            value = build(self.reader.read(sha)[1]); self.parsed += 1
+            if self.cache is not None: self.cache.put_object(namespace, version, sha, value)
+        self.memory[key] = value
+        return value
+
+
+def _relationships(data):
+    parser = TmdlParser("")
+    parser.add_relationships(data.decode("utf-8"))
+    return parser.relationships
+
+
+def _legacy_rows(data):
+    """(filas, número de visuales) de un report.json, sección a sección como PBIPReport."""
+    rows, visuals = [], 0
+    for section in LegacySectionStream(io.BytesIO(data)).sections():
+        containers = section.get('visualContainers', [])
+        rows.extend(ReportPage(section.get('displayName', section.get('name')), containers).process())
+        visuals += len(containers)
+    return rows, visuals
+
+
+class GitHistoryAudit:
+    """
+    Métricas del modelo (y opcionalmente de un informe) en cada commit que toca sus carpetas, leyendo los
+    archivos directamente de los objetos git, sin checkout:
+    - un único proceso 'git cat-file --batch' para árboles y blobs;
+    - los resultados de parseo se guardan por SHA de blob: en cada commit solo se parsean los archivos cambiados;
+    - un commit cuyo árbol del modelo (o del informe) es el mismo que en el commit anterior reutiliza sus métricas
+      (solo se guarda el último: el índice de símbolos de un modelo grande ocupa bastante);
+    - las dependencias DAX se memorizan por expresión mientras no cambien los nombres del modelo.
+    """
+    def __init__(self, repo, model_path, report_path=None, revision="HEAD", max_commits=None, cache=None):
+        self.repo = repo
+        self.model_path = model_path.strip("/")
+        self.report_path = report_path.strip("/") if report_path else None
+        self.revision = revision
+        self.max_commits = max_commits
+        self.cache = cache
+        self.rows = []
+        self._model_metrics = {}    # SHA del árbol del modelo -> (métricas, columnas sin uso en medidas, índice), solo el último
+        self._report_metrics = {}   # (SHA modelo, SHA informe) -> métricas del informe, solo el último
+        self._dax_known, self._dax_names = {}, None
+
+    def commits(self):
+        """[(sha, árbol raíz, fecha, autor, asunto)] en orden cronológico (primer padre) que tocan el modelo o el informe."""
+        args = ["log", "--first-parent", "--reverse", f"--format=%H{_FIELD_SEP}%T{_FIELD_SEP}%cI{_FIELD_SEP}%an{_FIELD_SEP}%s"]
+        if self.max_commits: args.append(f"--max-count={self.max_commits}")
+        args += [self.revision, "--", self.model_path] + ([self.report_path] if self.report_path else [])
+        return [tuple(line.split(_FIELD_SEP, 4)) for line in _git(self.repo, *args).splitlines() if line]
+
+    def run(self):
+        commits = self.commits()
+        print(f"Commits a analizar: {len(commits)} ({self.revision}, {self.model_path})")
+        reader = GitObjectReader(self.repo)
+        blobs = BlobResults(reader, self.cache)
+        try:
+            for i, (sha, tree, date, author, subject) in enumerate(commits, 1):
+                start, parsed = time.perf_counter(), blobs.parsed
+                row = {"Commit": sha[:12], "Fecha": date, "Autor": author, "Mensaje": subject, "Estado": "OK"}
+                try:
+                    with metrics.stage("historial_commit"): self._analyze(reader, blobs, tree, row)
+                except Exception as e:
+                    # Un commit con archivos mal formados (JSON, TMDL, claves que faltan) no detiene el historial
+                    row["Estado"] = f"ERROR: {type(e).__name__}: {e}"
+                row["Archivos Parseados"] = blobs.parsed - parsed
+                row["Segundos"] = round(time.perf_counter() - start, 3)
+                self.rows.append(row)
+                if i % 25 == 0 or i == len(commits):
+                    print(f"  {i}/{len(commits)} commits ({blobs.parsed} archivos parseados, {reader.objects} objetos git leídos)")
+        finally:
+            reader.close()
+        metrics.count("historial.commits", len(commits)); metrics.count("historial.archivos_parseados", blobs.parsed)
+        return self.rows
+
+    def _analyze(self, reader, blobs, tree, row):
+        model_tree = reader.subtree(tree, self.model_path)
+        if model_tree is None:
+            row["Estado"] = "Sin modelo"; return
+        files = reader.files(model_tree)
+        row["Archivos TMDL"] = sum(1 for rel in files if rel.endswith(".tmdl"))
+        if model_tree not in self._model_metrics:
+            self._model_metrics = {model_tree: self._model(blobs, files)}
+        values, unused, index = self._model_metrics[model_tree]
+        row.update(values)
+        if not self.report_path: return
+        report_tree = reader.subtree(tree, self.report_path)
+        if report_tree is None: return
+        key = (model_tree, report_tree)
+        if key not in self._report_metrics:
+            self._report_metrics = {key: self._report(reader, blobs, report_tree, unused, index)}
+        row.update(self._report_metrics[key])
+
+    def _model(self, blobs, files):
+        tmdl = sorted(rel for rel in files if rel.endswith(".tmdl") and os.path.basename(rel) != REL_FILE)
+        partials = [blobs.get("git-tmdl", PARSER_VERSION, files[rel], parse_tmdl_bytes) for rel in tmdl]
+        relationships = blobs.get("git-tmdl-rel", PARSER_VERSION, files[REL_FILE], _relationships) if REL_FILE in files else []
+        model = TmdlParser(self.model_path)
+        model.load_partials(partials, list(relationships), quiet=True)
+
+        # Con los mismos nombres en el modelo solo se analizan las expresiones DAX nuevas o modificadas
+        names = {kind: set(objs) for kind, objs in model.global_objects.items()}
+        dependencies = MemoDependencies(DaxAnalyzer(model.global_objects, model.tables, model.measures),
+                                        self._dax_known if names == self._dax_names else {})
+        graph = DaxDependencyGraph(model.measures, dependencies)
+        self._dax_known, self._dax_names = dependencies.used, names
+        used = graph.used_columns()
+        unused = {f"{t}[{c}]" for t, c in model.column_index} - used
+        values = {"Tablas": len(model.tables), "Columnas": len(model.column_index), "Medidas": len(model.measures),
+                  "Relaciones": len(model.relationships), "Columnas Sin Uso": len(unused),
+                  "Profundidad Dependencias": graph.max_depth(), "Ciclos DAX": len(graph.cycles)}
+        return values, unused, SymbolIndex(model)
+
+    def _report(self, reader, blobs, report_tree, unused, index):
+        files = reader.files(report_tree)
+        rows, visuals = [], 0
+        if any(rel.startswith("definition/pages/") for rel in files):
+            order = {}
+            if "definition/pages/pages.json" in files:
+                order = blobs.get("git-pages", REPORT_PARSER_VERSION, files["definition/pages/pages.json"],
+                                  lambda data: {n: i for i, n in enumerate(load_json_bytes(data).get('pageOrder', []))})
+            pages = {}
+            for rel, sha in files.items():
+                parts = rel.split("/")
+                if len(parts) < 4 or parts[:2] != ["definition", "pages"]: continue
+                page = pages.setdefault(parts[2], {"name": parts[2], "visuals": []})
+                if parts[3:] == ["page.json"]:
+                    # Se guarda solo el displayName: dos page.json iguales en carpetas distintas comparten el blob
+                    title = blobs.get("git-page-name", REPORT_PARSER_VERSION, sha, lambda data: load_json_bytes(data).get('displayName'))
+                    page["name"] = title or parts[2]
+                elif len(parts) == 6 and parts[3] == "visuals" and parts[5] == "visual.json":
+                    page["visuals"].append((parts[4], sha))
+            for folder in sorted(pages, key=lambda f: (order.get(f, len(order)), f)):
+                page = pages[folder]
+                for _, sha in sorted(page["visuals"]):
+                    fields = blobs.get("git-visual", REPORT_PARSER_VERSION, sha, lambda data: VisualObject(load_json_bytes(data)).get_usage_data())
+                    rows.extend(dict(field, Nombre_Pag=page["name"]) for field in fields)
+                visuals += len(page["visuals"])
+        elif "report.json" in files:
+            rows, visuals = blobs.get("git-legacy", REPORT_PARSER_VERSION, files["report.json"], _legacy_rows)
+        counts, unresolved = index.count_usage(visual_frame(rows))
+        shown = {index.rows["Ubicacion"][pos] for pos, n in enumerate(counts) if n and index.rows["Tipo"][pos] == "Columna"}
+        return {"Visuales": visuals, "Campos Visuales": len(rows), "Campos Sin Modelo": unresolved,
+                "Columnas Sin Uso Total": len(unused - shown)}
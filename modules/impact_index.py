@@ -0,0 +1,128 @@
+import time
+from .tmdl_parser import OriginType
+from .dax_analyzer import DaxAnalyzer
+from .dax_graph import DaxDependencyGraph
+from .usage_integrator import SymbolIndex
+from .audit_catalog import RX_QUALIFIED
+
+
+class ImpactIndex:
+    """
+    Índices en memoria para preguntas de impacto sobre un modelo y sus informes:
+    - hacia delante: medida -> lo que necesita (DaxDependencyGraph.requires)
+    - hacia atrás: columna/tabla/medida -> medidas que la necesitan (DaxDependencyGraph.required_by)
+    - uso visual: objeto del modelo -> visuales (informe, página, visual) que lo muestran directamente
+    Las consultas devuelven dicts listos para JSON. Se construye una vez; para recargar se crea otro.
+    """
+    def __init__(self, model, reports=None):
+        start = time.perf_counter()
+        self.model = model
+        self.graph = DaxDependencyGraph(model.measures, DaxAnalyzer(model.global_objects, model.tables, model.measures))
+        self.measures_lower = {m.lower(): m for m in model.measures}
+        self.tables_lower = {t.lower(): t for t in model.tables}
+        self.columns_lower = {(t.lower(), c.lower()): (t, c) for t, c in model.column_index}
+        self.visuals = {}       # (nombre, OriginType) -> [visual]
+        self.unresolved = 0
+        symbols = SymbolIndex(model)
+        for report, rows in (reports or {}).items():
+            self._add_report(symbols, report, rows)
+        self.seconds = time.perf_counter() - start
+
+    def _add_report(self, symbols, report, rows):
+        seen = set()
+        for row in rows:
+            pos = symbols.resolve(row.get('Tabla'), row.get('Campo') or row.get('Valor'), row.get('Tipo_Valor'))
+            if pos is None:
+                self.unresolved += 1; continue
+            table, name, kind = (symbols.rows[k][pos] for k in ("Tabla", "Nombre Objeto", "Tipo"))
+            key = (name, OriginType.MEASURE) if kind == "Medida" else (f"{table}[{name}]", OriginType.COLUMN)
+            visual = (report, row.get('Nombre_Pag'), row.get('Objeto Visual'), row.get('Titulo'))
+            if (key, visual) in seen: continue
+            seen.add((key, visual))
+            self.visuals.setdefault(key, []).append(
+                {"informe": report, "pagina": visual[1], "visual": visual[2], "titulo": visual[3], "rol": row.get('Tipo_Valor')})
+
+    # ------------------------------------------------------------------
+    def resolve(self, name):
+        """
+        (nombre canónico, OriginType) de 'Tabla[Columna]', 'Tabla'[Columna], [Medida], Medida o Tabla,
+        sin distinguir mayúsculas. None si no existe en el modelo.
+        """
+        name = name.strip()
+        match = RX_QUALIFIED.match(name)
+        if match:
+            column = self.columns_lower.get((match.group(1).strip("'").lower(), match.group(2).lower()))
+            if column: return f"{column[0]}[{column[1]}]", OriginType.COLUMN
+            # 'Tabla'[Medida] es una referencia cualificada a una medida
+            name = match.group(2)
+        if name.startswith("[") and name.endswith("]"): name = name[1:-1]
+        if name.lower() in self.measures_lower: return self.measures_lower[name.lower()], OriginType.MEASURE
+        if name.lower() in self.tables_lower: return self.tables_lower[name.lower()], OriginType.TABLE
+        return None
+
+    def _not_found(self, name):
+        return {"error": f"'{name}' no es una columna, medida ni tabla del modelo"}
+
+    def _targets(self, name, kind):
+        """Claves del grafo afectadas por el objeto: una tabla arrastra sus columnas y la referencia 'Tabla: X'."""
+        if kind != OriginType.TABLE: return [(name, kind)]
+        return [(f"Tabla: {name}", OriginType.TABLE)] + [(f"{name}[{c}]", OriginType.COLUMN) for c in self.model.tables[name]["columns"]]
+
+    def _measures_needing(self, targets):
+        found = {}
+        for target, kind in targets:
+            for measure in self.graph.required_by(target, kind): found.setdefault(measure, target)
+        return found
+
+    def impact(self, name):
+        """Qué se rompe si se elimina el objeto: medidas que lo necesitan, visuales que lo muestran y relaciones."""
+        resolved = self.resolve(name)
+        if resolved is None: return self._not_found(name)
+        key, kind = resolved
+        targets = self._targets(key, kind)
+        measures = self._measures_needing(targets)
+        direct = [v for t in targets for v in self.visuals.get(t, [])]
+        indirect = [dict(v, via=m) for m in sorted(measures) for v in self.visuals.get((m, OriginType.MEASURE), [])]
+        tables = {key} if kind == OriginType.TABLE else {key.split("[", 1)[0]} if kind == OriginType.COLUMN else set()
+        columns = {t for t, k in targets if k == OriginType.COLUMN}
+        relationships = [{"desde": f"{r.from_table}[{r.from_column}]", "hacia": f"{r.to_table}[{r.to_column}]", "activa": r.is_active}
+                         for r in self.model.relationships
+                         if f"{r.from_table}[{r.from_column}]" in columns or f"{r.to_table}[{r.to_column}]" in columns
+                         or (kind == OriginType.TABLE and key in (r.from_table, r.to_table))]
+        return {
+            "objeto": key, "tipo": kind.value, "tablas": sorted(tables),
+            "medidas": [{"medida": m, "por": via} for m, via in sorted(measures.items())],
+            "visuales_directos": direct, "visuales_por_medidas": indirect,
+            "paginas": sorted({(v["informe"], v["pagina"]) for v in direct + indirect}),
+            "relaciones": relationships,
+        }
+
+    def dependencies(self, name):
+        """Lo que necesita una medida: referencias directas y cierre transitivo."""
+        resolved = self.resolve(name)
+        if resolved is None: return self._not_found(name)
+        key, kind = resolved
+        if kind != OriginType.MEASURE: return {"error": f"'{key}' no es una medida"}
+        label = lambda refs: [{"nombre": n, "tipo": k.value} for n, k in refs]
+        return {"medida": key, "directas": label(self.graph.direct(key)), "todas": label(self.graph.requires(key))}
+
+    def visuals_of(self, name):
+        """Visuales que muestran el objeto, directamente o a través de medidas que lo usan."""
+        result = self.impact(name)
+        if "error" in result: return result
+        return {k: result[k] for k in ("objeto", "tipo", "visuales_directos", "visuales_por_medidas", "paginas")}
+
+    def search(self, text, limit=50):
+        """Columnas, medidas y tablas cuyo nombre contiene el texto."""
+        text = text.lower()
+        found = [{"nombre": m, "tipo": OriginType.MEASURE.value} for low, m in self.measures_lower.items() if text in low]
+        found += [{"nombre": t, "tipo": OriginType.TABLE.value} for low, t in self.tables_lower.items() if text in low]
+        found += [{"nombre": f"{t}[{c}]", "tipo": OriginType.COLUMN.value} for (lt, lc), (t, c) in self.columns_lower.items()
+                  if text in lc or text in f"{lt}[{lc}]"]
+        return {"texto": text, "resultados": sorted(found, key=lambda r: r["nombre"])[:limit], "total": len(found)}
+
+    def status(self):
+        return {"tablas": len(self.model.tables), "medidas": len(self.model.measures),
+                "columnas": len(self.model.column_index), "relaciones": len(self.model.relationships),
+                "objetos_en_visuales": len(self.visuals), "campos_sin_modelo": self.unresolved,
+                "segundos_indexado": round(self.seconds, 3)}
@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from .impact_index import ImpactIndex
+from .multi_report import MultiReportAnalysis
+from .parse_cache import MemoryCache
+from .report_logic import IO_THREADS
+from .watch import FolderPoller, IncrementalModel
+
+# Ruta -> (parámetro obligatorio, método de ImpactIndex)
+ROUTES = {
+    "/impacto": ("objeto", "impact"),
+    "/dependencias": ("medida", "dependencies"),
+    "/visuales": ("objeto", "visuals_of"),
+    "/buscar": ("texto", "search"),
+}
+
+
+class ImpactService:
+    """
+    Modelo e informes cargados una vez y un ImpactIndex listo para consultar. Las recargas (por cambios
+    en disco o por petición) reparsean solo los archivos modificados, construyen un índice nuevo y lo
+    sustituyen de golpe: las consultas en curso siguen usando el anterior.
+    """
+    def __init__(self, model_path, report_paths=(), io_threads=IO_THREADS):
+        self.model = IncrementalModel(model_path)
+        self.report_paths = list(report_paths)
+        self.io_threads = io_threads
+        self.memory = MemoryCache()      # visual.json ya leídos (solo se usa con self.lock)
+        self.lock = threading.Lock()
+        self.poller = None
+        self.index = None
+        self.loaded_at = None
+        self.reloads = 0
+
+    def load(self, cache=None):
+        """Primera carga (la caché persistente, si se indica, solo se usa aquí)."""
+        with self.lock:
+            self.model.cache = cache
+            try: self.model.load()
+            finally: self.model.cache = None
+            self.poller = FolderPoller([self.model.root] + self.report_paths)
+            self._rebuild()
+
+    def reload(self, only_if_changed=False):
+        """Aplica los cambios en disco y reconstruye el índice; con only_if_changed no hace nada si no los hay."""
+        with self.lock:
+            changed = self.poller.poll()
+            if only_if_changed and not changed: return None
+            start = time.perf_counter()
+            self.model.refresh(changed)
+            self._rebuild()
+            self.reloads += 1
+            return {"recargado": True, "archivos_cambiados": len(changed), "segundos": round(time.perf_counter() - start, 3)}
+
+    def _rebuild(self):
+        reports = {}
+        if self.report_paths:
+            analysis = MultiReportAnalysis(self.report_paths, cache=self.memory, io_threads=self.io_threads)
+            reports = {name: df.to_dict('records') for name, df in analysis.run().items()}
+        self.index = ImpactIndex(self.model.model, reports)
+        self.loaded_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        print(f"Índice listo: {self.index.status()}")
+
+    def status(self):
+        return dict(self.index.status(), modelo=self.model.root, informes=self.report_paths,
+                    cargado=self.loaded_at, recargas=self.reloads)
+
+    def watch(self, interval):
+        """Hilo en segundo plano que recarga cuando cambian archivos del modelo o de los informes."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    result = self.reload(only_if_changed=True)
+                    if result: print(f"Recarga por cambios en disco: {result}")
+                except Exception as e:
+                    print(f"ERROR en la recarga: {e}")
+                    traceback.print_exc()
+        threading.Thread(target=loop, name="recarga", daemon=True).start()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path in ("/", "/estado"): return self._send(200, self.service.status())
+        if url.path not in ROUTES:
+            return self._send(404, {"error": f"Ruta desconocida: {url.path}", "rutas": ["/estado", "POST /recargar"] + list(ROUTES)})
+        param, method = ROUTES[url.path]
+        if not params.get(param): return self._send(400, {"error": f"Falta el parámetro '{param}'"})
+        start = time.perf_counter()
+        result = getattr(self.service.index, method)(params[param])
+        result["ms"] = round((time.perf_counter() - start) * 1000, 3)
+        self._send(404 if "error" in result else 200, result)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/recargar": return self._send(404, {"error": f"Ruta desconocida: {self.path}"})
+        try: self._send(200, self.service.reload())
+        except Exception as e: self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _send(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def make_server(service, host, port):
+    """Servidor HTTP (un hilo por petición) que responde en JSON con el índice del servicio."""
+    handler = type("ImpactHandler", (_Handler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
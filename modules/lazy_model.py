@@ -0,0 +1,153 @@
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+from .tmdl_lexer import parse_tmdl
+from .tmdl_parser import parse_tmdl_bytes, parse_tmdl_file, read_relationships
+
+# Tablas materializadas que se mantienen en memoria a la vez (LRU)
+DEFAULT_MAX_TABLES = 64
+
+
+class TmdlIndex:
+    """
+    Índice del modelo en una sola lectura de cada archivo con el lexer TMDL (sin analizar DAX ni M
+    ni construir objetos del modelo):
+    - tables: nombre de tabla -> (ruta, byte inicial, byte final), con la descripción '///' incluida
+    - measures: nombre de medida -> tabla; columns: {(tabla, columna)}
+    Los archivos sin tabla (expressions.tmdl, model.tmdl...) se guardan aparte.
+    """
+    def __init__(self, root_folder):
+        self.root = root_folder
+        self.tables = {}
+        self.measures = {}
+        self.columns = set()
+        self.other_files = []
+        self.relationships_file = None
+
+    def build(self):
+        for subdir, dirs, files in os.walk(self.root):
+            for file in files:
+                if not file.endswith('.tmdl'): continue
+                path = os.path.join(subdir, file)
+                if "relationships.tmdl" in file:
+                    self.relationships_file = path; continue
+                if not self._index_file(path): self.other_files.append(path)
+        return self
+
+    def _index_file(self, path):
+        """Registra las tablas de un archivo con sus medidas y columnas; False si no declara ninguna."""
+        try:
+            with open(path, 'rb') as f: content = f.read().decode('utf-8')
+        except (OSError, UnicodeDecodeError): return False
+        found = False
+        for node in parse_tmdl(content).children_of("table"):
+            self.tables[node.name] = (path, node.start_offset, node.end_offset)
+            for measure in node.measures: self.measures[measure.name] = node.name
+            for column in node.columns: self.columns.add((node.name, column.name))
+            found = True
+        return found
+
+
+class LazyTmdlModel:
+    """
+    Modelo TMDL de carga bajo demanda. Construye un TmdlIndex y materializa tablas (columnas,
+    medidas y código M) solo cuando se accede a ellas, manteniendo como máximo max_tables en
+    un LRU. Expone tables/measures/parameters/expressions/relationships/global_objects como TmdlParser,
+    de modo que MCodeAnalyzer, DaxAnalyzer y UsageIntegrator funcionan igual; recorrer
+    tables.items() o iter_tables() materializa de una en una (generador).
+    """
+    def __init__(self, root_folder, max_tables=DEFAULT_MAX_TABLES, quiet=False):
+        self.root = root_folder
+        self.max_tables = max_tables
+        self.index = TmdlIndex(root_folder).build()
+        self._table_ids = {name: i for i, name in enumerate(self.index.tables)}
+        self._loaded = OrderedDict()     # nombre -> (Table, {medida: Measure})
+        self._parameters = None
+        self._expressions = None
+        self._relationships = None
+        self.tables = _LazyTables(self)
+        self.measures = _LazyMeasures(self)
+        if not quiet: print(f"Índice TMDL: {len(self.index.tables)} tablas en {self.root}")
+
+    # ------------------------------------------------------------------
+    def _materialize(self, name):
+        if name in self._loaded:
+            self._loaded.move_to_end(name)
+            return self._loaded[name]
+        path, start, end = self.index.tables[name]
+        with open(path, 'rb') as f:
+            f.seek(start)
+            partial = parse_tmdl_bytes(f.read(end - start))
+        table = partial["tables"].get(name)
+        if table is None: raise KeyError(name)
+        table.id = self._table_ids[name]
+        entry = (table, partial["measures"])
+        self._loaded[name] = entry
+        if len(self._loaded) > self.max_tables: self._loaded.popitem(last=False)
+        return entry
+
+    def table(self, name):
+        return self._materialize(name)[0]
+
+    def iter_tables(self):
+        for name in self.index.tables:
+            yield name, self.table(name)
+
+    def iter_measures(self):
+        for name in self.index.tables:
+            yield from self._materialize(name)[1].items()
+
+    # ------------------------------------------------------------------
+    @property
+    def global_objects(self):
+        # Nombres tomados del índice: no se lee ni se materializa ninguna tabla
+        return {"tables": set(self.index.tables), "measures": set(self.index.measures), "columns": set(self.index.columns)}
+
+    def _load_expressions(self):
+        # Parámetros y consultas compartidas viven fuera de las tablas (expressions.tmdl)
+        self._parameters, self._expressions = {}, {}
+        for path in self.index.other_files:
+            partial = parse_tmdl_file(path)
+            self._parameters.update(partial["parameters"])
+            self._expressions.update(partial["expressions"])
+
+    @property
+    def parameters(self):
+        if self._parameters is None: self._load_expressions()
+        return self._parameters
+
+    @property
+    def expressions(self):
+        if self._expressions is None: self._load_expressions()
+        return self._expressions
+
+    @property
+    def relationships(self):
+        if self._relationships is None:
+            rel_file = self.index.relationships_file
+            self._relationships = read_relationships(rel_file) if rel_file else []
+        return self._relationships
+
+
+class _LazyTables(Mapping):
+    """Vista tipo dict de las tablas: iterar nombres no materializa nada."""
+    def __init__(self, model): self._model = model
+    def __getitem__(self, name):
+        if name not in self._model.index.tables: raise KeyError(name)
+        return self._model.table(name)
+    def __iter__(self): return iter(self._model.index.tables)
+    def __len__(self): return len(self._model.index.tables)
+    def __contains__(self, name): return name in self._model.index.tables
+
+
+class _LazyMeasures(Mapping):
+    """Vista tipo dict de las medidas: materializa solo la tabla que contiene la medida pedida."""
+    def __init__(self, model): self._model = model
+    def __getitem__(self, name):
+        home = self._model.index.measures.get(name)
+        if home is None: raise KeyError(name)
+        return self._model._materialize(home)[1][name]
+    def __iter__(self): return iter(self._model.index.measures)
+    def __len__(self): return len(self._model.index.measures)
+    def __contains__(self, name): return name in self._model.index.measures
+    def items(self): return self._model.iter_measures()
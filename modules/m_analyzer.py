@@ -1,27 +1,110 @@
 import re
+from collections import namedtuple
+from .m_lexer import parse_query
+from .metrics import metrics
+
+# Origen real de una consulta: chain son las consultas intermedias recorridas hasta el origen
+# y upstream todas las consultas del modelo que referencia directamente
+SourceLineage = namedtuple("SourceLineage", ["origin_type", "origin_path", "chain", "upstream"])
+GENERAL_TRANSFORM = "Transformación General"
+# Linaje de columnas (se compilan una sola vez)
+RX_M_EXPAND = re.compile(r'Table\.ExpandTableColumn\s*\(\s*([^,]+)\s*,\s*"([^"]+)"\s*,\s*(\{.*?\})(?:,\s*(\{.*?\})?)?\s*\)', re.DOTALL)
+RX_M_ADD_COLUMN = re.compile(r'Table\.AddColumn\(\s*[^,]*?,\s*"([^"]+)"\s*,\s*(?:each\s*)?(.*)', re.IGNORECASE)
+RX_M_RENAME_SINGLE = re.compile(r'\{\s*\{"([^"]+)"\s*,\s*"([^"]+)"\}\s*\}')
+RX_M_RENAME_CALL = re.compile(r'Table\.RenameColumns\s*\(')
+RX_M_PAIR = re.compile(r'\{\s*"([^"]+)"\s*,\s*"([^"]+)"\s*\}')
+RX_M_QUOTED = re.compile(r'"([^"]*)"')
+
+class ParameterSubstitutor:
+    """
+    Sustituye todos los parámetros del modelo en una sola pasada sobre el código M.
+    Una única regex alternada y precompilada por modelo (nombres de mayor a menor longitud,
+    para que gane la coincidencia más larga) reconoce tanto #"Param" como Param entre
+    límites de palabra. La misma pasada registra qué parámetros aparecen.
+    """
+    def __init__(self, parameters):
+        self.parameters = dict(parameters)
+        self.order = {name: i for i, name in enumerate(self.parameters)}
+        names = sorted(self.parameters, key=len, reverse=True)
+        self.pattern = None
+        if names:
+            quoted = "|".join(re.escape(n) for n in names)
+            bare = "|".join(r'\b' + re.escape(n) + r'\b' for n in names)
+            self.pattern = re.compile(f'#"({quoted})"|({bare})')
+
+    def apply(self, code):
+        """Devuelve (código con los parámetros sustituidos, parámetros usados en orden de declaración)."""
+        if self.pattern is None: return code, []
+        found = set()
+        def _replace(match):
+            name = match.group(1) or match.group(2)
+            found.add(name)
+            return f'"{self.parameters[name]}"'
+        resolved = self.pattern.sub(_replace, code)
+        return resolved, sorted(found, key=self.order.get)
 
-RX_M_LET = re.compile(r'let\s+(.*)\s+in', re.DOTALL)
-RX_M_STEP_ASSIGN = re.compile(r'^(?:#?"?([\w\s\-\.\(\)/]+)"?)\s*=\s*(.*)')
 
 class MCodeAnalyzer:
     """ Analizador Forense de Código M (Power Query) """
-    def __init__(self, model_context):
+    def __init__(self, model_context, parse_memo=None):
         self.context = model_context
+        # Consultas ya tokenizadas {código: Query} de una ejecución anterior (modo --watch);
+        # parsed_codes guarda las usadas en esta, para sustituir a parse_memo en la siguiente
+        self.parse_memo = parse_memo
+        self.parsed_codes = {}
         self.nested_joins_map = {}
+        # Parámetros referenciados por cada tabla (cuando se pasa table_name a resolve_source_info)
+        self.table_parameters = {}
+        self._substitutor = None
+        self._lineage = None
+        self._lineage_code = None
+        # Grafo entre consultas (tablas + expresiones compartidas), memoizado por nombre
+        self._queries = None
+        self._parsed_queries = {}
+        self._source_lineage = {}
 
-    def resolve_source_info(self, m_code):
+    def _get_substitutor(self):
+        # Se construye una vez por modelo; solo se rehace si cambian los parámetros
+        params = self.context.parameters
+        if self._substitutor is None or self._substitutor.parameters != params:
+            self._substitutor = ParameterSubstitutor(params)
+        return self._substitutor
+
+    def resolve_source_info(self, m_code, table_name=None):
         if not m_code: return "Calculada / DirectQuery", "Modelo Interno", {}, ""
         
-        origin_type = "Transformación General"
+        origin_type, origin_path, code_resolved, used_params = self.classify_source(m_code)
+        if table_name is not None: self.table_parameters[table_name] = used_params
+
+        # Pasos del let (tokenizado: pasos multilínea, #"nombres", cadenas y comentarios)
+        query = self._parse(code_resolved)
+        if query.has_let: steps = {name: step.text for name, step in query.steps.items()}
+        else: steps = {"Consulta Directa": code_resolved}
+
+        # Mapeo Joins
+        metrics.count("m.consultas"); metrics.count("m.escaneos_regex", 2)
+        flat_code = code_resolved.replace('\n', ' ').replace('\r', '')
+        join_matches = re.finditer(r'Table\.NestedJoin\s*\(\s*[^,]+,\s*\{[^}]+\}\s*,\s*([^,]+)\s*,\s*\{[^}]+\}\s*,\s*"([^"]+)"', flat_code)
+        self.nested_joins_map = {} 
+        for match in join_matches:
+            raw_table = match.group(1).strip().replace('#"', '').replace('"', '')
+            new_col_name = match.group(2).strip()
+            self.nested_joins_map[new_col_name] = raw_table
+        
+        return origin_type, origin_path, steps, code_resolved
+
+    def classify_source(self, m_code):
+        """
+        Tipo y ruta de origen del propio código M (sin seguir referencias a otras consultas).
+        Devuelve (tipo, ruta, código con parámetros sustituidos, parámetros usados). No modifica estado.
+        """
+        origin_type = GENERAL_TRANSFORM
         origin_path = "Lógica Interna"
-        param_detected = False
-
-        # Detección Parámetros
-        for param_name in self.context.parameters:
-            if f'#"{param_name}"' in m_code or re.search(r'\b' + re.escape(param_name) + r'\b', m_code):
-                origin_path = f"Parámetro: {param_name}"
-                param_detected = True
-                break
+
+        # Detección y sustitución de parámetros en una sola pasada
+        code_resolved, used_params = self._get_substitutor().apply(m_code)
+        param_detected = bool(used_params)
+        if param_detected: origin_path = f"Parámetro: {used_params[0]}"
         
         if "Excel.Workbook" in m_code or "Excel.Database" in m_code: origin_type = "Excel"
         elif "Sql.Database" in m_code: origin_type = "SQL Database"
@@ -35,58 +118,109 @@ class MCodeAnalyzer:
             elif origin_type == "SQL Database": origin_path = self._extract_sql(m_code)
             elif origin_type == "SharePoint": origin_path = self._extract_path(m_code, r'SharePoint\.\w+\(\s*"([^"]+)"') or "SharePoint Site"
             elif origin_type == "Dataflow": origin_path = "Dataflow ID"
+        return origin_type, origin_path, code_resolved, used_params
 
-        # Sustitución Parámetros para análisis
-        code_resolved = m_code
-        for param, value in self.context.parameters.items():
-            code_resolved = code_resolved.replace(f'#"{param}"', f'"{value}"')
-            code_resolved = re.sub(r'\b' + re.escape(param) + r'\b', f'"{value}"', code_resolved)
-
-        # Parsing
-        steps = {}
-        let_match = RX_M_LET.search(code_resolved)
-        if let_match:
-            lines = let_match.group(1).split('\n')
-            current_step = "Inicio"; buffer = []
-            for line in lines:
-                ls = line.strip()
-                if not ls: continue
-                step_match = RX_M_STEP_ASSIGN.match(ls)
-                if step_match and not ls.startswith("in"):
-                    if buffer: steps[current_step] = "\n".join(buffer)
-                    current_step = step_match.group(1); buffer = [step_match.group(2)]
-                else: buffer.append(line)
-            if buffer: steps[current_step] = "\n".join(buffer)
-        else: steps = {"Consulta Directa": code_resolved}
+    # ------------------------------------------------------------------
+    # Linaje entre consultas (tablas que referencian otras tablas o expresiones compartidas)
+    # ------------------------------------------------------------------
+    def queries(self):
+        """Consultas M del modelo: {nombre: código} de tablas y expresiones compartidas."""
+        if self._queries is None:
+            self._queries = {name: code for name, code in getattr(self.context, "expressions", {}).items() if code}
+            for name, data in self.context.tables.items():
+                if data["m_code"]: self._queries[name] = data["m_code"]
+        return self._queries
 
-        # Mapeo Joins
-        flat_code = code_resolved.replace('\n', ' ').replace('\r', '')
-        join_matches = re.finditer(r'Table\.NestedJoin\s*\(\s*[^,]+,\s*\{[^}]+\}\s*,\s*([^,]+)\s*,\s*\{[^}]+\}\s*,\s*"([^"]+)"', flat_code)
-        self.nested_joins_map = {} 
-        for match in join_matches:
-            raw_table = match.group(1).strip().replace('#"', '').replace('"', '')
-            new_col_name = match.group(2).strip()
-            self.nested_joins_map[new_col_name] = raw_table
-        
-        return origin_type, origin_path, steps, code_resolved
+    def parsed_query(self, name):
+        if name not in self._parsed_queries:
+            self._parsed_queries[name] = self._parse(self.queries()[name])
+        return self._parsed_queries[name]
+
+    def _parse(self, code):
+        if self.parse_memo is None: return parse_query(code)
+        query = self.parse_memo.get(code)
+        if query is None: query = parse_query(code)
+        self.parsed_codes[code] = query
+        return query
+
+    def resolve_lineage(self, name, _active=None):
+        """
+        Origen de extremo a extremo de una consulta: si su propio código es una transformación
+        general que parte de otra consulta del modelo, hereda el origen de esa consulta (de forma
+        recursiva). Cada consulta se analiza una sola vez aunque la referencien muchas tablas.
+        Devuelve un SourceLineage o None si el nombre no es una consulta M del modelo.
+        """
+        if name in self._source_lineage: return self._source_lineage[name]
+        queries = self.queries()
+        if name not in queries: return None
+        active = _active if _active is not None else set()
+        if name in active: return SourceLineage("Referencia circular", name, (), ())
+
+        origin_type, origin_path, _, _ = self.classify_source(queries[name])
+        upstream = tuple(i for i in self.parsed_query(name).external_identifiers() if i in queries and i != name)
+        if origin_type == GENERAL_TRANSFORM and upstream:
+            # La consulta principal es la primera referenciada por los pasos (normalmente 'Source')
+            active.add(name)
+            parent = self.resolve_lineage(upstream[0], active)
+            active.discard(name)
+            result = SourceLineage(parent.origin_type, parent.origin_path, (upstream[0],) + parent.chain, upstream)
+        else:
+            result = SourceLineage(origin_type, origin_path, (), upstream)
+        self._source_lineage[name] = result
+        return result
 
     def _extract_path(self, text, pattern):
         m = re.search(pattern, text); return m.group(1) if m else None
     def _extract_sql(self, text):
         m = re.search(r'Sql\.Database\(\s*"([^"]+)"\s*,\s*"([^"]+)"', text); return f"{m.group(1)} | {m.group(2)}" if m else "SQL"
 
+    def build_lineage(self, full_code):
+        """
+        Índice de linaje de una tabla: columna de salida -> (descripción, tipo), construido con
+        una sola pasada de cada patrón sobre el código M ya resuelto. Mantiene la prioridad de
+        siempre: Expand > AddColumn > Rename > Origen (y, dentro de cada tipo, la primera aparición).
+        """
+        expands, added, renamed = {}, {}, {}
+        metrics.count("m.escaneos_regex", 4)
+        for match in RX_M_EXPAND.finditer(full_code):
+            bridge_col = match.group(2).strip()
+            search_list = match.group(4) if match.group(4) else match.group(3)
+            if bridge_col in self.nested_joins_map: result = (f"Expandido de: {self.nested_joins_map[bridge_col]}", "Expand")
+            else: result = (f"Expandido de columna: {bridge_col}", "Expand")
+            for name in RX_M_QUOTED.findall(search_list):
+                expands.setdefault(name, result)
+        for match in RX_M_ADD_COLUMN.finditer(full_code):
+            added.setdefault(match.group(1).casefold(), f"Calculado (M): {match.group(2).split(',')[0][:100]}...")
+        for old_name, new_name in self._rename_pairs(full_code):
+            renamed.setdefault(new_name, f"Renombrada desde: [{old_name}]")
+        return {"expand": expands, "add": added, "rename": renamed}
+
+    @staticmethod
+    def _rename_pairs(full_code):
+        # Listas completas de Table.RenameColumns(..., {{"a", "b"}, {"c", "d"}})
+        for call in RX_M_RENAME_CALL.finditer(full_code):
+            start = full_code.find("{", call.end())
+            if start == -1: continue
+            depth = 0
+            for i in range(start, len(full_code)):
+                ch = full_code[i]
+                if ch == "{": depth += 1
+                elif ch == "}":
+                    depth -= 1
+                    if depth == 0: break
+            yield from RX_M_PAIR.findall(full_code, start, i + 1)
+        # Renombrados de un solo par fuera de RenameColumns (comportamiento original)
+        yield from RX_M_RENAME_SINGLE.findall(full_code)
+
     def trace_column(self, col_name, steps, full_code):
-        col_regex = re.escape(col_name)
-        rx_expand = re.compile(r'Table\.ExpandTableColumn\s*\(\s*([^,]+)\s*,\s*"([^"]+)"\s*,\s*(\{.*?\})(?:,\s*(\{.*?\})?)?\s*\)', re.DOTALL)
-        for match in rx_expand.finditer(full_code):
-            bridge_col = match.group(2).strip() 
-            cols_source = match.group(3); cols_new = match.group(4)           
-            search_list = cols_new if cols_new else cols_source
-            if f'"{col_name}"' in search_list:
-                if bridge_col in self.nested_joins_map: return f"Expandido de: {self.nested_joins_map[bridge_col]}", "Expand"
-                else: return f"Expandido de columna: {bridge_col}", "Expand"
-        add_col_search = re.search(r'Table\.AddColumn\(.*?"' + col_regex + r'"\s*,\s*(?:each\s*)?(.*)', full_code, re.IGNORECASE)
-        if add_col_search: return f"Calculado (M): {add_col_search.group(1).split(',')[0][:100]}...", "Transformación"
-        rename_search = re.search(r'\{\s*\{"([^"]+)"\s*,\s*"' + col_regex + r'"\}\s*\}', full_code)
-        if rename_search: return f"Renombrada desde: [{rename_search.group(1)}]", "Transformación"
+        # El índice se construye una vez por código M; cada columna es una búsqueda en diccionario
+        if self._lineage_code is not full_code:
+            self._lineage = self.build_lineage(full_code)
+            self._lineage_code = full_code
+        lineage = self._lineage
+        if col_name in lineage["expand"]: return lineage["expand"][col_name]
+        added = lineage["add"].get(col_name.casefold())
+        if added: return added, "Transformación"
+        renamed = lineage["rename"].get(col_name)
+        if renamed: return renamed, "Transformación"
         return "Cargada desde Origen", "Origen"
@@ -0,0 +1,173 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+# Un solo patrón alternado: el orden importa (comentarios y #"..." antes que cadenas y operadores)
+RX_M_TOKEN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<qid>\#"(?:[^"]|"")*")
+  | (?P<string>"(?:[^"]|"")*"?)
+  | (?P<ident>\#?[^\W\d][\w.]*)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<op>=>|<=|>=|<>|\.\.\.|\.\.|[^\s\w])
+  | (?P<ws>\s+)
+''', re.DOTALL | re.VERBOSE)
+
+OPENERS = {"(": ")", "[": "]", "{": "}"}
+CLOSERS = set(OPENERS.values())
+# Palabras reservadas de M (no son referencias a pasos ni a otras consultas)
+M_KEYWORDS = {
+    "let", "in", "each", "if", "then", "else", "and", "or", "not", "true", "false", "null",
+    "type", "meta", "try", "otherwise", "catch", "error", "as", "is", "section", "shared",
+}
+
+
+@dataclass
+class MToken:
+    kind: str        # ident, qid, string, number, op
+    text: str
+    start: int
+    end: int
+
+    @property
+    def name(self) -> str:
+        """Nombre del identificador sin #"..." ni comillas escapadas."""
+        return self.text[2:-1].replace('""', '"') if self.kind == "qid" else self.text
+
+
+@dataclass
+class MStep:
+    """
+    Paso de un 'let': nombre, texto original de la expresión (multilínea incluido),
+    pasos del mismo let de los que depende e identificadores externos (otras consultas,
+    parámetros, variables locales...). Las funciones de biblioteca (Table.X) no se registran.
+    """
+    name: str
+    text: str
+    refs: List[str] = field(default_factory=list)
+    identifiers: List[str] = field(default_factory=list)
+
+
+@dataclass
+class MQuery:
+    """Consulta M analizada: pasos en orden de declaración y expresión final (tras 'in')."""
+    steps: Dict[str, MStep] = field(default_factory=dict)
+    output: Optional[MStep] = None
+
+    @property
+    def has_let(self) -> bool: return bool(self.steps)
+
+    def ancestors(self) -> List[str]:
+        """Pasos de los que depende (directa o indirectamente) la salida, en orden de declaración."""
+        if self.output is None: return []
+        seen: Set[str] = set()
+        pending = list(self.output.refs)
+        while pending:
+            name = pending.pop()
+            if name in seen: continue
+            seen.add(name)
+            pending.extend(self.steps[name].refs)
+        return [name for name in self.steps if name in seen]
+
+    def external_identifiers(self) -> List[str]:
+        """Identificadores externos usados por la salida y sus pasos, en orden de aparición."""
+        found = {}
+        for name in self.ancestors() + [None]:
+            step = self.output if name is None else self.steps[name]
+            for ident in step.identifiers: found.setdefault(ident, None)
+        return list(found)
+
+
+def tokenize(code: str) -> List[MToken]:
+    """Tokens significativos del código M (sin espacios ni comentarios)."""
+    tokens = []
+    for match in RX_M_TOKEN.finditer(code):
+        kind = match.lastgroup
+        if kind in ("ws", "comment"): continue
+        tokens.append(MToken(kind, match.group(), match.start(), match.end()))
+    return tokens
+
+
+def parse_query(code: str) -> MQuery:
+    """
+    Divide una consulta 'let ... in' en pasos respetando cadenas, #"nombres", comentarios,
+    paréntesis/llaves/corchetes y 'let' anidados, y calcula el grafo de dependencias entre pasos.
+    Sin 'let' de primer nivel, toda la consulta es la salida.
+    """
+    tokens = tokenize(code)
+    query = MQuery()
+    if not tokens or tokens[0].kind != "ident" or tokens[0].text != "let":
+        if tokens: query.output = _make_step(code, "", tokens, query.steps)
+        return query
+
+    bindings = []     # (nombre, tokens de la expresión)
+    i, n = 1, len(tokens)
+    output_tokens = []
+    while i < n:
+        tok = tokens[i]
+        if tok.kind not in ("ident", "qid") or i + 1 >= n or tokens[i + 1].text != "=":
+            break     # sintaxis no reconocida: se conserva lo leído hasta aquí
+        start = i + 2
+        end, closing = _scan_expression(tokens, start)
+        bindings.append((tok.name, tokens[start:end]))
+        i = end + 1
+        if closing == "in":
+            output_tokens = tokens[i:]
+            break
+
+    for name, expr_tokens in bindings:
+        query.steps[name] = None     # nombre conocido antes de analizar referencias adelantadas
+    for name, expr_tokens in bindings:
+        query.steps[name] = _make_step(code, name, expr_tokens, query.steps)
+    if output_tokens:
+        query.output = _make_step(code, "", output_tokens, query.steps)
+    return query
+
+
+def _scan_expression(tokens, i):
+    """Avanza hasta la ',' o el 'in' que cierran la expresión de un paso. Devuelve (índice, cierre)."""
+    depth = nested_let = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        text = tok.text
+        if tok.kind == "op":
+            if text in OPENERS: depth += 1
+            elif text in CLOSERS: depth -= 1
+            elif text == "," and depth == 0 and nested_let == 0: return i, ","
+        elif tok.kind == "ident":
+            if text == "let": nested_let += 1
+            elif text == "in":
+                if nested_let == 0 and depth == 0: return i, "in"
+                if nested_let: nested_let -= 1
+        i += 1
+    return i, None
+
+
+def _field_positions(tokens):
+    """Posiciones de los nombres de campo: [Campo], [Nombre con espacios] y '[Campo =' / ', Campo ='."""
+    skip = set()
+    for k, tok in enumerate(tokens):
+        if tok.kind != "op" or tok.text not in ("[", ","): continue
+        j = k + 1
+        while j < len(tokens) and tokens[j].kind in ("ident", "qid", "number"): j += 1
+        if j == k + 1 or j >= len(tokens): continue
+        if tokens[j].text == "=" or (tokens[j].text == "]" and tok.text == "["):
+            skip.update(range(k + 1, j))
+    return skip
+
+
+def _make_step(code, name, tokens, step_names):
+    text = code[tokens[0].start:tokens[-1].end] if tokens else ""
+    refs, identifiers = {}, {}
+    skip = _field_positions(tokens)
+    for k, tok in enumerate(tokens):
+        if k in skip: continue
+        if tok.kind == "ident":
+            ident = tok.text
+            # Palabras reservadas, #table/#date... y funciones de biblioteca (Table.AddColumn)
+            if ident in M_KEYWORDS or ident.startswith("#") or "." in ident: continue
+        elif tok.kind == "qid": ident = tok.name
+        else: continue
+        if ident in step_names and ident != name: refs.setdefault(ident, None)
+        else: identifiers.setdefault(ident, None)
+    return MStep(name, text, list(refs), list(identifiers))
@@ -0,0 +1,132 @@
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import resource     # solo Unix: memoria residente máxima del proceso
+except ImportError:
+    resource = None
+
+_NO_OP = nullcontext()
+
+
+class RunMetrics:
+    """
+    Métricas de una ejecución: tiempos por etapa (reloj y CPU), contadores, pico de memoria
+    (tracemalloc) y perfil cProfile opcional. Desactivada por defecto: stage() devuelve un
+    contexto vacío compartido y count() retorna de inmediato, así que instrumentar el código
+    no tiene coste apreciable si no se pide --metrics/--profile.
+    Los módulos usan la instancia global `metrics`; los scripts de entrada la activan con enable().
+    """
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}        # nombre -> [reloj_s, cpu_s, llamadas]
+        self.counters = {}
+        self.info = {}
+        self._open = []         # etapas en curso (para anidar con 'padre/hija')
+        self._trace_memory = False
+        self._profiler = None
+        self._profile_path = None
+        self._started = None
+
+    def enable(self, trace_memory=True, profile_path=None, **info):
+        """Activa la recogida. trace_memory usa tracemalloc (ralentiza el proceso; ver README)."""
+        self.enabled = True
+        self.info.update(info)
+        self._started = (time.perf_counter(), time.process_time(), datetime.now().isoformat(timespec="seconds"))
+        self._trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing(): tracemalloc.start()
+        if profile_path:
+            self._profile_path = profile_path
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    # ------------------------------------------------------------------
+    def stage(self, name):
+        """Contexto que acumula tiempo de reloj y de CPU en la etapa 'name'."""
+        return self._stage(name) if self.enabled else _NO_OP
+
+    @contextmanager
+    def _stage(self, name):
+        full = "/".join(self._open + [name])
+        self._open.append(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(full, [0.0, 0.0, 0])
+            entry[0] += time.perf_counter() - wall
+            entry[1] += time.process_time() - cpu
+            entry[2] += 1
+            self._open.pop()
+
+    def count(self, name, n=1):
+        if self.enabled: self.counters[name] = self.counters.get(name, 0) + n
+
+    # ------------------------------------------------------------------
+    def report(self):
+        """Informe de la ejecución como diccionario serializable a JSON."""
+        wall0, cpu0, started = self._started or (time.perf_counter(), time.process_time(), None)
+        memory = {}
+        if self._trace_memory and tracemalloc.is_tracing():
+            memory["pico_tracemalloc_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        if resource is not None:
+            # ru_maxrss: KB en Linux, bytes en macOS
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            memory["max_rss_mb"] = round(rss / (2**20 if sys.platform == "darwin" else 2**10), 2)
+        return {
+            "inicio": started,
+            "comando": sys.argv,
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            **self.info,
+            "total": {"reloj_s": round(time.perf_counter() - wall0, 4), "cpu_s": round(time.process_time() - cpu0, 4)},
+            "etapas": {name: {"reloj_s": round(w, 4), "cpu_s": round(c, 4), "llamadas": n}
+                       for name, (w, c, n) in self.stages.items()},
+            "contadores": dict(sorted(self.counters.items())),
+            "memoria": memory,
+        }
+
+    def finish(self, json_path=None):
+        """Detiene el perfil, escribe el JSON (si se pidió) e imprime un resumen por etapas."""
+        if not self.enabled: return None
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self._profile_path)
+            print(f"Perfil cProfile guardado en: {self._profile_path}")
+            self._profiler = None
+        data = self.report()
+        print("--- Métricas por etapa (reloj / CPU) ---")
+        for name, stage in data["etapas"].items():
+            print(f"  {name:<40} {stage['reloj_s']:>9.3f} s {stage['cpu_s']:>9.3f} s  x{stage['llamadas']}")
+        if data["memoria"]: print(f"  Memoria: {data['memoria']}")
+        if json_path:
+            folder = os.path.dirname(os.path.abspath(json_path))
+            os.makedirs(folder, exist_ok=True)
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            print(f"Métricas guardadas en: {json_path}")
+        if self._trace_memory and tracemalloc.is_tracing(): tracemalloc.stop()
+        return data
+
+
+# Instancia global del proceso (desactivada hasta que un script de entrada llame a enable())
+metrics = RunMetrics()
+
+
+def add_metrics_arguments(parser):
+    """Opciones comunes de métricas para los scripts de entrada."""
+    parser.add_argument("--metrics", metavar="JSON", help="Guardar un informe de métricas (tiempos, contadores, memoria) en JSON")
+    parser.add_argument("--profile", metavar="PROF", help="Guardar un perfil cProfile de la ejecución (p. ej. run.prof)")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Con --metrics, no medir el pico de memoria con tracemalloc (más rápido)")
+
+
+def enable_from_args(args, **info):
+    if args.metrics or args.profile:
+        metrics.enable(trace_memory=bool(args.metrics) and not args.no_tracemalloc, profile_path=args.profile, **info)
@@ -0,0 +1,280 @@
+import numpy as np
+import pandas as pd
+from .tmdl_parser import OriginType
+from .m_analyzer import MCodeAnalyzer
+from .dax_analyzer import DaxAnalyzer
+from .dax_graph import DaxDependencyGraph
+from .relationship_graph import DIAGNOSTIC_COLUMNS, RelationshipGraph
+from .metrics import metrics
+
+# Orden de las hojas de la auditoría de modelo
+AUDIT_SHEETS = ["Relaciones", "Diagnóstico Relaciones", "Transformaciones M", "Dependencias DAX", "Resumen Columnas Usadas", "Inventario"]
+# Modo --watch: con más medidas modificadas que esto, 'Resumen Columnas Usadas' se recalcula entero
+MAX_INCREMENTAL_MEASURES = 256
+
+
+def _lineage_label(name, source):
+    """'Ventas <- Staging [SQL Database | srv | DW]' para tablas que parten de otras consultas."""
+    if not source or not source.chain: return ""
+    return f"{' <- '.join((name,) + source.chain)} [{source.origin_type} | {source.origin_path}]"
+
+
+class AuditMemo:
+    """
+    Resultados intermedios de build_audit_sheets que se reutilizan entre ejecuciones sobre el mismo
+    modelo en memoria (modo --watch). Cada entrada se valida con las entradas de las que depende y
+    lo que no se usa en una ejecución se descarta.
+    - m_tables: tabla -> (clave, [(consulta, linaje) consultados], filas de 'Transformaciones M')
+    - m_queries: código M -> consulta tokenizada
+    - dax_deps: expresión -> dependencias, válidas mientras no cambien los nombres del modelo (dax_names)
+    - usage: columnas que necesita cada medida, válidas mientras no cambien sus referencias ni las de su cierre
+    """
+    def __init__(self):
+        self.m_tables = {}
+        self.m_queries = {}
+        self.dax_deps = {}
+        self.dax_names = None
+        self.usage = {}          # medida -> (posiciones en el catálogo de columnas, directa?) de 'Resumen Columnas Usadas'
+        self.usage_catalog = None
+        self.measure_refs = {}   # medida -> referencias directas con las que se calculó usage
+        self.stats = {}      # último cálculo: tablas M y expresiones DAX recalculadas
+
+
+class MemoDependencies:
+    """DaxAnalyzer.get_dependencies memoizado por expresión."""
+    def __init__(self, analyzer, known):
+        self.analyzer, self.known, self.used, self.computed = analyzer, known, {}, 0
+
+    def get_dependencies(self, expression):
+        deps = self.known.get(expression)
+        if deps is None:
+            deps = self.analyzer.get_dependencies(expression); self.computed += 1
+        self.used[expression] = deps
+        return deps
+
+
+def _columnar(columns, categorical=()):
+    """DataFrame a partir de listas paralelas; las columnas con muchos valores repetidos van como categóricas."""
+    df = pd.DataFrame(columns)
+    for name in categorical: df[name] = df[name].astype("category")
+    return df
+
+
+def _reused_usage_pairs(dax_graph, node_pos, catalog_keys, memo):
+    """
+    Pares (posición en el catálogo, id de medida, directa?) reutilizando los de la ejecución anterior:
+    solo se recorre el cierre de las medidas con referencias nuevas o modificadas y de las que dependen
+    de ellas. Si cambia el catálogo de columnas, o demasiadas medidas, se recorren todas.
+    """
+    refs = {name: tuple(dax_graph.direct(name)) for name, kind in dax_graph.keys if kind == OriginType.MEASURE}
+    changed = [name for name, r in refs.items() if memo.measure_refs.get(name) != r]
+    reuse = memo.usage if memo.usage_catalog == catalog_keys and len(changed) <= MAX_INCREMENTAL_MEASURES else {}
+    affected = set(changed)
+    if reuse:
+        for name in changed: affected.update(dax_graph.required_by(name, OriginType.MEASURE))
+    usage, nodes, lengths = {}, [], []
+    for name in refs:
+        entry = reuse.get(name) if name not in affected else None
+        if entry is None:
+            columns, flags = dax_graph.measure_columns(name)
+            positions = node_pos[np.array(columns, dtype=np.int64)]
+            keep = positions >= 0
+            entry = (positions[keep], np.array(flags, dtype=bool)[keep])
+        usage[name] = entry
+        nodes.append(dax_graph.ids[(name, OriginType.MEASURE)]); lengths.append(len(entry[0]))
+    memo.usage, memo.usage_catalog, memo.measure_refs = usage, catalog_keys, refs
+    memo.stats["medidas_uso"] = len(refs) if not reuse else len(affected)
+    if not usage: return (np.zeros(0, dtype=np.int64),) * 2 + (np.zeros(0, dtype=bool),)
+    return (np.concatenate([e[0] for e in usage.values()]),
+            np.repeat(np.array(nodes, dtype=np.int64), lengths),
+            np.concatenate([e[1] for e in usage.values()]))
+
+
+def _column_usage_sheet(model, dax_graph, memo=None):
+    """
+    Hoja 'Resumen Columnas Usadas' sin filas intermedias de Python: el catálogo de columnas y los
+    pares (columna, medida) del grafo se cruzan como arrays de enteros (posición en el catálogo y
+    código de medida), se ordenan con lexsort y las columnas de texto se crean como categóricas.
+    """
+    tables, table_codes, column_names, column_codes, catalog = [], [], {}, [], {}
+    for t_name, t_data in model.tables.items():
+        tables.append(t_name)
+        for c_name in t_data["columns"]:
+            catalog[f"{t_name}[{c_name}]"] = len(column_codes)
+            table_codes.append(len(tables) - 1)
+            column_codes.append(column_names.setdefault(c_name, len(column_names)))
+    n = len(column_codes)
+
+    node_pos = np.full(len(dax_graph.keys), -1, dtype=np.int64)
+    for (name, kind), node in dax_graph.ids.items():
+        if kind == OriginType.COLUMN and name in catalog: node_pos[node] = catalog[name]
+    if memo is not None:
+        positions, measure_nodes, direct = _reused_usage_pairs(dax_graph, node_pos, tuple(catalog), memo)
+    else:
+        col_nodes, measure_nodes, direct = (np.array(a, dtype=np.int64) for a in dax_graph.column_usage_pairs())
+        positions = node_pos[col_nodes] if len(col_nodes) else col_nodes
+        keep = positions >= 0
+        positions, measure_nodes, direct = positions[keep], measure_nodes[keep], direct[keep].astype(bool)
+
+    # Medidas como códigos en orden alfabético (el orden de siempre dentro de cada columna)
+    used_nodes = np.unique(measure_nodes)
+    measure_names = sorted(dax_graph.keys[v][0] for v in used_nodes)
+    rank = {name: i for i, name in enumerate(measure_names)}
+    node_code = np.zeros(len(dax_graph.keys), dtype=np.int64)
+    for v in used_nodes: node_code[v] = rank[dax_graph.keys[v][0]]
+    measure_codes = node_code[measure_nodes]
+
+    # Columnas sin uso: una fila con código de medida vacío, al final de su grupo (sort estable)
+    unused = np.flatnonzero(np.bincount(positions, minlength=n) == 0)
+    empty = len(measure_names)
+    all_pos = np.concatenate([positions, unused])
+    all_measure = np.concatenate([measure_codes, np.full(len(unused), empty, dtype=np.int64)])
+    all_type = np.concatenate([np.where(direct, 0, 1), np.full(len(unused), 2, dtype=np.int64)])
+    order = np.lexsort((all_measure, all_pos))
+    all_pos, all_measure, all_type = all_pos[order], all_measure[order], all_type[order]
+
+    return pd.DataFrame({
+        "Tabla": pd.Categorical.from_codes(np.array(table_codes, dtype=np.int64)[all_pos], tables),
+        "Columna": pd.Categorical.from_codes(np.array(column_codes, dtype=np.int64)[all_pos], list(column_names)),
+        "Estado Uso": pd.Categorical.from_codes((all_measure == empty).astype(np.int64), ["Usada", "No usada en medida"]),
+        "Medida": pd.Categorical.from_codes(all_measure, measure_names + [""]),
+        "Tipo Uso": pd.Categorical.from_codes(all_type, ["Directa", "Indirecta", ""]),
+    })
+
+
+def _table_m_rows(m_analyzer, tbl_name, data):
+    """
+    Filas de 'Transformaciones M' de una tabla, sin Color_ID: (tabla, columna, transformación, origen,
+    tipo, linaje). Devuelve también las consultas cuyo linaje se ha usado, con su valor.
+    """
+    rows, consulted = [], {}
+    m_code = data["m_code"]
+    tbl_type, tbl_path, steps, resolved_code = m_analyzer.resolve_source_info(m_code, tbl_name)
+    # Si la tabla parte de otra consulta (staging, expresión compartida), su origen real es el de esa consulta
+    source = consulted[tbl_name] = m_analyzer.resolve_lineage(tbl_name)
+    if source and source.chain: tbl_type, tbl_path = source.origin_type, source.origin_path
+    tbl_lineage = _lineage_label(tbl_name, source)
+
+    for column in data.columns:
+        col = column.name
+        trans_desc, col_type = m_analyzer.trace_column(col, steps, resolved_code)
+        final_path = tbl_path; final_type = tbl_type; col_lineage = tbl_lineage
+    
+        if col_type == "Transformación": final_type = "Transformación (Power Query)"
+        elif col_type == "Expand":
+            final_type = "Join/Expand"
+            if "Expandido de:" in trans_desc:
+                final_path = trans_desc.replace("Expandido de: ", "")
+                consulted[final_path] = m_analyzer.resolve_lineage(final_path)
+                col_lineage = _lineage_label(final_path, consulted[final_path])
+            else: final_path = "Tabla Relacionada"
+    
+        calc_expr = column.expression
+        if calc_expr: final_path = "Modelo Interno"; final_type = "DAX / Interno"; trans_desc = f"Columna Calculada: {calc_expr[:100]}"
+        elif not m_code: final_type = "DAX / Interno"; trans_desc = "Columna Calculada o Estática"
+        rows.append((tbl_name, col, trans_desc, final_path, final_type, col_lineage))
+    return rows, tuple(consulted.items())
+
+
+def build_audit_sheets(model, memo=None):
+    """
+    Genera las hojas de la auditoría (Relaciones, Diagnóstico Relaciones, Transformaciones M, Dependencias DAX,
+    Resumen Columnas Usadas e Inventario) a partir de un modelo ya parseado.
+    Devuelve un diccionario {nombre de hoja: DataFrame}.
+    memo: AuditMemo opcional para recalcular solo las tablas y medidas que han cambiado.
+    """
+    dax_analyzer = DaxAnalyzer(model.global_objects, model.tables, model.measures)
+    m_analyzer = MCodeAnalyzer(model, memo.m_queries if memo is not None else None)
+    
+    print("Generando reportes...")
+    df_relaciones = pd.DataFrame(model.relationships)
+    
+    # --- FORZAR ORDEN DE COLUMNAS EN RELACIONES ---
+    if not df_relaciones.empty:
+        cols_order = ["Tabla Origen", "Columna Origen", "Columna Destino", "Tabla Destino", "Tipo Relacion", "Activo?", "Filtro Cruzado"]
+        # Asegurar que solo seleccionamos columnas que existen
+        cols_to_select = [c for c in cols_order if c in df_relaciones.columns]
+        df_relaciones = df_relaciones[cols_to_select]
+
+    # Diagnóstico de caminos de filtro (ambigüedades, bucles bidireccionales, cadenas N:N, islas)
+    with metrics.stage("diagnostico_relaciones"):
+        df_diag_rel = pd.DataFrame(RelationshipGraph(model.relationships, model.tables).diagnostics(), columns=DIAGNOSTIC_COLUMNS)
+        serious = int((df_diag_rel["Severidad"] == "Alta").sum())
+        if serious: print(f"ADVERTENCIA: {serious} problemas graves en las relaciones (ver hoja 'Diagnóstico Relaciones').")
+
+    # Transformaciones M (listas paralelas, una por columna de la hoja)
+    with metrics.stage("transformaciones_m"):
+        m_cols = {"Nombre Tabla": [], "Nombre Columna": [], "Transformacion": [], "Origen": [],
+                  "Tipo_Origen": [], "Color_ID": [], "Linaje Consultas": []}
+        m_tables, recomputed = {}, 0
+        params = tuple(model.parameters.items())
+        for table_id, (tbl_name, data) in enumerate(model.tables.items(), 1):
+            entry = memo.m_tables.get(tbl_name) if memo is not None else None
+            key = (data["m_code"], tuple((c.name, c.expression) for c in data.columns), params) if memo is not None else None
+            # Reutilizable si no cambian su código, sus columnas, los parámetros ni el linaje de las consultas que consultó
+            if entry is None or entry[0] != key or any(m_analyzer.resolve_lineage(n) != lin for n, lin in entry[1]):
+                rows, consulted = _table_m_rows(m_analyzer, tbl_name, data)
+                entry = (key, consulted, rows); recomputed += 1
+            m_tables[tbl_name] = entry
+            for tbl, col, trans_desc, final_path, final_type, col_lineage in entry[2]:
+                for field, value in (("Nombre Tabla", tbl), ("Nombre Columna", col), ("Transformacion", trans_desc),
+                                     ("Origen", final_path), ("Tipo_Origen", final_type), ("Color_ID", table_id),
+                                     ("Linaje Consultas", col_lineage)):
+                    m_cols[field].append(value)
+            
+        df_transf_m = _columnar(m_cols, ("Nombre Tabla", "Transformacion", "Origen", "Tipo_Origen", "Linaje Consultas"))
+    
+    # Grafo de dependencias DAX (una vez por modelo): directas para la hoja, transitivas para el resumen
+    with metrics.stage("grafo_dax"):
+        names = {kind: set(objs) for kind, objs in model.global_objects.items()}
+        dependencies = dax_analyzer
+        if memo is not None:
+            # Con los mismos nombres en el modelo solo se analizan las expresiones nuevas o modificadas
+            dependencies = MemoDependencies(dax_analyzer, memo.dax_deps if memo.dax_names == names else {})
+        dax_graph = DaxDependencyGraph(model.measures, dependencies)
+        if memo is not None:
+            memo.m_tables, memo.m_queries = m_tables, m_analyzer.parsed_codes
+            memo.dax_deps, memo.dax_names = dependencies.used, names
+            memo.stats = {"tablas_m": recomputed, "expresiones_dax": dependencies.computed}
+        for cycle in dax_graph.cycles:
+            print(f"ADVERTENCIA: Dependencia circular entre medidas: {', '.join(cycle)}")
+
+    # Dependencias DAX: cada expresión se recorta una sola vez y se repite por referencia (categórica)
+    with metrics.stage("hoja_dependencias"):
+        dep_measure, dep_home, dep_name, dep_type, dep_expr = [], [], [], [], []
+        for m_name, m_data in model.measures.items():
+            deps = dax_graph.direct(m_name)
+            expression = m_data["expression"]
+            if not deps: deps, expression = [("Hardcoded", None)], expression[:100]
+            else: expression = expression[:5000]
+            for dn, dt in deps:
+                dep_measure.append(m_name); dep_home.append(m_data["home_table"]); dep_name.append(dn)
+                dep_type.append(dt.value if dt is not None else "N/A"); dep_expr.append(expression)
+        df_deps = _columnar({"Medida": dep_measure, "Tabla Home": dep_home, "Dependencia": dep_name,
+                             "Tipo Origen": dep_type, "Expresion": dep_expr},
+                            ("Medida", "Tabla Home", "Dependencia", "Tipo Origen", "Expresion"))
+    
+    # REPORTE PIVOT_LONGER (uso transitivo: una medida que usa otra medida también usa sus columnas)
+    with metrics.stage("hoja_uso_columnas"):
+        df_used = _column_usage_sheet(model, dax_graph, memo)
+
+    # Inventario
+    with metrics.stage("hoja_inventario"):
+        inv_owner, inv_name, inv_type, inv_expr = [], [], [], []
+        for t, data in model.tables.items():
+            inv_owner.append(t); inv_name.append(t); inv_type.append("Tabla"); inv_expr.append(data["m_code"][:5000] if data["m_code"] else "")
+            for c in data.columns:
+                inv_owner.append(t); inv_name.append(c.name); inv_type.append("Columna"); inv_expr.append((c.expression or "")[:5000])
+        for m, data in model.measures.items():
+            inv_owner.append(data["home_table"]); inv_name.append(m); inv_type.append("Medida"); inv_expr.append(data["expression"][:5000])
+        df_inv = _columnar({"Tabla Pertenencia": inv_owner, "Nombre": inv_name, "Tipo": inv_type, "Expresion": inv_expr},
+                           ("Tabla Pertenencia", "Tipo"))
+
+    return {
+        "Relaciones": df_relaciones,
+        "Diagnóstico Relaciones": df_diag_rel,
+        "Transformaciones M": df_transf_m,
+        "Dependencias DAX": df_deps,
+        "Resumen Columnas Usadas": df_used,
+        "Inventario": df_inv
+    }
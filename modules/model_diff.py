@@ -0,0 +1,214 @@
+import difflib
+import hashlib
+import os
+import time
+import pandas as pd
+from .tmdl_parser import parse_tmdl_bytes, read_relationships
+from .metrics import metrics
+
+# Columnas de las hojas del informe de cambios
+DIFF_COLUMNS = ["Tipo Objeto", "Objeto", "Cambio", "Detalle", "Diff"]
+SUMMARY_COLUMNS = ["Tipo Objeto", "Añadidos", "Eliminados", "Modificados"]
+DIFF_SHEET = "Cambios Modelo"
+SUMMARY_SHEET = "Resumen Cambios"
+ADDED, REMOVED, MODIFIED = "Añadido", "Eliminado", "Modificado"
+# Orden de los tipos en el informe
+OBJECT_KINDS = ["Tabla", "Partición M", "Columna", "Medida", "Expresión M", "Parámetro", "Relación"]
+MAX_DIFF_CHARS = 5000
+# Líneas del resumen por consola (el detalle completo va a las hojas)
+MAX_REPORT_LINES = 200
+REL_FILE = "relationships.tmdl"
+
+
+def _digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(str(part).encode("utf-8")); h.update(b"\0")
+    return h.hexdigest()
+
+
+def expression_diff(old, new):
+    """Diff unificado (difflib) entre dos versiones de una expresión, recortado a MAX_DIFF_CHARS."""
+    lines = difflib.unified_diff((old or "").splitlines(), (new or "").splitlines(), "anterior", "nuevo", n=1, lineterm="")
+    return "\n".join(lines)[:MAX_DIFF_CHARS]
+
+
+def column_hash(col):
+    return _digest(col.name, col.data_type, col.expression, col.source_column)
+
+
+def measure_hash(measure):
+    return _digest(measure.name, measure.home_table, measure.expression)
+
+
+def table_hash(table):
+    """Nodo de tabla del árbol: partición M más los hashes de sus columnas (sin depender del orden)."""
+    return _digest(table.m_code, *sorted(column_hash(c) for c in table.columns))
+
+
+class ModelSnapshot:
+    """
+    Hojas del árbol de Merkle de una carpeta definition: archivos TMDL por ruta relativa con su os.stat.
+    El SHA-1 de un archivo solo se calcula si hace falta (mismo tamaño en la otra versión) y, con una
+    ParseCache, un archivo con el mismo mtime y tamaño que en la ejecución anterior no se vuelve a leer.
+    """
+    def __init__(self, root, cache=None):
+        self.root = root
+        self.cache = cache
+        self.files = {}     # ruta relativa -> (ruta, os.stat_result)
+        self._digests = {}
+        for subdir, dirs, names in os.walk(root):
+            for name in names:
+                if not name.endswith('.tmdl'): continue
+                path = os.path.join(subdir, name)
+                self.files[os.path.relpath(path, root).replace(os.sep, "/")] = (path, os.stat(path))
+
+    def file_digest(self, rel):
+        if rel not in self.files: return None
+        if rel not in self._digests:
+            path, st = self.files[rel]
+            if self.cache is not None: self._digests[rel] = self.cache.digest(path, st)
+            else:
+                with open(path, 'rb') as f: self._digests[rel] = hashlib.sha1(f.read()).hexdigest()
+        return self._digests[rel]
+
+    def same_file(self, other, rel):
+        """Mismo contenido en las dos versiones; con tamaños distintos no hace falta leer ni hashear."""
+        if (rel in self.files) != (rel in other.files): return False
+        if rel not in self.files: return True
+        if self.files[rel][1].st_size != other.files[rel][1].st_size: return False
+        return self.file_digest(rel) == other.file_digest(rel)
+
+    def read(self, rel):
+        with open(self.files[rel][0], 'rb') as f: return f.read()
+
+
+class _Side:
+    """Objetos de una versión, solo de los archivos que han cambiado."""
+    def __init__(self):
+        self.tables, self.measures, self.parameters, self.expressions = {}, {}, {}, {}
+
+    def add(self, partial):
+        self.tables.update(partial["tables"]); self.measures.update(partial["measures"])
+        self.parameters.update(partial["parameters"]); self.expressions.update(partial["expressions"])
+
+
+class ModelDiff:
+    """
+    Diferencias estructurales entre dos versiones de un modelo (carpetas definition) con un árbol de hashes:
+    modelo -> archivo TMDL -> tabla -> columnas/medidas/partición. Un archivo con el mismo hash en ambas
+    versiones no se parsea, una tabla con el mismo hash no se recorre, y solo los objetos cuyo hash
+    difiere se comparan campo a campo (con diff de expresiones). Con una ParseCache los hashes de los
+    archivos sin cambios salen de su índice mtime+tamaño, así que también la lectura depende del tamaño del cambio.
+    """
+    def __init__(self, old_root, new_root, cache=None):
+        self.old_root = old_root
+        self.new_root = new_root
+        self.cache = cache
+        self.changes = []
+        self.stats = {}
+
+    def run(self):
+        start = time.perf_counter()
+        with metrics.stage("diff_hash_archivos"):
+            old, new = ModelSnapshot(self.old_root, self.cache), ModelSnapshot(self.new_root, self.cache)
+            changed = sorted(rel for rel in old.files.keys() | new.files.keys() if not old.same_file(new, rel))
+        self.stats = {"archivos": len(old.files.keys() | new.files.keys()), "archivos_iguales": 0,
+                      "archivos_parseados": 0, "tablas_comparadas": 0, "tablas_iguales": 0}
+        self.stats["archivos_iguales"] = self.stats["archivos"] - len(changed)
+        if not changed:
+            self.stats["segundos"] = round(time.perf_counter() - start, 3)
+            print("Las dos versiones del modelo son idénticas.")
+            return self.changes
+
+        relationships_changed = REL_FILE in changed
+        changed = [rel for rel in changed if rel != REL_FILE]
+        with metrics.stage("diff_parseo"):
+            before, after = _Side(), _Side()
+            for rel in changed:
+                if rel in old.files: before.add(parse_tmdl_bytes(old.read(rel))); self.stats["archivos_parseados"] += 1
+                if rel in new.files: after.add(parse_tmdl_bytes(new.read(rel))); self.stats["archivos_parseados"] += 1
+        with metrics.stage("diff_objetos"):
+            self._diff_tables(before.tables, after.tables)
+            self._diff_keyed("Medida", before.measures, after.measures, measure_hash, self._measure_detail)
+            self._diff_keyed("Expresión M", before.expressions, after.expressions, _digest,
+                             lambda a, b: ("expresión", expression_diff(a, b)))
+            self._diff_keyed("Parámetro", before.parameters, after.parameters, _digest,
+                             lambda a, b: (f"valor: {a} -> {b}", ""))
+            if relationships_changed: self._diff_relationships()
+        order = {k: i for i, k in enumerate(OBJECT_KINDS)}
+        self.changes.sort(key=lambda r: (order[r["Tipo Objeto"]], r["Objeto"], r["Cambio"]))
+        self.stats["segundos"] = round(time.perf_counter() - start, 3)
+        metrics.count("diff.archivos_parseados", self.stats["archivos_parseados"])
+        print(f"Diff: {len(self.changes)} cambios; {self.stats['archivos_iguales']} de {self.stats['archivos']} archivos sin cambios "
+              f"(no parseados), {self.stats['tablas_iguales']} tablas iguales por hash ({self.stats['segundos']:.3f} s).")
+        return self.changes
+
+    def _add(self, kind, name, change, detail="", diff=""):
+        self.changes.append({"Tipo Objeto": kind, "Objeto": name, "Cambio": change, "Detalle": detail, "Diff": diff})
+
+    def _diff_keyed(self, kind, before, after, hasher, detail, label=lambda name: name):
+        """Añadidos, eliminados y modificados (por hash) de dos diccionarios nombre -> objeto."""
+        for name in before.keys() - after.keys(): self._add(kind, label(name), REMOVED)
+        for name in after.keys() - before.keys(): self._add(kind, label(name), ADDED)
+        for name in before.keys() & after.keys():
+            a, b = before[name], after[name]
+            if hasher(a) != hasher(b): self._add(kind, label(name), MODIFIED, *detail(a, b))
+
+    def _diff_tables(self, before, after):
+        for name in before.keys() - after.keys():
+            self._add("Tabla", name, REMOVED, f"{len(before[name].columns)} columnas")
+        for name in after.keys() - before.keys():
+            self._add("Tabla", name, ADDED, f"{len(after[name].columns)} columnas")
+        for name in before.keys() & after.keys():
+            a, b = before[name], after[name]
+            self.stats["tablas_comparadas"] += 1
+            if table_hash(a) == table_hash(b):
+                self.stats["tablas_iguales"] += 1; continue
+            if a.m_code != b.m_code: self._add("Partición M", name, MODIFIED, "código M", expression_diff(a.m_code, b.m_code))
+            self._diff_keyed("Columna", {c.name: c for c in a.columns}, {c.name: c for c in b.columns},
+                             column_hash, self._column_detail, lambda col: f"{name}[{col}]")
+
+    @staticmethod
+    def _changed_fields(pairs):
+        return ", ".join(f"{label}: {x} -> {y}" for label, x, y in pairs if x != y)
+
+    def _column_detail(self, a, b):
+        fields = self._changed_fields([("tipo", a.data_type, b.data_type), ("origen", a.source_column, b.source_column)])
+        if a.expression == b.expression: return fields, ""
+        return ", ".join(filter(None, [fields, "expresión"])), expression_diff(a.expression, b.expression)
+
+    def _measure_detail(self, a, b):
+        fields = self._changed_fields([("tabla", a.home_table, b.home_table)])
+        if a.expression == b.expression: return fields, ""
+        return ", ".join(filter(None, [fields, "expresión"])), expression_diff(a.expression, b.expression)
+
+    def _diff_relationships(self):
+        sides = []
+        for root in (self.old_root, self.new_root):
+            path = os.path.join(root, REL_FILE)
+            relationships = read_relationships(path, self.cache) if os.path.exists(path) else []
+            # Los nombres de relación (GUID) pueden regenerarse: la clave son las columnas que une
+            sides.append({(r.from_table, r.from_column, r.to_table, r.to_column): r for r in relationships})
+        state = lambda r: (r.cardinality_label, r["Activo?"], r["Filtro Cruzado"])
+        self._diff_keyed("Relación", sides[0], sides[1], lambda r: _digest(*state(r)),
+                         lambda a, b: (self._changed_fields(zip(("cardinalidad", "activa", "filtro"), state(a), state(b))), ""),
+                         lambda key: f"{key[0]}[{key[1]}] -> {key[2]}[{key[3]}]")
+
+    # ------------------------------------------------------------------
+    def summary(self):
+        counts = {kind: {ADDED: 0, REMOVED: 0, MODIFIED: 0} for kind in OBJECT_KINDS}
+        for row in self.changes: counts[row["Tipo Objeto"]][row["Cambio"]] += 1
+        return pd.DataFrame([{"Tipo Objeto": kind, "Añadidos": c[ADDED], "Eliminados": c[REMOVED], "Modificados": c[MODIFIED]}
+                             for kind, c in counts.items()], columns=SUMMARY_COLUMNS)
+
+    def sheets(self):
+        return {SUMMARY_SHEET: self.summary(), DIFF_SHEET: pd.DataFrame(self.changes, columns=DIFF_COLUMNS)}
+
+    def report(self, max_lines=MAX_REPORT_LINES):
+        """Resumen compacto para consola: '+ Medida X', '- Columna T[C]', '~ Medida Y (expresión)'."""
+        marks = {ADDED: "+", REMOVED: "-", MODIFIED: "~"}
+        lines = [f"{marks[r['Cambio']]} {r['Tipo Objeto']} {r['Objeto']}" + (f" ({r['Detalle']})" if r["Detalle"] else "")
+                 for r in self.changes]
+        if len(lines) > max_lines: lines = lines[:max_lines] + [f"... y {len(lines) - max_lines} cambios más (ver hoja '{DIFF_SHEET}')"]
+        return "\n".join(lines)
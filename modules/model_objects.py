@@ -0,0 +1,117 @@
+import sys
+from collections.abc import Mapping
+
+CARDINALITY_LABELS = {
+    ("many", "one"): "N -> 1", ("one", "many"): "1 -> N",
+    ("one", "one"): "1 -> 1", ("many", "many"): "N -> N",
+}
+
+
+def intern_name(name):
+    """Interna los nombres del modelo: cada nombre repetido ocupa memoria una sola vez."""
+    return sys.intern(name) if name else name
+
+
+class ModelObject(Mapping):
+    """
+    Base de los objetos del modelo (con __slots__, sin __dict__ por instancia).
+    Expone una vista de solo lectura tipo dict (obj["clave"], obj.get, items...) con las
+    claves que usaban los diccionarios anidados originales, para no romper a DaxAnalyzer,
+    MCodeAnalyzer, UsageIntegrator ni a pandas (pd.DataFrame(lista_de_objetos)).
+    Cada subclase declara en _keys la clave de la vista y el atributo que la resuelve.
+    La igualdad y el hash son por identidad (no los de Mapping): dos columnas con la misma
+    expresión son objetos distintos y todos se pueden usar en conjuntos o como claves.
+    """
+    __slots__ = ()
+    _keys = {}   # clave de la vista -> nombre del atributo
+
+    def __getitem__(self, key):
+        if key not in self._keys: raise KeyError(key)
+        return getattr(self, self._keys[key])
+
+    def __iter__(self): return iter(self._keys)
+    def __len__(self): return len(self._keys)
+    def __repr__(self): return f"{type(self).__name__}({dict(self)!r})"
+
+    __eq__ = object.__eq__
+    __ne__ = object.__ne__
+    __hash__ = object.__hash__
+
+
+class Column(ModelObject):
+    __slots__ = ("id", "name", "table", "data_type", "expression", "source_column")
+    _keys = {"dataType": "data_type", "expression": "expression", "sourceColumn": "source_column"}
+
+    def __init__(self, name, table, data_type=None, expression="", source_column=None):
+        self.id = -1
+        self.name = intern_name(name)
+        self.table = intern_name(table)
+        self.data_type = intern_name(data_type)
+        self.expression = expression
+        self.source_column = intern_name(source_column)
+
+    @property
+    def qualified_name(self): return f"{self.table}[{self.name}]"
+
+
+class Table(ModelObject):
+    __slots__ = ("id", "name", "columns", "m_code", "hierarchies")
+    _keys = {"columns": "column_name_list", "m_code": "m_code", "column_info": "column_info"}
+
+    def __init__(self, name, m_code="", columns=None, hierarchies=None):
+        self.id = -1
+        self.name = intern_name(name)
+        self.m_code = m_code
+        self.columns = columns or []
+        self.hierarchies = hierarchies or {}   # jerarquía -> {nivel: columna}
+
+    def column_names(self): return [c.name for c in self.columns]
+
+    @property
+    def column_name_list(self): return self.column_names()
+
+    @property
+    def column_info(self): return {c.name: c for c in self.columns}
+
+
+class Measure(ModelObject):
+    __slots__ = ("id", "name", "expression", "home_table")
+    _keys = {"expression": "expression", "home_table": "home_table"}
+
+    def __init__(self, name, expression, home_table):
+        self.id = -1
+        self.name = intern_name(name)
+        self.expression = expression
+        self.home_table = intern_name(home_table)
+
+
+class Relationship(ModelObject):
+    __slots__ = ("id", "name", "from_table", "from_column", "to_table", "to_column",
+                 "from_cardinality", "to_cardinality", "is_active", "cross_filter")
+    # Claves en el orden de la hoja "Relaciones"
+    _keys = {"Tabla Origen": "from_table", "Columna Origen": "from_column", "Columna Destino": "to_column",
+             "Tabla Destino": "to_table", "Tipo Relacion": "cardinality_label", "Activo?": "active_label",
+             "Filtro Cruzado": "cross_filter_label"}
+
+    def __init__(self, from_table, from_column, to_table, to_column,
+                 from_cardinality="many", to_cardinality="one", is_active=True, name="", cross_filter="oneDirection"):
+        self.id = -1
+        self.name = name
+        self.from_table = intern_name(from_table)
+        self.from_column = intern_name(from_column)
+        self.to_table = intern_name(to_table)
+        self.to_column = intern_name(to_column)
+        self.from_cardinality = intern_name(from_cardinality)
+        self.to_cardinality = intern_name(to_cardinality)
+        self.is_active = is_active
+        self.cross_filter = intern_name(cross_filter)
+
+    @property
+    def cardinality_label(self):
+        return CARDINALITY_LABELS.get((self.from_cardinality, self.to_cardinality), "N -> 1")
+
+    @property
+    def active_label(self): return "Sí" if self.is_active else "No"
+
+    @property
+    def cross_filter_label(self): return "Ambas" if self.cross_filter == "bothDirections" else "Única"
@@ -0,0 +1,155 @@
+import glob
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from .report_logic import PBIPReport, IO_THREADS
+from .usage_integrator import SymbolIndex
+from .metrics import metrics
+
+SUMMARY_SHEET = "Resumen Informes"
+MATRIX_SHEET = "Matriz Uso"
+# Columnas de las hojas de detalle (las mismas que en el análisis de un solo informe)
+VISUAL_COLUMNS = ['Nombre_Pag', 'Titulo', 'Objeto Visual', 'Tabla', 'Valor', 'Tipo_Valor']
+MATRIX_COLUMNS = ["Tabla", "Nombre Objeto", "Tipo", "Ubicacion", "Total Visuales", "Informes"]
+SHEET_NAME_MAX = 31
+_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+def discover_reports(patterns):
+    """
+    Carpetas *.Report a partir de rutas o globs; una carpeta que no es .Report se explora un nivel.
+    Devuelve una lista ordenada y sin repetidos de rutas.
+    """
+    found = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches: print(f"ADVERTENCIA: '{pattern}' no coincide con ninguna carpeta.")
+        for path in matches:
+            if not os.path.isdir(path): continue
+            candidates = [path] if path.endswith('.Report') else sorted(glob.glob(os.path.join(path, "*.Report")))
+            for report in candidates: found.setdefault(os.path.abspath(report), report)
+    return [found[k] for k in sorted(found)]
+
+
+def sheet_title(name, suffix, used):
+    """Nombre de hoja válido para Excel (31 caracteres, sin []:*?/\\) y único sin distinguir mayúsculas."""
+    base = _INVALID_SHEET_CHARS.sub("_", name)
+    title, n = f"{base[:SHEET_NAME_MAX - len(suffix)]}{suffix}", 1
+    while title.lower() in used:
+        n += 1
+        tail = f" ({n}){suffix}"
+        title = f"{base[:SHEET_NAME_MAX - len(tail)]}{tail}"
+    used.add(title.lower())
+    return title
+
+
+def visual_frame(rows):
+    """DataFrame de los campos de un informe con las columnas de detalle más 'Campo' (para el cruce con el modelo)."""
+    df = pd.DataFrame(rows)
+    for col in VISUAL_COLUMNS + ['Campo']:
+        if col not in df.columns: df[col] = None
+    return df
+
+
+class MultiReportAnalysis:
+    """
+    Análisis de muchos informes conectados al mismo modelo semántico en una sola pasada.
+    - El modelo se parsea fuera una vez y su SymbolIndex se comparte entre todos los informes.
+    - Las lecturas de todos los informes van a un único pool de hilos, así que la latencia de un
+      informe se solapa con la de los demás (la caché solo se consulta desde el hilo principal).
+    - Un fallo en un informe no detiene el resto; queda en la hoja de resumen.
+    """
+    def __init__(self, report_paths, model=None, cache=None, io_threads=IO_THREADS):
+        self.report_paths = report_paths
+        self.model = model
+        self.cache = cache
+        self.io_threads = max(1, io_threads)
+        self.index = SymbolIndex(model) if model is not None and getattr(model, 'tables', None) else None
+        self.summary = []
+        self.reports = {}   # informe -> DataFrame de campos (visual_frame)
+        self.paths = {}     # informe -> carpeta .Report
+        self.counts = {}    # informe -> conteo por fila del inventario del índice
+
+    def run(self):
+        print(f"Informes a analizar: {len(self.report_paths)}")
+        # Los nombres de informe son columnas de la matriz: no pueden coincidir con las fijas
+        used = {c.lower() for c in MATRIX_COLUMNS}
+        with ThreadPoolExecutor(max_workers=self.io_threads) as pool:
+            # 1. Recorrer las carpetas de todos los informes a la vez y planificar las lecturas antes de esperar a ninguna
+            scans, plans = [], []
+            for path in self.report_paths:
+                name = self._unique_name(os.path.basename(os.path.normpath(path)).replace('.Report', ''), used)
+                try:
+                    report = PBIPReport(path, cache=self.cache, io_threads=self.io_threads)
+                    scans.append((name, path, report, report.scan(pool)))
+                except Exception as e:
+                    self._record(name, path, None, error=f"{type(e).__name__}: {e}")
+            for name, path, report, scanned in scans:
+                try: plans.append((name, path, report, report.start(pool, scanned)))
+                except Exception as e: self._record(name, path, report, error=f"{type(e).__name__}: {e}")
+            # 2. Recoger en orden y cruzar con el índice del modelo
+            for name, path, report, plan in plans:
+                try:
+                    with metrics.stage("informe"): df = visual_frame(report.finish(plan))
+                except Exception as e:
+                    self._record(name, path, report, error=f"{type(e).__name__}: {e}")
+                    continue
+                self.reports[name], self.paths[name] = df, path
+                unresolved = 0
+                if self.index is not None:
+                    with metrics.stage("integracion"): self.counts[name], unresolved = self.index.count_usage(df)
+                self._record(name, path, report, fields=len(df), unresolved=unresolved)
+        order = {path: i for i, path in enumerate(self.report_paths)}
+        self.summary.sort(key=lambda r: order[r["Ruta"]])
+        metrics.count("informes.analizados", len(self.reports))
+        failed = [r["Informe"] for r in self.summary if r["Estado"] != "OK"]
+        print(f"Informes analizados: {len(self.reports)} OK, {len(failed)} con errores {failed if failed else ''}")
+        return self.reports
+
+    @staticmethod
+    def _unique_name(name, used):
+        unique, n = name, 1
+        while unique.lower() in used:
+            n += 1
+            unique = f"{name} ({n})"
+        used.add(unique.lower())
+        return unique
+
+    def _record(self, name, path, report, fields=0, unresolved=0, error=""):
+        timings = report.page_timings if report is not None and not error else []
+        self.summary.append({
+            "Informe": name, "Ruta": path, "Formato": ("PBIR" if report.is_pbir else "Legacy") if report is not None else "",
+            "Estado": "ERROR" if error else "OK", "Paginas": len(timings), "Visuales": sum(p["Visuales"] for p in timings),
+            "Campos": fields, "Campos Sin Modelo": unresolved,
+            "Segundos Lectura": round(sum(p["Segundos"] for p in timings), 3), "Error": error})
+        if error: print(f"[{name}] ERROR: {error}")
+
+    # ------------------------------------------------------------------
+    def usage_matrix(self):
+        """
+        Matriz objeto del modelo x informe con el número de visuales que lo usan, más el total
+        y el número de informes que lo usan (0 = no se usa en ningún informe analizado).
+        """
+        if self.index is None: return pd.DataFrame()
+        names = [n for n in self.reports if n in self.counts]
+        counts = pd.DataFrame({n: self.counts[n] for n in names}, columns=names, dtype="int64")
+        matrix = pd.concat([pd.DataFrame(self.index.rows), counts], axis=1)
+        matrix["Total Visuales"] = counts.sum(axis=1)
+        matrix["Informes"] = (counts > 0).sum(axis=1)
+        return matrix.sort_values(by=["Tabla", "Total Visuales"], ascending=[True, False])
+
+    def inventory(self, name):
+        """Inventario con el conteo de un solo informe (mismas columnas que 'Inventario y Uso')."""
+        if self.index is None or name not in self.counts: return pd.DataFrame()
+        df = pd.DataFrame(self.index.rows)
+        df["Conteo Visuales"] = self.counts[name]
+        return df.sort_values(by=["Tabla", "Conteo Visuales"], ascending=[True, False])
+
+    def sheets(self):
+        """Hojas de salida: resumen, matriz de uso y una hoja de detalle por informe."""
+        used = {SUMMARY_SHEET.lower(), MATRIX_SHEET.lower()}
+        sheets = {SUMMARY_SHEET: pd.DataFrame(self.summary), MATRIX_SHEET: self.usage_matrix()}
+        for name, df in self.reports.items():
+            sheets[sheet_title(name, " - Visuales", used)] = df[VISUAL_COLUMNS]
+        return sheets
@@ -0,0 +1,158 @@
+import csv
+import os
+import re
+from collections import namedtuple
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+# pyarrow es opcional: solo hace falta para --format parquet
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+OUTPUT_FORMATS = ("xlsx", "csv", "parquet")
+# Filas por lote al trocear un DataFrame ya materializado
+BATCH_ROWS = 50_000
+EMPTY_SHEET = "Sin datos"
+# Filas por hoja de Excel (incluida la cabecera)
+XLSX_MAX_ROWS = 1_048_576
+
+# Hoja producida por lotes: columnas fijas + iterable de lotes (DataFrames o listas de tuplas fila).
+# Permite escribir hojas grandes desde un generador sin tenerlas enteras en memoria.
+SheetStream = namedtuple("SheetStream", ["columns", "batches"])
+
+
+def sheet_batches(data, batch_rows=BATCH_ROWS):
+    """(columnas, iterador de DataFrames) para un DataFrame o un SheetStream, siempre con las mismas columnas y orden."""
+    if isinstance(data, SheetStream):
+        columns = list(data.columns)
+        def frames():
+            for batch in data.batches:
+                if isinstance(batch, pd.DataFrame):
+                    if not batch.empty: yield batch.reindex(columns=columns)
+                else:
+                    rows = list(batch)
+                    if rows: yield pd.DataFrame.from_records(rows, columns=columns)
+        return columns, frames()
+    if data.empty: return list(data.columns), iter(())
+    return list(data.columns), (data.iloc[i:i + batch_rows] for i in range(0, len(data), batch_rows))
+
+
+def _safe_filename(sheet_name):
+    return re.sub(r'[\\/:*?"<>|]', "_", sheet_name)
+
+
+class XlsxSink:
+    """
+    Libro xlsx en modo write-only de openpyxl: cada fila se serializa al añadirla y no se guardan
+    objetos celda, así que la memoria no crece con el tamaño de la hoja.
+    """
+    def __init__(self, output_path):
+        self.path = output_path
+        self.workbook = Workbook(write_only=True)
+        self._bold = Font(bold=True)
+
+    def write_sheet(self, name, columns, frames):
+        ws, part, sheet_rows, rows = self._new_sheet(name, columns), 1, 0, 0
+        for df in frames:
+            # Categóricas -> valores, NaN/NA -> celda vacía
+            values = df.astype(object).where(df.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                if sheet_rows == XLSX_MAX_ROWS - 1:
+                    # Límite de filas de Excel: el resto continúa en 'Hoja (2)', 'Hoja (3)'...
+                    part += 1
+                    ws, sheet_rows = self._new_sheet(f"{name[:25]} ({part})", columns), 0
+                    print(f"ADVERTENCIA: La hoja '{name}' supera {XLSX_MAX_ROWS} filas; continúa en '{ws.title}'.")
+                ws.append(row)
+                sheet_rows += 1
+            rows += len(df)
+        if not rows: ws.append([EMPTY_SHEET])
+        return rows
+
+    def _new_sheet(self, title, columns):
+        ws = self.workbook.create_sheet(title=title)
+        if columns: ws.append([self._header_cell(ws, c) for c in columns])
+        return ws
+
+    def _header_cell(self, ws, value):
+        cell = WriteOnlyCell(ws, value=str(value))
+        cell.font = self._bold
+        return cell
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class CsvSink:
+    """Carpeta con un CSV por hoja (UTF-8 con BOM para que Excel respete los acentos)."""
+    def __init__(self, output_path):
+        self.path = os.path.splitext(output_path)[0]
+        os.makedirs(self.path, exist_ok=True)
+
+    def write_sheet(self, name, columns, frames):
+        rows = 0
+        with open(os.path.join(self.path, f"{_safe_filename(name)}.csv"), 'w', encoding='utf-8-sig', newline='') as f:
+            csv.writer(f).writerow(columns)
+            for df in frames:
+                df.to_csv(f, header=False, index=False)
+                rows += len(df)
+        return rows
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    """Carpeta con un Parquet por hoja, escrito por grupos de filas (un grupo por lote)."""
+    def __init__(self, output_path):
+        if pa is None: raise RuntimeError(missing_dependency("parquet"))
+        self.path = os.path.splitext(output_path)[0]
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def _normalize(df):
+        # Texto, categóricas y columnas mixtas -> string (mismo tipo en todos los lotes); los números se mantienen
+        return df.apply(lambda s: s if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype)
+                        else s.astype("string"))
+
+    def write_sheet(self, name, columns, frames):
+        path = os.path.join(self.path, f"{_safe_filename(name)}.parquet")
+        writer, rows = None, 0
+        try:
+            for df in frames:
+                table = pa.Table.from_pandas(self._normalize(df), preserve_index=False)
+                if writer is None: writer = pq.ParquetWriter(path, table.schema)
+                else: table = table.cast(writer.schema)
+                writer.write_table(table)
+                rows += len(df)
+            if writer is None:
+                # Hoja vacía: mismas columnas, cero filas
+                schema = pa.schema([(str(c), pa.string()) for c in columns])
+                pq.write_table(schema.empty_table(), path)
+        finally:
+            if writer is not None: writer.close()
+        return rows
+
+    def close(self):
+        pass
+
+
+SINKS = {"xlsx": XlsxSink, "csv": CsvSink, "parquet": ParquetSink}
+
+
+def missing_dependency(output_format):
+    """Mensaje de error si el formato necesita una librería no instalada (None si está disponible)."""
+    if output_format == "parquet" and pa is None:
+        return "El formato parquet requiere pyarrow (pip install pyarrow). Usa --format xlsx o csv."
+    return None
+
+
+def create_sink(output_format, output_path):
+    """Sink de salida para el formato pedido ('xlsx': un libro; 'csv'/'parquet': una carpeta con un archivo por hoja)."""
+    if output_format not in SINKS:
+        raise ValueError(f"Formato de salida desconocido: {output_format} (opciones: {', '.join(OUTPUT_FORMATS)})")
+    return SINKS[output_format](output_path)
@@ -0,0 +1,274 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from collections import namedtuple
+
+# Cambiar este número invalida todas las entradas (formato de la propia caché)
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".analizador_pbip_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Un archivo modificado en este margen antes de guardar su entrada puede volver a cambiar sin que cambie
+# su mtime (resolución de FAT/OneDrive/red): se guarda sin mtime y la próxima vez se compara su SHA-1
+MTIME_RESOLUTION_NS = 2_000_000_000
+
+# Estado de un archivo leído en un fallo de caché, necesario para store()
+FileState = namedtuple("FileState", ["path", "mtime_ns", "size", "digest", "content"])
+
+
+def _stable_mtime(mtime_ns):
+    """mtime que se puede guardar para el pre-chequeo, o -1 si el archivo acaba de cambiar (ver MTIME_RESOLUTION_NS)."""
+    return mtime_ns if time.time_ns() - mtime_ns >= MTIME_RESOLUTION_NS else -1
+
+
+class ParseCache:
+    """
+    Caché persistente (SQLite) de resultados de parseo por archivo y de snapshots de modelo completo.
+    - Clave: (namespace, ruta absoluta). Pre-chequeo rápido por mtime+tamaño; si no coincide se
+      compara el hash SHA-1 del contenido y, si otro archivo tiene el mismo contenido, se reutiliza.
+    - Los snapshots guardan el SHA-1 de cada archivo: el mtime+tamaño solo evita releerlos.
+    - Un archivo modificado justo antes de guardarse (dentro de MTIME_RESOLUTION_NS) no pasa el
+      pre-chequeo en la siguiente ejecución: su contenido se compara por hash.
+    - Cada namespace lleva su versión de parser: una versión distinta equivale a un fallo.
+    - Tamaño máximo con expulsión LRU al cerrar.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "parse_cache.sqlite")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}
+        self._digests = {}      # ruta -> (mtime_ns, tamaño, sha1) conocidos en esta ejecución
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL, path TEXT NOT NULL, version TEXT NOT NULL,
+                mtime_ns INTEGER, size INTEGER, digest TEXT, payload BLOB,
+                nbytes INTEGER, last_access REAL,
+                PRIMARY KEY (namespace, path))""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_digest ON entries(namespace, digest)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_access ON entries(last_access)")
+
+    def _version(self, version):
+        return f"{CACHE_VERSION}:{version}"
+
+    # ------------------------------------------------------------------
+    # Resultados por archivo
+    # ------------------------------------------------------------------
+    def lookup(self, namespace, version, path, stat=None):
+        """
+        Devuelve (True, resultado) si hay una entrada válida para el archivo.
+        En caso contrario devuelve (False, FileState) con el contenido ya leído para parsearlo
+        y pasarlo después a store(). stat permite reutilizar un os.stat/DirEntry.stat ya hecho.
+        """
+        path = os.path.abspath(path)
+        version = self._version(version)
+        st = stat or os.stat(path)
+        row = self.conn.execute(
+            "SELECT version, mtime_ns, size, digest, payload FROM entries WHERE namespace=? AND path=?",
+            (namespace, path)).fetchone()
+        if row and row[0] == version and row[1] == st.st_mtime_ns and row[2] == st.st_size:
+            self._digests[path] = (st.st_mtime_ns, st.st_size, row[3])
+            return self._hit(namespace, path, row[4])
+
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+        self._digests[path] = (st.st_mtime_ns, st.st_size, digest)
+        state = FileState(path, st.st_mtime_ns, st.st_size, digest, content)
+        if row and row[0] == version and row[3] == digest:
+            self.conn.execute("UPDATE entries SET mtime_ns=?, size=? WHERE namespace=? AND path=?",
+                              (_stable_mtime(st.st_mtime_ns), st.st_size, namespace, path))
+            return self._hit(namespace, path, row[4])
+
+        # Direccionamiento por contenido: mismo archivo en otra ruta (p. ej. expresiones compartidas)
+        twin = self.conn.execute(
+            "SELECT payload FROM entries WHERE namespace=? AND digest=? AND version=? LIMIT 1",
+            (namespace, digest, version)).fetchone()
+        if twin:
+            self._write(namespace, version, state, twin[0])
+            return self._hit(namespace, path, twin[0])
+
+        self.misses += 1
+        return False, state
+
+    def peek(self, namespace, version, path, stat):
+        """
+        Como lookup() pero sin leer el archivo: (True, resultado) si versión, mtime y tamaño coinciden;
+        si no, (False, None) y quien llama lee el archivo y guarda con store(). Útil cuando la lectura
+        se hace en otros hilos (la conexión SQLite solo se usa desde el hilo que la creó).
+        """
+        path = os.path.abspath(path)
+        row = self.conn.execute(
+            "SELECT version, mtime_ns, size, payload FROM entries WHERE namespace=? AND path=?",
+            (namespace, path)).fetchone()
+        if row and row[0] == self._version(version) and row[1] == stat.st_mtime_ns and row[2] == stat.st_size:
+            return self._hit(namespace, path, row[3])
+        self.misses += 1
+        return False, None
+
+    def store(self, namespace, version, state, result):
+        self._write(namespace, self._version(version), state, pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+
+    def _hit(self, namespace, path, payload):
+        self.hits += 1
+        self._touched[(namespace, path)] = time.time()
+        return True, pickle.loads(payload)
+
+    def _write(self, namespace, version, state, payload):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (namespace, state.path, version, _stable_mtime(state.mtime_ns), state.size, state.digest,
+             payload, len(payload), time.time()))
+
+    # ------------------------------------------------------------------
+    # Hash de contenido por archivo (índice mtime+tamaño -> SHA-1, sin resultado de parseo)
+    # ------------------------------------------------------------------
+    def digest(self, path, stat=None):
+        """SHA-1 del contenido de un archivo; con el mismo mtime y tamaño que en la última lectura no se relee."""
+        path = os.path.abspath(path)
+        st = stat or os.stat(path)
+        known = self._digests.get(path)
+        if known and known[:2] == (st.st_mtime_ns, st.st_size): return known[2]
+        row = self.conn.execute("SELECT mtime_ns, size, digest FROM entries WHERE namespace='sha1' AND path=?", (path,)).fetchone()
+        if row and row[:2] == (st.st_mtime_ns, st.st_size):
+            self.hits += 1
+            self._touched[("sha1", path)] = time.time()
+            digest = row[2]
+        else:
+            self.misses += 1
+            with open(path, 'rb') as f: digest = hashlib.sha1(f.read()).hexdigest()
+            self._write("sha1", self._version("sha1"), FileState(path, st.st_mtime_ns, st.st_size, digest, None), b"")
+        self._digests[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    # ------------------------------------------------------------------
+    # Resultados direccionados por contenido (p. ej. blobs de git: el SHA ya identifica el contenido)
+    # ------------------------------------------------------------------
+    def get_object(self, namespace, version, key):
+        """(True, resultado) si hay una entrada para la clave con esta versión; si no, (False, None)."""
+        row = self.conn.execute("SELECT version, payload FROM entries WHERE namespace=? AND path=?",
+                                (namespace, key)).fetchone()
+        if row and row[0] == self._version(version): return self._hit(namespace, key, row[1])
+        self.misses += 1
+        return False, None
+
+    def put_object(self, namespace, version, key, result):
+        self.store(namespace, version, FileState(key, 0, 0, key, None), result)
+
+    # ------------------------------------------------------------------
+    # Snapshots de modelo completo
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _content_fingerprint(files):
+        """Huella de un conjunto de archivos a partir de {ruta: (mtime_ns, tamaño, sha1)}: solo rutas y contenido."""
+        h = hashlib.sha1()
+        for path in sorted(files):
+            h.update(f"{path}|{files[path][2]}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def _file_digest(self, path, st):
+        known = self._digests.get(path)
+        if known and known[:2] == (st.st_mtime_ns, st.st_size): return known[2]
+        with open(path, 'rb') as f: digest = hashlib.sha1(f.read()).hexdigest()
+        self._digests[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def get_snapshot(self, namespace, version, root, paths):
+        """
+        Snapshot del modelo si el contenido de paths es el mismo que cuando se guardó.
+        Los archivos con el mismo mtime y tamaño se dan por iguales; el resto (y los modificados justo
+        antes de guardar) se releen y se compara su SHA-1 con el guardado, de modo que un archivo
+        restaurado con otro mtime o reescrito dentro de la resolución del mtime no sirve datos viejos.
+        """
+        root = os.path.abspath(root)
+        version = self._version(version)
+        files_row = self.conn.execute("SELECT version, digest, payload FROM entries WHERE namespace=? AND path=?",
+                                      (f"{namespace}:archivos", root)).fetchone()
+        if not files_row or files_row[0] != version: return None
+        saved = pickle.loads(files_row[2])
+        stored = saved["files"]
+        paths = [os.path.abspath(p) for p in paths]
+        if set(paths) != stored.keys(): return None
+        current, rehashed = {}, False
+        try:
+            for path in paths:
+                st = os.stat(path)
+                mtime, size, digest = stored[path]
+                if (mtime, size) != (st.st_mtime_ns, st.st_size):
+                    if self._file_digest(path, st) != digest: return None
+                    rehashed = True
+                else:
+                    self._digests.setdefault(path, (mtime, size, digest))
+                current[path] = (st.st_mtime_ns, st.st_size, digest)
+        except OSError: return None
+        row = self.conn.execute("SELECT version, digest, payload FROM entries WHERE namespace=? AND path=?",
+                                (namespace, root)).fetchone()
+        if not row or row[0] != version or row[1] != files_row[1]: return None
+        # Contenido verificado: se guardan los stats actuales para que la próxima vez baste el pre-chequeo
+        if rehashed: self._write_snapshot_files(namespace, version, root, current, files_row[1])
+        self._touched[(f"{namespace}:archivos", root)] = time.time()
+        return self._hit(namespace, root, row[2])[1]
+
+    def put_snapshot(self, namespace, version, root, paths, state):
+        """Guarda el snapshot con el SHA-1 de cada archivo (reutiliza los ya calculados por lookup())."""
+        root = os.path.abspath(root)
+        version = self._version(version)
+        files = {}
+        for path in map(os.path.abspath, paths):
+            st = os.stat(path)
+            files[path] = (st.st_mtime_ns, st.st_size, self._file_digest(path, st))
+        fingerprint = self._content_fingerprint(files)
+        self._write(namespace, version, FileState(root, 0, 0, fingerprint, None), pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+        self._write_snapshot_files(namespace, version, root, files, fingerprint)
+
+    def _write_snapshot_files(self, namespace, version, root, files, fingerprint):
+        files = {path: (_stable_mtime(mtime), size, digest) for path, (mtime, size, digest) in files.items()}
+        payload = pickle.dumps({"files": files}, pickle.HIGHEST_PROTOCOL)
+        self._write(f"{namespace}:archivos", version, FileState(root, 0, 0, fingerprint, None), payload)
+
+    # ------------------------------------------------------------------
+    def close(self):
+        """Persiste los accesos (LRU), aplica el límite de tamaño y cierra la base de datos."""
+        if self._touched:
+            self.conn.executemany("UPDATE entries SET last_access=? WHERE namespace=? AND path=?",
+                                  [(ts, ns, p) for (ns, p), ts in self._touched.items()])
+            self._touched = {}
+        total = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            evict = []
+            for ns, p, nbytes in self.conn.execute("SELECT namespace, path, nbytes FROM entries ORDER BY last_access"):
+                if total <= self.max_bytes: break
+                evict.append((ns, p)); total -= nbytes
+            self.conn.executemany("DELETE FROM entries WHERE namespace=? AND path=?", evict)
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+class MemoryCache:
+    """
+    Caché en memoria con la interfaz peek()/store() de ParseCache, para procesos que se quedan abiertos
+    (modo --watch): un archivo con el mismo mtime y tamaño no se vuelve a leer.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, namespace, version, path, stat):
+        entry = self.entries.get((namespace, os.path.abspath(path)))
+        if entry and entry[0] == (version, stat.st_mtime_ns, stat.st_size):
+            self.hits += 1
+            return True, entry[1]
+        self.misses += 1
+        return False, None
+
+    def store(self, namespace, version, state, result):
+        self.entries[(namespace, state.path)] = ((version, state.mtime_ns, state.size), result)
@@ -0,0 +1,248 @@
+from collections import deque
+
+# Columnas de la hoja "Diagnóstico Relaciones"
+DIAGNOSTIC_COLUMNS = ["Problema", "Severidad", "Tablas", "Relaciones", "Detalle"]
+BOTH_DIRECTIONS = "bothDirections"
+# Caminos ambiguos que se detallan por ciclo: en un ciclo grande casi todos los pares lo son
+MAX_AMBIGUOUS_PER_CYCLE = 20
+
+
+def rel_label(rel):
+    return f"{rel.from_table}[{rel.from_column}] -> {rel.to_table}[{rel.to_column}]"
+
+
+def filter_directions(rel):
+    """
+    Pares (tabla que filtra, tabla filtrada) por los que se propaga el filtro de una relación:
+    del lado 1 al lado N, en ambos sentidos si es bidireccional o 1:1, y en N:N de toTable a fromTable.
+    """
+    a, b = rel.from_table, rel.to_table
+    if rel.cross_filter == BOTH_DIRECTIONS or rel.from_cardinality == rel.to_cardinality == "one": return [(a, b), (b, a)]
+    if rel.from_cardinality == "one" and rel.to_cardinality == "many": return [(a, b)]
+    return [(b, a)]
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        root = self.parent.setdefault(x, x)
+        while root != self.parent[root]: root = self.parent[root]
+        while x != root: self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+    def groups(self, items):
+        found = {}
+        for item in items: found.setdefault(self.find(item), []).append(item)
+        return list(found.values())
+
+
+class RelationshipGraph:
+    """
+    Relaciones del modelo como grafo con listas de adyacencia (tabla -> [(otra tabla, relación)]):
+    - neighbors: todas las relaciones, sin dirección (conectividad, islas)
+    - active: solo las activas, sin dirección (ciclos)
+    - filters: solo las activas, en el sentido en que propagan el filtro
+    Los diagnósticos recorren el grafo con algoritmos lineales (componentes biconexas, BFS,
+    union-find) en lugar de comparar todos los pares de tablas.
+    """
+    def __init__(self, relationships, tables=None):
+        self.relationships = list(relationships)
+        self.tables = tables if tables is not None else {}
+        names = list(self.tables) + [t for rel in self.relationships for t in (rel.from_table, rel.to_table)]
+        self.nodes = list(dict.fromkeys(names))
+        self.neighbors = {t: [] for t in self.nodes}
+        self.active = {t: [] for t in self.nodes}
+        self.filters = {t: [] for t in self.nodes}
+        for rel in self.relationships:
+            a, b = rel.from_table, rel.to_table
+            self.neighbors[a].append((b, rel))
+            if a != b: self.neighbors[b].append((a, rel))
+            if not rel.is_active or a == b: continue
+            self.active[a].append((b, rel)); self.active[b].append((a, rel))
+            for src, dst in filter_directions(rel): self.filters[src].append((dst, rel))
+        self._forest = None
+
+    # ------------------------------------------------------------------
+    def _spanning_forest(self):
+        """Árbol BFS de cada componente de relaciones activas: tabla -> (tabla padre, relación) y profundidad."""
+        if self._forest is None:
+            parent, depth = {}, {}
+            for root in self.nodes:
+                if root in parent: continue
+                parent[root], depth[root] = None, 0
+                queue = deque([root])
+                while queue:
+                    u = queue.popleft()
+                    for v, rel in self.active[u]:
+                        if v not in parent: parent[v], depth[v] = (u, rel), depth[u] + 1; queue.append(v)
+            self._forest = (parent, depth)
+        return self._forest
+
+    def active_path(self, start, end):
+        """
+        Relaciones activas de un camino entre dos tablas (el del árbol de expansión, sin dirección);
+        None si no están conectadas. El árbol se construye una vez y cada consulta cuesta su profundidad.
+        """
+        parent, depth = self._spanning_forest()
+        if start not in parent or end not in parent: return None
+        up, down, a, b = [], [], start, end
+        while depth[a] > depth[b]: a, rel = parent[a]; up.append(rel)
+        while depth[b] > depth[a]: b, rel = parent[b]; down.append(rel)
+        while a != b:
+            if parent[a] is None: return None   # raíces distintas: componentes distintas
+            a, rel = parent[a]; up.append(rel)
+            b, rel = parent[b]; down.append(rel)
+        return up + down[::-1]
+
+    @staticmethod
+    def _walk_back(previous, node):
+        rels = []
+        while previous[node] is not None:
+            node, rel = previous[node]
+            rels.append(rel)
+        return rels[::-1]
+
+    def cyclic_components(self):
+        """
+        Componentes biconexas del grafo de relaciones activas con algún ciclo (listas de relaciones).
+        Tarjan iterativo por aristas, O(tablas + relaciones); las relaciones paralelas entre dos tablas forman ciclo.
+        """
+        disc, low, edges, components, counter = {}, {}, [], [], 0
+        for root in self.nodes:
+            if root in disc or not self.active[root]: continue
+            disc[root] = low[root] = counter; counter += 1
+            work = [(root, None, iter(self.active[root]))]
+            while work:
+                u, via, pending = work[-1]
+                for v, rel in pending:
+                    if rel is via: continue
+                    if v not in disc:
+                        disc[v] = low[v] = counter; counter += 1
+                        edges.append(rel)
+                        work.append((v, rel, iter(self.active[v])))
+                        break
+                    if disc[v] < disc[u]:
+                        low[u] = min(low[u], disc[v]); edges.append(rel)
+                else:
+                    work.pop()
+                    if not work: continue
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[u])
+                    if low[u] >= disc[parent]:
+                        component = []
+                        while True:
+                            rel = edges.pop(); component.append(rel)
+                            if rel is via: break
+                        if len(component) > 1: components.append(component[::-1])
+        return components
+
+    def _ambiguous_paths(self, component, limit=MAX_AMBIGUOUS_PER_CYCLE):
+        """
+        Pares de tablas de un ciclo con dos caminos de filtro distintos. BFS desde cada tabla del ciclo
+        (solo por sus relaciones): una tabla alcanzada otra vez por una relación distinta de la del árbol,
+        desde una tabla que no desciende de ella, tiene un segundo camino simple.
+        """
+        adjacency = {}
+        for rel in component:
+            for src, dst in filter_directions(rel): adjacency.setdefault(src, []).append((dst, rel))
+        found = []
+        for source in sorted(adjacency):
+            previous = {source: None}
+            queue, flagged = deque([source]), set()
+            while queue:
+                u = queue.popleft()
+                for v, rel in adjacency.get(u, ()):
+                    if v not in previous:
+                        previous[v] = (u, rel); queue.append(v); continue
+                    if v in flagged or v == source or previous[v][1] is rel: continue
+                    first = self._walk_back(previous, v)
+                    second = self._walk_back(previous, u) + [rel]
+                    if any(r.from_table == v or r.to_table == v for r in second[:-1]): continue   # v ya está en el camino
+                    flagged.add(v)
+                    found.append((source, v, first, second))
+                    if len(found) >= limit: return found
+        return found
+
+    # ------------------------------------------------------------------
+    def diagnostics(self):
+        """Filas de la hoja 'Diagnóstico Relaciones' (DIAGNOSTIC_COLUMNS)."""
+        rows = []
+        def add(problem, severity, tables, rels, detail):
+            rows.append({"Problema": problem, "Severidad": severity, "Tablas": ", ".join(dict.fromkeys(tables)),
+                         "Relaciones": " | ".join(rel_label(r) for r in rels), "Detalle": detail})
+
+        route = lambda start, rels: " -> ".join([start] + [self._other(r, t) for t, r in self._steps(start, rels)])
+        # 1. Referencias a tablas o columnas que no existen en el modelo
+        if self.tables:
+            for rel in self.relationships:
+                missing = [f"{t}[{c}]" for t, c in ((rel.from_table, rel.from_column), (rel.to_table, rel.to_column))
+                           if t not in self.tables or c not in self.tables[t]["columns"]]
+                if missing: add("Referencia desconocida", "Alta", [rel.from_table, rel.to_table], [rel],
+                                f"No existe en el modelo: {', '.join(missing)}")
+
+        # 2. Ciclos de relaciones activas: caminos de filtro ambiguos y bucles bidireccionales
+        for component in self.cyclic_components():
+            tables = [t for rel in component for t in (rel.from_table, rel.to_table)]
+            bidirectional = [r for r in component if len(filter_directions(r)) == 2]
+            if bidirectional:
+                add("Bucle bidireccional", "Alta", tables, bidirectional,
+                    f"Ciclo de {len(component)} relaciones activas con filtro en ambas direcciones")
+            ambiguous = self._ambiguous_paths(component)
+            for source, target, first, second in ambiguous:
+                add("Camino de filtro ambiguo", "Alta", [source, target], first + second,
+                    f"{source} filtra a {target} por dos caminos: {route(source, first)} / {route(source, second)}")
+            if len(ambiguous) >= MAX_AMBIGUOUS_PER_CYCLE:
+                add("Camino de filtro ambiguo", "Alta", tables, [],
+                    f"Se muestran los primeros {MAX_AMBIGUOUS_PER_CYCLE} caminos ambiguos de un ciclo de {len(component)} relaciones")
+
+        # 3. Relaciones inactivas entre tablas que ya tienen un camino activo (USERELATIONSHIP) o duplicadas
+        for rel in self.relationships:
+            if rel.is_active: continue
+            direct = next((r for t, r in self.active[rel.from_table] if t == rel.to_table), None)
+            path = [direct] if direct is not None else self.active_path(rel.from_table, rel.to_table)
+            if path is None: continue
+            if direct is not None:
+                add("Relación inactiva duplicada", "Info", [rel.from_table, rel.to_table], [rel, direct],
+                    f"Hay una relación activa directa entre las mismas tablas: {rel_label(direct)}")
+            else:
+                add("Relación inactiva con camino activo", "Info", [rel.from_table, rel.to_table], [rel] + path,
+                    f"Camino activo alternativo: {route(rel.from_table, path)}")
+
+        # 4. Cadenas de relaciones N:N activas
+        many = [r for r in self.relationships if r.is_active and r.from_cardinality == r.to_cardinality == "many"]
+        chains = _UnionFind()
+        for rel in many: chains.union(rel.from_table, rel.to_table)
+        by_root = {}
+        for rel in many: by_root.setdefault(chains.find(rel.from_table), []).append(rel)
+        for rels in by_root.values():
+            if len(rels) > 1:
+                add("Cadena N:N", "Media", [t for r in rels for t in (r.from_table, r.to_table)], rels,
+                    f"{len(rels)} relaciones muchos a muchos encadenadas")
+
+        # 5. Tablas sin relaciones e islas (grupos de tablas sin camino al grupo principal)
+        islands = _UnionFind()
+        for rel in self.relationships: islands.union(rel.from_table, rel.to_table)
+        groups = sorted(islands.groups([t for t in self.nodes if self.neighbors[t]]), key=len, reverse=True)
+        for group in groups[1:]:
+            add("Isla de tablas", "Media", group, [], f"{len(group)} tablas sin relación con el grupo principal ({len(groups[0])} tablas)")
+        for table in self.nodes:
+            if self.neighbors[table]: continue
+            # Las tablas solo de medidas no necesitan relaciones
+            if table in self.tables and not self.tables[table]["columns"]: continue
+            add("Tabla desconectada", "Baja", [table], [], "Sin relaciones con otras tablas")
+        return rows
+
+    @staticmethod
+    def _other(rel, table):
+        return rel.to_table if rel.from_table == table else rel.from_table
+
+    def _steps(self, start, rels):
+        current = start
+        for rel in rels:
+            yield current, rel
+            current = self._other(rel, current)
@@ -1,8 +1,120 @@
 import os
+import re
+import codecs
 import glob
+import hashlib
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from .visual_logic import VisualObject
+from .parse_cache import FileState
+from .metrics import metrics
+
+# orjson es opcional: si está instalado decodifica bastante más rápido que json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Versión de los resultados cacheados por archivo: incrementarla invalida la caché persistente
+REPORT_PARSER_VERSION = "3"
+# Hilos para leer los visual.json (la latencia de cada apertura pesa más que el parseo en OneDrive/red)
+IO_THREADS = 8
+_BOM = b"\xef\xbb\xbf"
+# Lectura incremental del report.json legacy: tamaño mínimo de cada lectura
+STREAM_CHUNK = 1 << 20
+_WS = re.compile(r'\s*')
+
+
+def load_json_bytes(content):
+    """Decodifica un JSON en bytes (con o sin BOM UTF-8) con orjson si está disponible."""
+    if content.startswith(_BOM): content = content[len(_BOM):]
+    return _json_loads(content)
+
+
+def _entries(path):
+    with os.scandir(path) as it: return list(it)
+
+
+class _HashingReader:
+    """Lector binario que va calculando el SHA-1 de lo leído (para la caché, sin guardar el contenido)."""
+    def __init__(self, f):
+        self.f = f
+        self.sha1 = hashlib.sha1()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha1.update(data)
+        return data
+
+
+class LegacySectionStream:
+    """
+    Recorre un report.json legacy devolviendo sus 'sections' (páginas) de una en una.
+    Solo decodifica el valor en curso: el texto se lee por bloques crecientes y cada sección se
+    decodifica con JSONDecoder.raw_decode cuando está completa en el búfer, así que la memoria
+    depende del tamaño de una página y no del informe entero. El resto de claves se descarta.
+    """
+    def __init__(self, reader, chunk_size=STREAM_CHUNK):
+        self.reader = reader
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.json = json.JSONDecoder()
+        self.buf, self.pos, self.eof = "", 0, False
+
+    def _more(self):
+        if self.eof: raise ValueError("report.json incompleto")
+        # Bloques al menos tan grandes como lo pendiente: un valor grande se reintenta pocas veces
+        data = self.reader.read(max(self.chunk_size, len(self.buf) - self.pos))
+        self.eof = not data
+        self.buf = self.buf[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+
+    def _peek(self):
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf): return self.buf[self.pos]
+            if self.eof: return ""
+            self._more()
+
+    def _take(self, expected):
+        char = self._peek()
+        if not char or char not in expected:
+            raise ValueError(f"report.json: se esperaba {expected!r} y se encontró {char!r}")
+        self.pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+                # Un valor que acaba justo al final del búfer podría estar cortado (p. ej. un número)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self._more()
+
+    def sections(self):
+        self._take("{")
+        if self._peek() == "}": return
+        while True:
+            key = self._value()
+            self._take(":")
+            if key == "sections":
+                self._take("[")
+                if self._peek() == "]": self._take("]")
+                else:
+                    while True:
+                        yield self._value()
+                        if self._take(",]") == "]": break
+            else:
+                self._value()   # config del informe, resourcePackages...: no se usan
+            if self._take(",}") == "}": return
 
 class ReportPage:
     def __init__(self, name: str, visuals_data: List):
@@ -20,8 +132,12 @@ class ReportPage:
         return page_results
 
 class PBIPReport:
-    def __init__(self, root_path: str):
+    def __init__(self, root_path: str, cache=None, io_threads=IO_THREADS):
         self.root = root_path
+        self.cache = cache
+        self.io_threads = max(1, io_threads)
+        # Tiempos por página del último análisis PBIR (lectura + decodificación de sus archivos)
+        self.page_timings = []
         self.report_folder = self._find_report_folder()
         self.is_pbir = self._check_is_pbir()
 
@@ -35,42 +151,153 @@ class PBIPReport:
         return os.path.exists(os.path.join(self.report_folder, 'definition', 'pages'))
 
     def run(self):
+        with ThreadPoolExecutor(max_workers=self.io_threads) as pool:
+            return self.finish(self.start(pool))
+
+    def scan(self, pool):
+        """Lanza en el pool el recorrido de las carpetas de página (PBIR) sin esperar; para start(pool, scanned)."""
+        if not self.is_pbir: return None
+        pages_dir = os.path.join(self.report_folder, 'definition', 'pages')
+        return [pool.submit(self._scan_page, e) for e in _entries(pages_dir) if e.is_dir()]
+
+    def start(self, pool, scanned=None):
+        """
+        Planifica la lectura en un pool de hilos (que puede compartirse entre varios informes) y devuelve
+        el plan para finish(). Las consultas a la caché se hacen en este hilo.
+        """
         print(f"Iniciando análisis de INFORME en: {self.report_folder}")
-        if self.is_pbir: return self._process_pbir()
-        else: return self._process_legacy()
+        if self.is_pbir: return self._start_pbir(pool, scanned if scanned is not None else self.scan(pool))
+        else: return self._start_legacy(pool)
+
+    def finish(self, plan):
+        """Espera las lecturas de start(), guarda en caché lo leído y devuelve las filas del informe."""
+        if self.is_pbir: return self._finish_pbir(plan)
+        else: return self._finish_legacy(plan)
 
-    def _process_legacy(self):
+    def _start_legacy(self, pool):
         json_path = os.path.join(self.report_folder, 'report.json')
         if not os.path.exists(json_path): raise FileNotFoundError("No se encontró report.json")
-        with open(json_path, 'r', encoding='utf-8-sig') as f: data = json.load(f)
-        rows = []
-        for section in data.get('sections', []):
-            page_name = section.get('displayName', section.get('name'))
-            visuals = section.get('visualContainers', [])
-            rows.extend(ReportPage(page_name, visuals).process())
+        metrics.count("informe.report-legacy")
+        stat = os.stat(json_path)
+        if self.cache is not None:
+            hit, rows = self.cache.peek("report-legacy", REPORT_PARSER_VERSION, json_path, stat)
+            if hit: return True, rows
+        metrics.count("informe.bytes", stat.st_size)
+        return False, pool.submit(self._read_legacy, json_path, stat)
+
+    def _finish_legacy(self, plan):
+        cached, value = plan
+        if cached: return value
+        rows, state = value.result()
+        if self.cache is not None: self.cache.store("report-legacy", REPORT_PARSER_VERSION, state, rows)
         return rows
 
-    def _process_pbir(self):
-        pages_dir = os.path.join(self.report_folder, 'definition', 'pages')
-        rows = []
-        for page_folder in os.listdir(pages_dir):
-            page_path = os.path.join(pages_dir, page_folder)
-            if not os.path.isdir(page_path): continue
-            page_meta_path = os.path.join(page_path, 'page.json')
-            page_name = page_folder
-            if os.path.exists(page_meta_path):
-                with open(page_meta_path, 'r', encoding='utf-8-sig') as f:
-                    pm = json.load(f)
-                    page_name = pm.get('displayName', page_name)
-            visuals_dir = os.path.join(page_path, 'visuals')
-            visuals_list = []
-            if os.path.exists(visuals_dir):
-                for v_folder in os.listdir(visuals_dir):
-                    v_path = os.path.join(visuals_dir, v_folder)
-                    if os.path.isdir(v_path):
-                        v_json_path = os.path.join(v_path, 'visual.json')
-                        if os.path.exists(v_json_path):
-                            with open(v_json_path, 'r', encoding='utf-8-sig') as f:
-                                visuals_list.append(json.load(f))
-            rows.extend(ReportPage(page_name, visuals_list).process())
+    def _read_legacy(self, json_path, stat):
+        # Página a página: cada sección se decodifica, se procesa (un config de visual cada vez) y se libera
+        rows, self.page_timings = [], []
+        with open(json_path, 'rb') as f:
+            reader = _HashingReader(f)
+            for section in LegacySectionStream(reader).sections():
+                start = time.perf_counter()
+                page_name = section.get('displayName', section.get('name'))
+                visuals = section.get('visualContainers', [])
+                rows.extend(ReportPage(page_name, visuals).process())
+                self.page_timings.append({"Pagina": page_name, "Carpeta": section.get('name'), "Visuales": len(visuals),
+                                          "Desde_Cache": 0, "Segundos": round(time.perf_counter() - start, 4)})
+                del section, visuals
+        return rows, FileState(os.path.abspath(json_path), stat.st_mtime_ns, stat.st_size, reader.sha1.hexdigest(), None)
+
+    # ------------------------------------------------------------------
+    # PBIR: una carpeta por página y un visual.json por visual
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _scan_page(page_entry):
+        """Enumera una página con scandir: (carpeta, (ruta, stat) de page.json o None, [(carpeta, ruta, stat) de visuales])."""
+        page_json, visuals = None, []
+        for child in _entries(page_entry.path):
+            if child.name == 'page.json' and child.is_file(): page_json = (child.path, child.stat())
+            elif child.name == 'visuals' and child.is_dir():
+                for v_entry in _entries(child.path):
+                    if not v_entry.is_dir(): continue
+                    for f in _entries(v_entry.path):
+                        if f.name == 'visual.json' and f.is_file(): visuals.append((v_entry.name, f.path, f.stat()))
+        visuals.sort(key=lambda v: v[0])
+        return page_entry.name, page_json, visuals
+
+    @staticmethod
+    def _page_order(pages_dir):
+        # pages.json (si existe) define el orden de las pestañas; el resto de páginas va después por nombre
+        path = os.path.join(pages_dir, 'pages.json')
+        if not os.path.exists(path): return {}
+        try:
+            with open(path, 'rb') as f: order = load_json_bytes(f.read()).get('pageOrder', [])
+        except ValueError: return {}
+        return {name: i for i, name in enumerate(order)}
+
+    def _read_json(self, path, stat, build):
+        """Lee, decodifica y aplica build() a un archivo (se ejecuta en un hilo del pool)."""
+        start = time.perf_counter()
+        with open(path, 'rb') as f: content = f.read()
+        result = build(load_json_bytes(content))
+        state = None
+        if self.cache is not None:
+            state = FileState(os.path.abspath(path), stat.st_mtime_ns, stat.st_size, hashlib.sha1(content).hexdigest(), content)
+        return result, state, time.perf_counter() - start
+
+    def _submit(self, pool, namespace, path, stat, build):
+        """Consulta la caché en este hilo (SQLite) y manda al pool solo las lecturas pendientes."""
+        metrics.count(f"informe.{namespace}")
+        if self.cache is not None:
+            hit, value = self.cache.peek(namespace, REPORT_PARSER_VERSION, path, stat)
+            if hit: return namespace, True, value
+        metrics.count("informe.bytes", stat.st_size)
+        return namespace, False, pool.submit(self._read_json, path, stat, build)
+
+    def _resolve(self, job):
+        """(resultado, segundos, desde caché) de un trabajo de _submit; guarda en caché los leídos."""
+        namespace, cached, value = job
+        if cached: return value, 0.0, True
+        result, state, seconds = value.result()
+        if state is not None: self.cache.store(namespace, REPORT_PARSER_VERSION, state, result)
+        return result, seconds, False
+
+    @staticmethod
+    def _visual_rows(data):
+        return VisualObject(data).get_usage_data()
+
+    def _start_pbir(self, pool, scanned):
+        order = self._page_order(os.path.join(self.report_folder, 'definition', 'pages'))
+        pages = [f.result() for f in scanned]
+        # Orden determinista: el de pages.json y, si no, por carpeta; los visuales, por carpeta
+        pages.sort(key=lambda p: (order.get(p[0], len(order)), p[0]))
+        jobs = []
+        for folder, page_json, visuals in pages:
+            name_job = None
+            if page_json:
+                name_job = self._submit(pool, "report-page", *page_json, lambda pm, folder=folder: pm.get('displayName', folder))
+            visual_jobs = [self._submit(pool, "report-visual", path, stat, self._visual_rows) for _, path, stat in visuals]
+            jobs.append((folder, name_job, visual_jobs))
+        return jobs
+
+    def _finish_pbir(self, jobs):
+        rows, self.page_timings = [], []
+        for folder, name_job, visual_jobs in jobs:
+            page_name, seconds, from_cache = folder, 0.0, 0
+            if name_job:
+                page_name, secs, hit = self._resolve(name_job)
+                seconds += secs
+            for job in visual_jobs:
+                fields, secs, hit = self._resolve(job)
+                seconds += secs; from_cache += hit
+                for field in fields:
+                    field['Nombre_Pag'] = page_name
+                    rows.append(field)
+            self.page_timings.append({"Pagina": page_name, "Carpeta": folder, "Visuales": len(visual_jobs),
+                                      "Desde_Cache": from_cache, "Segundos": round(seconds, 4)})
+
+        total = sum(p["Segundos"] for p in self.page_timings)
+        slowest = sorted(self.page_timings, key=lambda p: -p["Segundos"])[:3]
+        print(f"Páginas leídas: {len(self.page_timings)} ({sum(p['Visuales'] for p in self.page_timings)} visuales, "
+              f"{total:.2f} s de lectura en {self.io_threads} hilos). Más lentas: "
+              + ", ".join(f"{p['Pagina']} ({p['Segundos']:.3f} s)" for p in slowest))
         return rows
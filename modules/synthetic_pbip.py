@@ -0,0 +1,220 @@
+import json
+import os
+import random
+
+# Escalas predefinidas para benchmark.py (tablas, columnas por tabla, medidas por tabla de hechos, páginas, visuales por página)
+SIZE_TIERS = {
+    "pequeno": dict(tables=12, columns=8, measures=6, pages=4, visuals=6),
+    "mediano": dict(tables=120, columns=15, measures=12, pages=25, visuals=10),
+    "grande": dict(tables=600, columns=25, measures=20, pages=80, visuals=14),
+}
+
+VISUAL_TYPES = ["card", "clusteredColumnChart", "tableEx", "slicer", "lineChart", "pivotTable", "donutChart"]
+
+
+class SyntheticPbipGenerator:
+    """
+    Genera un proyecto PBIP sintético y reproducible (misma semilla -> mismos archivos):
+    - <nombre>.SemanticModel/definition: parámetros y consulta de staging compartida
+      (expressions.tmdl), dimensiones y tablas de hechos con particiones M (pasos multilínea,
+      #"nombres", renombrados, NestedJoin + ExpandTableColumn, columnas añadidas), columnas
+      calculadas, medidas que se referencian entre sí y relationships.tmdl.
+    - <nombre>.Report (PBIR: definition/pages/*/visuals/*/visual.json) y
+      <nombre>_Legacy.Report (report.json con config serializado).
+    """
+    def __init__(self, tables=12, columns=8, measures=6, pages=4, visuals=6, seed=0):
+        self.n_tables = max(2, tables)
+        self.n_columns = max(2, columns)
+        self.n_measures = max(1, measures)
+        self.n_pages = pages
+        self.n_visuals = visuals
+        self.rng = random.Random(seed)
+        n_dims = max(1, self.n_tables // 3)
+        self.dims = [f"Dim {i}" for i in range(n_dims)]
+        self.facts = [f"Hechos {i}" for i in range(self.n_tables - n_dims)]
+        self.columns = {}       # tabla -> [columnas]
+        self.measures = []      # (tabla, medida)
+
+    # ------------------------------------------------------------------
+    def write(self, out_dir, name="Sintetico"):
+        """Escribe el modelo y los dos informes. Devuelve las rutas generadas."""
+        definition = os.path.join(out_dir, f"{name}.SemanticModel", "definition")
+        tables_dir = os.path.join(definition, "tables")
+        os.makedirs(tables_dir, exist_ok=True)
+        _write(os.path.join(definition, "expressions.tmdl"), self._expressions())
+        for i, dim in enumerate(self.dims):
+            _write(os.path.join(tables_dir, f"{dim}.tmdl"), self._dim_table(i, dim))
+        relationships = []
+        for i, fact in enumerate(self.facts):
+            text, rels = self._fact_table(i, fact)
+            _write(os.path.join(tables_dir, f"{fact}.tmdl"), text)
+            relationships.extend(rels)
+        _write(os.path.join(definition, "relationships.tmdl"), "\n".join(relationships))
+
+        pbir = os.path.join(out_dir, f"{name}.Report")
+        legacy = os.path.join(out_dir, f"{name}_Legacy.Report")
+        self._write_pbir(pbir)
+        self._write_legacy(legacy)
+        return {"model": definition, "pbir": pbir, "legacy": legacy}
+
+    # ------------------------------------------------------------------
+    # Modelo
+    # ------------------------------------------------------------------
+    def _expressions(self):
+        return (
+            'expression Servidor = "sql-sintetico.local" meta [IsParameterQuery=true, Type="Text", IsParameterQueryRequired=true]\n'
+            '\tlineageTag: p-servidor\n\n'
+            'expression BaseDatos = "DW_Sintetico" meta [IsParameterQuery=true, Type="Text", IsParameterQueryRequired=true]\n'
+            '\tlineageTag: p-basedatos\n\n'
+            'expression Staging =\n'
+            '\t\tlet\n'
+            '\t\t    Origen = Sql.Database(Servidor, BaseDatos),\n'
+            '\t\t    // Tabla de hechos común a todas las consultas de hechos\n'
+            '\t\t    #"Hechos dbo" = Origen{[Schema="dbo",Item="Hechos"]}[Data]\n'
+            '\t\tin\n'
+            '\t\t    #"Hechos dbo"\n'
+            '\tlineageTag: e-staging\n'
+        )
+
+    def _dim_table(self, i, dim):
+        cols = ["Id"] + [f"Atributo {c}" for c in range(self.n_columns - 1)]
+        self.columns[dim] = cols
+        lines = [f"table '{dim}'", f"\tlineageTag: t-dim-{i}", ""]
+        for c, col in enumerate(cols):
+            lines += [f"\tcolumn '{col}'", f"\t\tdataType: {'int64' if c == 0 else 'string'}",
+                      f"\t\tlineageTag: c-dim-{i}-{c}", f"\t\tsourceColumn: {col}", ""]
+        renames = ", ".join(f'{{"attr_{c}", "Atributo {c}"}}' for c in range(self.n_columns - 1))
+        if i % 3 == 2:
+            source = [f'Origen = Csv.Document(File.Contents("C:\\Datos\\dim_{i}.csv"), [Delimiter=";", Encoding=65001]),',
+                      '#"Encabezados promovidos" = Table.PromoteHeaders(Origen, [PromoteAllScalars=true]),',
+                      f'#"Columnas renombradas" = Table.RenameColumns(#"Encabezados promovidos", {{{renames}}})']
+        else:
+            source = ['Origen = Sql.Database(Servidor, BaseDatos),',
+                      f'#"Tabla dbo" = Origen{{[Schema="dim",Item="Dim_{i}"]}}[Data],',
+                      f'#"Columnas renombradas" = Table.RenameColumns(#"Tabla dbo", {{{renames}}})']
+        lines += self._partition(dim, source, '#"Columnas renombradas"')
+        return "\n".join(lines) + "\n"
+
+    def _fact_table(self, i, fact):
+        dim_idx = [self.rng.randrange(len(self.dims)) for _ in range(min(3, len(self.dims)))]
+        dim_idx = list(dict.fromkeys(dim_idx))
+        joined = self.dims[dim_idx[0]]
+        cols = ["Id", "Importe", "Cantidad"] + [f"{self.dims[d]} Id" for d in dim_idx]
+        extra = [f"Dato {c}" for c in range(max(0, self.n_columns - len(cols) - 2))]
+        cols += extra + [f"{joined} Atributo 0", "Importe Neto"]
+        self.columns[fact] = cols + ["Importe Doble"]
+
+        lines = [f"table '{fact}'", f"\tlineageTag: t-fact-{i}", ""]
+        # Medidas: la primera suma una columna; el resto combinan medidas anteriores (de esta tabla u otras)
+        table_ref = f"'{fact}'"
+        for m in range(self.n_measures):
+            name = f"{fact} M{m}"
+            if m == 0 or not self.measures:
+                lines += [f"\tmeasure '{name}' = SUM({table_ref}[Importe])", "\t\tformatString: #,0.00"]
+            elif m % 3 == 1:
+                prev = self.measures[-1][1]
+                lines += [f"\tmeasure '{name}' = ```", f"\t\t\tCALCULATE([{prev}], {table_ref}[Cantidad] > {m}) // filtro",
+                          "\t\t\t```"]
+            else:
+                a = self.rng.choice(self.measures)[1]; b = self.measures[-1][1]
+                lines += [f"\tmeasure '{name}' =", f"\t\t\tVAR Base = [{a}]",
+                          f"\t\t\tVAR Texto = \"[{b}] en texto\"",
+                          f"\t\t\tRETURN DIVIDE(Base, [{b}]) + COUNTROWS({table_ref})"]
+            lines += [f"\t\tlineageTag: m-{i}-{m}", ""]
+            self.measures.append((fact, name))
+        for c, col in enumerate(cols):
+            dtype = "double" if col in ("Importe", "Importe Neto") else "int64" if c < 3 or col.endswith(" Id") else "string"
+            lines += [f"\tcolumn '{col}'", f"\t\tdataType: {dtype}", f"\t\tlineageTag: c-fact-{i}-{c}",
+                      f"\t\tsourceColumn: {col}", ""]
+        lines += ["\tcolumn 'Importe Doble' = " + f"{table_ref}[Importe] * 2", "\t\tdataType: double", "\t\tisDataTypeInferred", ""]
+
+        source = ['Origen = Staging,',
+                  f'#"Filas filtradas" = Table.SelectRows(Origen, each [Tipo] = "F{i}" and [Importe] <> null),',
+                  f'#"Consultas combinadas" = Table.NestedJoin(#"Filas filtradas", {{"{joined} Id"}}, #"{joined}", {{"Id"}}, "{joined}", JoinKind.LeftOuter),',
+                  f'#"Expandido" = Table.ExpandTableColumn(#"Consultas combinadas", "{joined}", {{"Atributo 0"}}, {{"{joined} Atributo 0"}}),',
+                  '#"Personalizada agregada" = Table.AddColumn(#"Expandido",',
+                  '    "Importe Neto",',
+                  '    each [Importe] * (1 - [Descuento]), type number)']
+        lines += self._partition(fact, source, '#"Personalizada agregada"')
+
+        rels = []
+        for k, d in enumerate(dim_idx):
+            dim = self.dims[d]
+            rel = [f"relationship {i:08x}-{k:04x}-4000-8000-000000000000", f"\tfromColumn: '{fact}'.'{dim} Id'", f"\ttoColumn: '{dim}'.Id"]
+            if k == 2: rel.insert(1, "\tisActive: false")
+            if i % 10 == 9 and k == 1: rel += ["\tfromCardinality: many", "\ttoCardinality: many"]
+            rels.append("\n".join(rel) + "\n")
+        return "\n".join(lines) + "\n", rels
+
+    @staticmethod
+    def _partition(table, steps, result):
+        lines = [f"\tpartition '{table}-p' = m", "\t\tmode: import", "\t\tsource =", "\t\t\t\tlet"]
+        lines += [f"\t\t\t\t    {step}" for step in steps]
+        lines += ["\t\t\t\tin", f"\t\t\t\t    {result}", "", "\tannotation PBI_ResultType = Table", ""]
+        return lines
+
+    # ------------------------------------------------------------------
+    # Informes
+    # ------------------------------------------------------------------
+    def _fields(self, count):
+        """Campos aleatorios del modelo: (tipo, tabla, propiedad)."""
+        fields = []
+        for _ in range(count):
+            if self.rng.random() < 0.5 and self.measures:
+                table, name = self.rng.choice(self.measures); fields.append(("Measure", table, name))
+            else:
+                table = self.rng.choice(list(self.columns)); fields.append(("Column", table, self.rng.choice(self.columns[table])))
+        return fields
+
+    def _write_pbir(self, report_dir):
+        pages_dir = os.path.join(report_dir, "definition", "pages")
+        for p in range(self.n_pages):
+            page = f"pagina{p:04d}"
+            _write(os.path.join(pages_dir, page, "page.json"),
+                   json.dumps({"name": page, "displayName": f"Página {p}"}, ensure_ascii=False))
+            for v in range(self.n_visuals):
+                vtype = VISUAL_TYPES[(p + v) % len(VISUAL_TYPES)]
+                roles = {}
+                for role, (kind, table, prop) in zip(("Category", "Y", "Values"), self._fields(1 + v % 3)):
+                    field = {kind: {"Expression": {"SourceRef": {"Entity": table}}, "Property": prop}}
+                    if kind == "Column" and v % 4 == 3:
+                        field = {"Aggregation": {"Expression": field, "Function": 0}}
+                    roles.setdefault(role, {"projections": []})["projections"].append(
+                        {"field": field, "queryRef": f"{table}.{prop}", "nativeQueryRef": prop})
+                visual = {"visualType": vtype, "query": {"queryState": roles}}
+                if v % 5 == 0:
+                    kind, table, prop = self._fields(1)[0]
+                    visual["objects"] = {"general": [{"properties": {"filter": {"filter": {"Where": [{"Condition": {"In": {
+                        "Expressions": [{kind: {"Expression": {"SourceRef": {"Entity": table}}, "Property": prop}}]}}}]}}}}]}
+                name = f"visual{v:04d}"
+                _write(os.path.join(pages_dir, page, "visuals", name, "visual.json"),
+                       json.dumps({"name": name, "visual": visual}, ensure_ascii=False))
+
+    def _write_legacy(self, report_dir):
+        sections = []
+        for p in range(self.n_pages):
+            containers = []
+            for v in range(self.n_visuals):
+                fields = self._fields(1 + v % 3)
+                aliases = {table: f"t{k}" for k, table in enumerate(dict.fromkeys(t for _, t, _ in fields))}
+                select = [{kind: {"Expression": {"SourceRef": {"Source": aliases[table]}}, "Property": prop},
+                           "Name": f"{table}.{prop}"} for kind, table, prop in fields]
+                projections = {}
+                for role, (_, table, prop) in zip(("Category", "Y", "Values"), fields):
+                    projections.setdefault(role, []).append({"queryRef": f"{table}.{prop}"})
+                config = {"name": f"v{p}-{v}", "singleVisual": {
+                    "visualType": VISUAL_TYPES[(p + v) % len(VISUAL_TYPES)],
+                    "prototypeQuery": {"Version": 2, "From": [{"Name": a, "Entity": t, "Type": 0} for t, a in aliases.items()],
+                                       "Select": select},
+                    "projections": projections}}
+                containers.append({"x": 10 * v, "y": 0, "width": 200, "height": 100,
+                                   "config": json.dumps(config, ensure_ascii=False)})
+            sections.append({"name": f"seccion{p}", "displayName": f"Página {p}", "visualContainers": containers})
+        _write(os.path.join(report_dir, "report.json"),
+               json.dumps({"config": "{}", "sections": sections}, ensure_ascii=False))
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(text)
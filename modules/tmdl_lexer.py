@@ -0,0 +1,241 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Palabras clave que abren un objeto TMDL (el resto de líneas son propiedades)
+OBJECT_KEYWORDS = {
+    "model", "database", "table", "column", "measure", "partition", "hierarchy", "level",
+    "annotation", "expression", "relationship", "role", "tablePermission", "member",
+    "perspective", "perspectiveTable", "perspectiveColumn", "perspectiveMeasure",
+    "perspectiveHierarchy", "culture", "linguisticMetadata", "translation", "dataSource",
+    "calculationGroup", "calculationItem", "variation", "changedProperty", "extendedProperty",
+    "formatStringDefinition", "detailRowsDefinition", "queryGroup", "ref", "function",
+    "calendar", "cultureInfo",
+}
+
+
+@dataclass
+class TmdlNode:
+    """
+    Nodo genérico del árbol TMDL.
+    line: línea de la declaración (1-based). offset/end_offset: rango en bytes (UTF-8) dentro del archivo.
+    start_offset: inicio del bloque de descripción '///' que precede a la declaración (= offset si no hay).
+    """
+    kind: str
+    name: str = ""
+    expression: str = ""
+    properties: Dict[str, str] = field(default_factory=dict)
+    children: List["TmdlNode"] = field(default_factory=list)
+    description: str = ""
+    line: int = 0
+    offset: int = 0
+    end_offset: int = 0
+    start_offset: int = 0
+
+    def children_of(self, kind: str) -> List["TmdlNode"]:
+        return [c for c in self.children if c.kind == kind]
+
+
+@dataclass
+class TmdlColumn(TmdlNode):
+    @property
+    def data_type(self) -> Optional[str]: return self.properties.get("dataType")
+    @property
+    def source_column(self) -> Optional[str]: return self.properties.get("sourceColumn")
+    @property
+    def is_calculated(self) -> bool: return bool(self.expression)
+
+
+@dataclass
+class TmdlMeasure(TmdlNode):
+    @property
+    def format_string(self) -> Optional[str]: return self.properties.get("formatString")
+
+
+@dataclass
+class TmdlPartition(TmdlNode):
+    @property
+    def mode(self) -> Optional[str]: return self.properties.get("mode")
+    @property
+    def source(self) -> str: return self.properties.get("source", "")
+
+
+@dataclass
+class TmdlHierarchy(TmdlNode):
+    @property
+    def levels(self) -> List[TmdlNode]: return self.children_of("level")
+
+
+@dataclass
+class TmdlAnnotation(TmdlNode):
+    pass
+
+
+@dataclass
+class TmdlTable(TmdlNode):
+    @property
+    def columns(self) -> List[TmdlNode]: return self.children_of("column")
+    @property
+    def measures(self) -> List[TmdlNode]: return self.children_of("measure")
+    @property
+    def partitions(self) -> List[TmdlNode]: return self.children_of("partition")
+    @property
+    def hierarchies(self) -> List[TmdlNode]: return self.children_of("hierarchy")
+    @property
+    def annotations(self) -> List[TmdlNode]: return self.children_of("annotation")
+
+
+NODE_TYPES = {
+    "table": TmdlTable, "column": TmdlColumn, "measure": TmdlMeasure,
+    "partition": TmdlPartition, "hierarchy": TmdlHierarchy, "annotation": TmdlAnnotation,
+}
+
+
+def _indent_of(line: str) -> int:
+    n = 0
+    for ch in line:
+        if ch != '\t': break
+        n += 1
+    return n
+
+
+def split_declaration_name(rest: str):
+    """Separa 'Nombre' / Nombre del resto de la declaración ('= expr')."""
+    rest = rest.strip()
+    if rest.startswith("'"):
+        i = 1; buf = []
+        while i < len(rest):
+            ch = rest[i]
+            if ch == "'":
+                if rest[i + 1:i + 2] == "'": buf.append("'"); i += 2; continue
+                break
+            buf.append(ch); i += 1
+        return "".join(buf), rest[i + 1:].strip()
+    idx = rest.find("=")
+    if idx == -1: return rest, ""
+    return rest[:idx].strip(), rest[idx:]
+
+
+class _Expression:
+    """Acumulador de una expresión multilínea (lista de líneas, sin concatenaciones repetidas)."""
+    __slots__ = ("owner", "prop", "indent", "fenced", "lines")
+
+    def __init__(self, owner, prop, indent, fenced, first):
+        self.owner = owner; self.prop = prop; self.indent = indent; self.fenced = fenced
+        self.lines = [first] if first else []
+
+    def finish(self):
+        body = self.lines
+        while body and not body[-1].strip(): body.pop()
+        while body and not body[0].strip(): body.pop(0)
+        # Quitar la indentación común (tabuladores) del bloque
+        # (la primera línea, si venía en la declaración, no tiene tabuladores y no cuenta)
+        tabs = min((_indent_of(l) for l in body if l.startswith("\t") and l.strip()), default=0)
+        text = "\n".join(l[min(tabs, _indent_of(l)):] if l.strip() else "" for l in body)
+        if self.prop is None: self.owner.expression = text
+        else: self.owner.properties[self.prop] = text
+
+
+def parse_tmdl(content: str) -> TmdlNode:
+    """
+    Parsea el contenido de un archivo TMDL en una sola pasada y devuelve un nodo raíz
+    ('document') cuyos hijos son los objetos de primer nivel (table, expression, relationship...).
+    """
+    root = TmdlNode(kind="document", line=0)
+    stack = [(-1, root)]          # (indentación, nodo)
+    pending_expr: Optional[_Expression] = None
+    pending_desc: List[str] = []
+    desc_start = 0                # byte inicial de la primera línea de pending_desc
+    offset = 0
+    last_end = 0                  # fin (en bytes) de la última línea con contenido
+
+    def close_until(indent):
+        while len(stack) > 1 and stack[-1][0] >= indent:
+            _, node = stack.pop()
+            node.end_offset = last_end
+
+    for line_no, raw in enumerate(content.splitlines(keepends=True), start=1):
+        line_start = offset
+        offset += len(raw.encode("utf-8"))
+        line = raw.rstrip("\r\n")
+        if line_no == 1: line = line.lstrip("\ufeff")
+        stripped = line.strip()
+
+        # 1. Continuación de una expresión multilínea
+        if pending_expr is not None:
+            if pending_expr.fenced:
+                if stripped.endswith("```"):
+                    tail = line.rstrip()[:-3]
+                    if tail.strip(): pending_expr.lines.append(tail)
+                    pending_expr.finish(); pending_expr = None
+                else:
+                    pending_expr.lines.append(line)
+                last_end = offset
+                continue
+            if not stripped or _indent_of(line) >= pending_expr.indent + 2:
+                pending_expr.lines.append(line)
+                if stripped: last_end = offset
+                continue
+            pending_expr.finish(); pending_expr = None
+
+        if not stripped: continue
+        indent = _indent_of(line)
+
+        if stripped.startswith("///"):
+            if not pending_desc: desc_start = line_start
+            pending_desc.append(stripped[3:].strip())
+            continue
+        if stripped.startswith("//"):
+            continue
+
+        close_until(indent)
+        parent = stack[-1][1]
+        keyword, _, rest = stripped.partition(" ")
+        rest = rest.strip()
+        name = tail = ""
+        is_object = keyword in OBJECT_KEYWORDS
+        if is_object and rest.startswith("="):
+            # 'formatStringDefinition = ...' es un objeto sin nombre; 'expression = ...' una propiedad
+            if keyword in ("formatStringDefinition", "detailRowsDefinition"): tail = rest
+            else: is_object = False
+        elif is_object:
+            name, tail = split_declaration_name(rest)
+
+        if is_object:
+            node = NODE_TYPES.get(keyword, TmdlNode)(kind=keyword, name=name, line=line_no, offset=line_start,
+                                                     start_offset=desc_start if pending_desc else line_start)
+            if pending_desc: node.description = "\n".join(pending_desc); pending_desc = []
+            parent.children.append(node)
+            stack.append((indent, node))
+            last_end = offset
+            if tail.startswith("="):
+                pending_expr = _start_expression(node, None, indent, tail[1:].strip())
+            continue
+
+        # Propiedad del objeto actual
+        pending_desc = []
+        last_end = offset
+        colon = stripped.find(":")
+        equals = stripped.find("=")
+        if colon != -1 and (equals == -1 or colon < equals):
+            parent.properties[stripped[:colon].strip()] = stripped[colon + 1:].strip()
+        elif equals != -1:
+            prop = stripped[:equals].strip()
+            pending_expr = _start_expression(parent, prop, indent, stripped[equals + 1:].strip())
+        else:
+            parent.properties[stripped] = "true"
+
+    if pending_expr is not None: pending_expr.finish()
+    close_until(-1)
+    root.end_offset = offset
+    return root
+
+
+def _start_expression(owner, prop, indent, first):
+    if first.startswith("```"):
+        first = first[3:]
+        if first.rstrip().endswith("```"):
+            expr = _Expression(owner, prop, indent, False, first.rstrip()[:-3].strip())
+            expr.finish()
+            return None
+        return _Expression(owner, prop, indent, True, first.strip())
+    return _Expression(owner, prop, indent, False, first)
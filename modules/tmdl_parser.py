@@ -1,163 +1,284 @@
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from enum import Enum
+from .tmdl_lexer import parse_tmdl, split_declaration_name
+from .model_objects import Column, Measure, Relationship, Table, intern_name
+from .relationship_graph import RelationshipGraph
+from .metrics import metrics
 
 class OriginType(Enum):
     COLUMN = "Columna"
     MEASURE = "Medida"
     TABLE = "Tabla Completa"
 
+# Por debajo de este número de archivos el parseo paralelo no compensa
+PARALLEL_MIN_FILES = 64
+# Versión de los resultados de parseo: incrementarla invalida la caché persistente
+PARSER_VERSION = "6"
+# Atributos del modelo que se guardan en el snapshot de la caché
+SNAPSHOT_FIELDS = ("tables", "measures", "relationships", "parameters", "expressions", "global_objects", "column_index")
+
 # Regex patterns needed for parsing
-RX_EXPRESSION = re.compile(r'expression\s+[\'"]?([\w\s\-\.%]+)[\'"]?\s*=\s*(?:```)?(.*?)(?:```)?(?:\s+meta|$)', re.DOTALL)
+# Sufijo 'meta [...]' de las expresiones compartidas (parámetros)
+RX_META_SUFFIX = re.compile(r'\s+meta\s*\[.*\]\s*$', re.DOTALL)
 
 class TmdlParser:
+    """
+    Modelo semántico en memoria. tables/measures/relationships contienen objetos Table, Measure
+    y Relationship (modules.model_objects) que se leen también como los dicts de siempre
+    (tabla["columns"], medida["expression"], ...). Cada objeto recibe un id entero al combinarse.
+    """
     def __init__(self, root_folder):
         self.root = root_folder
         self.tables = {}        
         self.measures = {}      
         self.relationships = [] 
         self.parameters = {}    
+        self.expressions = {}   # consultas M compartidas (expression que no son parámetros)
+        # "columns" guarda pares (tabla, columna): columnas homónimas de tablas distintas no colisionan
         self.global_objects = {"tables": set(), "measures": set(), "columns": set()}
+        self.column_index = {}  # (tabla, columna) -> Column
+        self._next_column_id = 0
 
-    def parse_model(self):
+    def parse_model(self, jobs=1, cache=None):
+        """
+        jobs: número de procesos para parsear los archivos TMDL. Con jobs > 1 cada
+        archivo se parsea de forma aislada y los resultados se combinan en el orden
+        de descubrimiento, por lo que el modelo resultante es idéntico al serial.
+        cache: ParseCache opcional. Solo se reparsean los archivos modificados y, si no
+        ha cambiado ninguno, se carga directamente el snapshot del modelo completo.
+        """
         print(f"Iniciando análisis en: {self.root}")
         if not os.path.exists(self.root):
             print(f"ERROR: La ruta no existe: {self.root}")
             return
 
-        # 1. Relaciones
         rel_file = os.path.join(self.root, "relationships.tmdl")
-        if os.path.exists(rel_file):
-            self._parse_relationships(rel_file)
-        
-        # 2. Archivos TMDL
         all_files = []
         for subdir, dirs, files in os.walk(self.root):
             for file in files:
                 if file.endswith('.tmdl') and "relationships.tmdl" not in file:
                     all_files.append(os.path.join(subdir, file))
-
         print(f"Archivos TMDL encontrados: {len(all_files)}")
-        for file_path in all_files:
-            self._parse_file(file_path)
+        metrics.count("tmdl.archivos", len(all_files))
+        if metrics.enabled: metrics.count("tmdl.bytes", sum(os.path.getsize(fp) for fp in all_files))
+
+        tracked = all_files + ([rel_file] if os.path.exists(rel_file) else [])
+        if cache is not None:
+            snapshot = cache.get_snapshot("tmdl-model", PARSER_VERSION, self.root, tracked)
+            if snapshot is not None:
+                for attr in SNAPSHOT_FIELDS: setattr(self, attr, snapshot[attr])
+                # Los ids de columna siguen después de los del snapshot (por si se combinan más parciales)
+                self._next_column_id = max((col.id for col in self.column_index.values()), default=-1) + 1
+                print(f"Modelo cargado desde caché: {len(self.tables)} tablas, {len(self.measures)} medidas y {len(self.parameters)} parámetros.")
+                return
+
+        # 1. Relaciones
+        if os.path.exists(rel_file):
+            with metrics.stage("relaciones"): self.relationships.extend(read_relationships(rel_file, cache))
+        
+        # 2. Archivos TMDL
+        with metrics.stage("archivos_tmdl"): partials = parse_files(all_files, jobs, cache)
+        with metrics.stage("combinar"):
+            for partial in partials:
+                self._merge_partial(partial)
+        metrics.count("modelo.tablas", len(self.tables)); metrics.count("modelo.medidas", len(self.measures))
+
+        if cache is not None:
+            cache.put_snapshot("tmdl-model", PARSER_VERSION, self.root, tracked,
+                               {attr: getattr(self, attr) for attr in SNAPSHOT_FIELDS})
             
         print(f"Modelo ingestados: {len(self.tables)} tablas, {len(self.measures)} medidas y {len(self.parameters)} parámetros.")
 
-    def _parse_relationships(self, file_path):
-        try:
+    def add_relationships(self, content):
+        """Añade las relaciones de un texto TMDL (relationships.tmdl ya leído)."""
+        for rel in relationships_from_tmdl(content):
+            rel.id = len(self.relationships)
+            self.relationships.append(rel)
+
+    def relationship_graph(self):
+        """RelationshipGraph de las relaciones del modelo (adyacencia y diagnóstico de caminos de filtro)."""
+        return RelationshipGraph(self.relationships, self.tables)
+
+    def load_partials(self, partials, relationships=(), quiet=False):
+        """Construye el modelo a partir de resultados parciales ya parseados (p. ej. modo lote)."""
+        self.relationships.extend(relationships)
+        for partial in partials:
+            self._merge_partial(partial)
+        if not quiet: print(f"Modelo ingestados: {len(self.tables)} tablas, {len(self.measures)} medidas y {len(self.parameters)} parámetros.")
+
+    def _merge_partial(self, partial):
+        """Vuelca el resultado parcial de un archivo sobre el modelo compartido."""
+        for name, table in partial["tables"].items():
+            table.name = intern_name(name)
+            table.id = self.tables[name].id if name in self.tables else len(self.tables)
+            self.tables[table.name] = table
+            self.global_objects["tables"].add(table.name)
+            for col in table.columns:
+                col.name = intern_name(col.name); col.table = table.name
+                col.id = self._next_column_id; self._next_column_id += 1
+                key = (table.name, col.name)   # misma tupla para el índice y para global_objects
+                self.column_index[key] = col
+                self.global_objects["columns"].add(key)
+        for name, measure in partial["measures"].items():
+            measure.name = intern_name(name); measure.home_table = intern_name(measure.home_table)
+            measure.id = self.measures[name].id if name in self.measures else len(self.measures)
+            self.measures[measure.name] = measure
+            self.global_objects["measures"].add(measure.name)
+        self.parameters.update(partial["parameters"])
+        self.expressions.update(partial["expressions"])
+
+
+# ==============================================================================
+# RELACIONES (funciones de módulo: diff, lote, vigilancia e historial las leen sin montar un TmdlParser)
+# ==============================================================================
+def split_tmdl_ref(ref_str):
+    """'Tabla'.'Columna' o Tabla.Columna -> (tabla, columna); los nombres entre comillas pueden contener puntos."""
+    ref_str = ref_str.strip()
+    if ref_str.startswith("'"): table, rest = split_declaration_name(ref_str)
+    else:
+        table, dot, rest = ref_str.partition(".")
+        rest = dot + rest
+    if not rest.startswith("."): return table.strip(), "Unknown"
+    column = rest[1:].strip()
+    return table.strip(), split_declaration_name(column)[0] if column.startswith("'") else column
+
+def relationships_from_tmdl(content):
+    """Relaciones de un texto TMDL en una pasada con el lexer: cardinalidades, estado y dirección del filtro cruzado."""
+    relationships = []
+    for node in parse_tmdl(content).children_of("relationship"):
+        props = node.properties
+        if not props.get("fromColumn") or not props.get("toColumn"):
+            print(f"ADVERTENCIA: Relación '{node.name}' (línea {node.line}) sin fromColumn/toColumn: se omite.")
+            continue
+        t_origin, c_origin = split_tmdl_ref(props["fromColumn"])
+        t_dest, c_dest = split_tmdl_ref(props["toColumn"])
+        rel = Relationship(t_origin, c_origin, t_dest, c_dest,
+                           props.get("fromCardinality", "many"), props.get("toCardinality", "one"),
+                           props.get("isActive", "true").lower() != "false", node.name,
+                           props.get("crossFilteringBehavior", "oneDirection"))
+        rel.id = len(relationships)
+        relationships.append(rel)
+    return relationships
+
+def read_relationships(file_path, cache=None):
+    """Relaciones de un relationships.tmdl (con ParseCache opcional); lista vacía si no se puede leer."""
+    try:
+        if cache is not None:
+            hit, value = cache.lookup("tmdl-rel", PARSER_VERSION, file_path)
+            if hit: return value
+            content = value.content.decode('utf-8')
+        else:
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
-            rel_blocks = re.split(r'relationship\s+[a-f0-9\-]+', content)[1:]
-            for block in rel_blocks:
-                # Inicializamos con el orden deseado, aunque luego forzaremos el DataFrame
-                rel_data = {
-                    "Tabla Origen": "", 
-                    "Columna Origen": "",
-                    "Columna Destino": "",
-                    "Tabla Destino": "",
-                    "Tipo Relacion": "N -> 1",
-                    "Activo?": "Sí"
-                }
-                
-                from_col_match = re.search(r"fromColumn:\s*(.*)", block)
-                to_col_match = re.search(r"toColumn:\s*(.*)", block)
-                is_active_match = re.search(r"isActive:\s*(false|true)", block, re.IGNORECASE)
-                from_card = re.search(r"fromCardinality:\s*(\w+)", block)
-                to_card = re.search(r"toCardinality:\s*(\w+)", block)
-
-                if from_col_match and to_col_match:
-                    t_origin, c_origin = self._split_tmdl_ref(from_col_match.group(1).strip())
-                    t_dest, c_dest = self._split_tmdl_ref(to_col_match.group(1).strip())
-                    
-                    rel_data["Tabla Origen"] = t_origin
-                    rel_data["Columna Origen"] = c_origin
-                    rel_data["Tabla Destino"] = t_dest
-                    rel_data["Columna Destino"] = c_dest
-                    
-                    if is_active_match and is_active_match.group(1).lower() == 'false': 
-                        rel_data["Activo?"] = "No"
-                    
-                    fc = from_card.group(1) if from_card else "many"
-                    tc = to_card.group(1) if to_card else "one"
-                    
-                    if fc == "many" and tc == "many": rel_data["Tipo Relacion"] = "N -> N"
-                    elif fc == "one" and tc == "one": rel_data["Tipo Relacion"] = "1 -> 1"
-                    elif fc == "one" and tc == "many": rel_data["Tipo Relacion"] = "1 -> N"
-                    else: rel_data["Tipo Relacion"] = "N -> 1"
-                    
-                    self.relationships.append(rel_data)
-        except Exception: pass
-
-    def _split_tmdl_ref(self, ref_str):
-        if "." in ref_str:
-            parts = ref_str.split('.')
-            if len(parts) >= 2:
-                return ".".join(parts[:-1]).replace("'", "").strip(), parts[-1].replace("'", "").strip()
-        return ref_str, "Unknown"
-
-    def _parse_file(self, file_path):
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"ERROR: No se pudieron leer las relaciones de {file_path}: {e}")
+        return []
+    relationships = relationships_from_tmdl(content)
+    if cache is not None: cache.store("tmdl-rel", PARSER_VERSION, value, relationships)
+    return relationships
+
+
+# ==============================================================================
+# PARSING POR ARCHIVO (funciones de módulo para poder usarlas en un pool)
+# ==============================================================================
+def parse_files(all_files, jobs=1, cache=None):
+    """
+    Parciales de una lista de archivos TMDL en el mismo orden (reutilizando la ParseCache si se indica),
+    con un pool de procesos cuando jobs > 1 y hay archivos suficientes. Base de TmdlParser.parse_model
+    y del modelo incremental del modo vigilancia.
+    """
+    partials = [None] * len(all_files)
+    pending = []     # (índice, ruta o bytes ya leídos, FileState para guardar en caché)
+    for i, fp in enumerate(all_files):
+        if cache is None:
+            pending.append((i, fp, None)); continue
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.splitlines()
-        except: return
-
-        # Buscar la declaración 'table' en las primeras 20 líneas (para manejar comentarios)
-        table_line = None
-        for i, line in enumerate(lines[:20]):
-            stripped = line.strip()
-            if stripped.startswith("table"):
-                table_line = stripped
-                break
-        
-        if table_line:
-            self._parse_table_logic(table_line, lines, content)
-        elif "expression" in content:
-            self._parse_expression_logic(content)
-
-    def _parse_expression_logic(self, content):
-        for match in RX_EXPRESSION.finditer(content):
-            name = match.group(1).strip()
-            code = match.group(2).strip()
-            if code.startswith('"') and code.endswith('"') and "let" not in code:
-                self.parameters[name] = code.strip('"')
-
-    def _parse_table_logic(self, first_line, lines, full_content):
-        table_name = first_line.replace("table", "").strip().strip("'")
-        m_code = ""
-        source_search = re.search(r'\s+source\s*=\s*(?:```)?(.*)', full_content, re.DOTALL)
-        if source_search:
-            raw_code = source_search.group(1)
-            end_markers = ["\n\tcolumn", "\n\tmeasure", "\n\tpartition", "\n\thierarchy", "\n\tannotation"]
-            min_idx = len(raw_code)
-            for marker in end_markers:
-                idx = raw_code.find(marker)
-                if idx != -1 and idx < min_idx: min_idx = idx
-            m_code = raw_code[:min_idx].strip().replace('```', '')
-
-        self.tables[table_name] = {"columns": [], "m_code": m_code}
-        self.global_objects["tables"].add(table_name)
-        
-        current_measure = None
-        in_measure_exp = False
-        for line in lines:
-            stripped = line.strip()
-            if not stripped: continue
-            if stripped.startswith("column"):
-                col_name = stripped.replace("column", "", 1).split("dataType:")[0].strip().strip("'").strip('"')
-                self.tables[table_name]["columns"].append(col_name)
-                self.global_objects["columns"].add(col_name)
-                in_measure_exp = False; current_measure = None
-                continue
-            if stripped.startswith("measure"):
-                in_measure_exp = True
-                parts = stripped.split("=", 1)
-                m_part = parts[0].replace("measure", "").strip().strip("'")
-                self.measures[m_part] = {"expression": parts[1].strip() if len(parts)>1 else "", "home_table": table_name}
-                self.global_objects["measures"].add(m_part); current_measure = m_part
-                continue
-            if in_measure_exp and current_measure:
-                if any(stripped.startswith(k) for k in ["column", "measure", "partition", "hierarchy"]):
-                    in_measure_exp = False; current_measure = None
-                elif ":" in stripped and "=" not in stripped: pass
-                else: self.measures[current_measure]["expression"] += " " + stripped
+            hit, value = cache.lookup("tmdl", PARSER_VERSION, fp)
+        except OSError:
+            partials[i] = _empty_partial(); continue
+        if hit: partials[i] = value
+        else: pending.append((i, value.content, value))
+    if cache is not None and all_files:
+        print(f"Caché: {len(all_files) - len(pending)} archivos sin cambios, {len(pending)} a parsear.")
+
+    sources = [src for _, src, _ in pending]
+    metrics.count("tmdl.archivos_parseados", len(sources))
+    for (i, _, state), partial in zip(pending, _run_parse_jobs(sources, jobs)):
+        partials[i] = partial
+        if state is not None: cache.store("tmdl", PARSER_VERSION, state, partial)
+    return partials
+
+def _run_parse_jobs(sources, jobs):
+    # Para modelos pequeños el arranque del pool cuesta más de lo que ahorra
+    if jobs <= 1 or len(sources) < PARALLEL_MIN_FILES:
+        return [_parse_source(src) for src in sources]
+    workers = min(jobs, len(sources))
+    chunksize = max(1, len(sources) // (workers * 4))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() conserva el orden de entrada: el merge es determinista
+            return list(pool.map(_parse_source, sources, chunksize=chunksize))
+    except (OSError, BrokenProcessPool) as e:
+        print(f"ADVERTENCIA: Pool de procesos no disponible ({e}). Parseando en serie.")
+        return [_parse_source(src) for src in sources]
+
+def _empty_partial():
+    return {"tables": {}, "measures": {}, "parameters": {}, "expressions": {}}
+
+def parse_tmdl_file(file_path):
+    """
+    Parsea un único archivo TMDL sin tocar estado compartido.
+    Devuelve un resultado parcial autocontenido (y serializable con pickle)
+    que TmdlParser._merge_partial combina con el resto del modelo.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except: return _empty_partial()
+    return parse_tmdl_bytes(data)
+
+def parse_tmdl_bytes(data):
+    """Decodifica y parsea un archivo TMDL ya leído (los offsets del árbol son sobre estos bytes)."""
+    try: content = data.decode('utf-8')
+    except UnicodeDecodeError: return _empty_partial()
+    return parse_tmdl_content(content)
+
+def _parse_source(source):
+    # Trabajo del pool: una ruta o los bytes ya leídos por la caché
+    return parse_tmdl_bytes(source) if isinstance(source, bytes) else parse_tmdl_file(source)
+
+def parse_tmdl_content(content):
+    """Igual que parse_tmdl_file pero a partir del texto ya leído."""
+    partial = _empty_partial()
+    for node in parse_tmdl(content).children:
+        if node.kind == "table": _parse_table_node(partial, node)
+        elif node.kind == "expression": _parse_expression_node(partial, node)
+    return partial
+
+def _parse_expression_node(partial, node):
+    code = RX_META_SUFFIX.sub("", node.expression).strip()
+    if code.startswith('"') and code.endswith('"') and "let" not in code:
+        partial["parameters"][node.name] = code.strip('"')
+    elif "IsParameterQuery" not in node.expression:
+        partial["expressions"][node.name] = code
+
+def _parse_table_node(partial, table):
+    # El código M (o DAX de tablas calculadas) es el 'source' de la primera partición
+    m_code = ""
+    for partition in table.partitions:
+        if partition.source:
+            m_code = partition.source
+            break
+
+    columns = [Column(col.name, table.name, col.data_type, col.expression, col.source_column)
+               for col in table.columns]
+    # Jerarquías de usuario: cada nivel apunta a una columna de la tabla ('column: Año')
+    hierarchies = {h.name: {lvl.name: intern_name(split_declaration_name(lvl.properties["column"])[0])
+                            for lvl in h.levels if lvl.properties.get("column")}
+                   for h in table.hierarchies}
+    partial["tables"][table.name] = Table(table.name, m_code, columns, hierarchies)
+    for measure in table.measures:
+        partial["measures"][measure.name] = Measure(measure.name, measure.expression, table.name)
@@ -1,9 +1,84 @@
 import pandas as pd
 
+# Tipos de campo de visual que se cruzan con medidas; el resto se busca como columna de su tabla
+MEASURE_KINDS = {"Medida", "Filtro Visual (Medida)"}
+UNCERTAIN_KIND = "Incierto (Posible Medida)"
+# Nivel de una jerarquía de usuario: el campo es 'Jerarquía.Nivel' y cuenta como uso de la columna del nivel
+HIERARCHY_LEVEL_KIND = "Jerarquía (Nivel)"
+
+
+class SymbolIndex:
+    """
+    Índice hash de los símbolos del modelo (columnas y medidas) con su fila en el inventario.
+    Se construye una vez por modelo y se reutiliza para todos los informes que lo consultan:
+    - columnas por (tabla, columna) y medidas por nombre (únicas en el modelo), sin distinguir mayúsculas
+    - por nombre, para los campos sin tabla conocida (solo se atribuyen si el nombre es único)
+    - niveles de jerarquía por (tabla, 'jerarquía.nivel'), apuntando a la fila de la columna del nivel
+    """
+    def __init__(self, model):
+        self.rows = {"Tabla": [], "Nombre Objeto": [], "Tipo": [], "Ubicacion": []}
+        self.columns, self.measures, self.by_name, self.levels = {}, {}, {}, {}
+        for tbl_name, data in model.tables.items():
+            for col in data.get("columns", []):
+                self.columns[(tbl_name.lower(), col.lower())] = self._add(tbl_name, col, "Columna", f"{tbl_name}[{col}]")
+            for hierarchy, levels in (getattr(data, "hierarchies", None) or {}).items():
+                for level, column in levels.items():
+                    pos = self.columns.get((tbl_name.lower(), column.lower()))
+                    if pos is not None: self.levels[(tbl_name.lower(), f"{hierarchy}.{level}".lower())] = pos
+        for meas_name, data in model.measures.items():
+            self.measures[meas_name.lower()] = self._add(data.get("home_table", "Desconocida"), meas_name, "Medida", f"[{meas_name}]")
+
+    def _add(self, table, name, kind, location):
+        pos = len(self.rows["Tabla"])
+        for key, value in (("Tabla", table), ("Nombre Objeto", name), ("Tipo", kind), ("Ubicacion", location)):
+            self.rows[key].append(value)
+        self.by_name.setdefault(name.lower(), []).append(pos)
+        return pos
+
+    def __len__(self):
+        return len(self.rows["Tabla"])
+
+    def resolve(self, table, field, kind):
+        """Fila del inventario de un campo (tabla, campo, tipo) de un visual, o None si no está en el modelo."""
+        if not isinstance(field, str) or not field: return None
+        name = field.lower()
+        if kind == HIERARCHY_LEVEL_KIND:
+            return self.levels.get((table.lower(), name)) if isinstance(table, str) else None
+        if kind in MEASURE_KINDS or kind == UNCERTAIN_KIND:
+            pos = self.measures.get(name)
+            if pos is not None or kind in MEASURE_KINDS: return pos
+        if isinstance(table, str) and table:
+            return self.columns.get((table.lower(), name))
+        if kind == UNCERTAIN_KIND:
+            # queryRef sin definición: 'Tabla.Campo' (la tabla o el campo pueden llevar puntos)
+            for i, char in enumerate(name):
+                if char == "." and (name[:i], name[i + 1:]) in self.columns: return self.columns[(name[:i], name[i + 1:])]
+        candidates = self.by_name.get(name, ())
+        return candidates[0] if len(candidates) == 1 else None
+
+    def count_usage(self, df_visuals):
+        """(conteo de visuales por fila del inventario, campos sin objeto en el modelo): una búsqueda por clave distinta."""
+        counts, unresolved = [0] * len(self), 0
+        df = df_visuals
+        if 'Valor' not in df.columns or df.empty: return counts, unresolved
+        keys = pd.DataFrame({
+            "Tabla": df['Tabla'] if 'Tabla' in df.columns else None,
+            "Campo": df['Campo'] if 'Campo' in df.columns else df['Valor'],
+            "Tipo": df['Tipo_Valor'] if 'Tipo_Valor' in df.columns else None,
+        }).value_counts(dropna=False)
+        for (table, field, kind), n in keys.items():
+            pos = self.resolve(table, field, kind)
+            if pos is None: unresolved += n
+            else: counts[pos] += n
+        return counts, unresolved
+
+
 class UsageIntegrator:
-    def __init__(self, visuals_df: pd.DataFrame, model_parser):
+    def __init__(self, visuals_df: pd.DataFrame, model_parser, index: SymbolIndex = None):
         self.df_visuals = visuals_df
         self.model = model_parser
+        # Índice ya construido para este modelo (p. ej. compartido entre varios informes)
+        self.index = index
 
     def generate_inventory_sheet(self) -> pd.DataFrame:
         """Crea una hoja maestra cruzando el modelo con el uso visual"""
@@ -11,52 +86,20 @@ class UsageIntegrator:
             return pd.DataFrame()
 
         print("Generando hoja de inventario y conteo de uso...")
-        
-        # 1. Contar uso en visuales
-        if 'Valor' in self.df_visuals.columns:
-            usage_counts = self.df_visuals['Valor'].value_counts().reset_index()
-            # Pandas v2 usa 'count' o el nombre original, aseguramos nombres:
-            usage_counts.columns = ['Nombre Objeto', 'Conteo Visuales']
-        else:
-            usage_counts = pd.DataFrame(columns=['Nombre Objeto', 'Conteo Visuales'])
-
-        # 2. Construir inventario completo desde el modelo
-        inventory_rows = []
-
-        # A) Columnas
-        for tbl_name, data in self.model.tables.items():
-            for col in data.get("columns", []):
-                inventory_rows.append({
-                    "Tabla": tbl_name,
-                    "Nombre Objeto": col,
-                    "Tipo": "Columna",
-                    "Ubicacion": f"{tbl_name}[{col}]"
-                })
-        
-        # B) Medidas
-        for meas_name, data in self.model.measures.items():
-            inventory_rows.append({
-                "Tabla": data.get("home_table", "Desconocida"),
-                "Nombre Objeto": meas_name,
-                "Tipo": "Medida",
-                "Ubicacion": f"[{meas_name}]"
-            })
-
-        df_inventory = pd.DataFrame(inventory_rows)
-
-        if df_inventory.empty:
-            return df_inventory
-
-        # 3. Cruce (Left Join)
-        df_final = pd.merge(df_inventory, usage_counts, on='Nombre Objeto', how='left')
-        
-        # Rellenar nulos con 0
-        df_final['Conteo Visuales'] = df_final['Conteo Visuales'].fillna(0).astype(int)
-        
-        # --- CAMBIO DE ORDENACIÓN AQUÍ ---
+
+        # 1. Inventario completo del modelo (columnas y medidas) desde el índice
+        if self.index is None: self.index = SymbolIndex(self.model)
+        df_final = pd.DataFrame(self.index.rows)
+        if df_final.empty:
+            return df_final
+
+        # 2. Conteo por campo calificado: Tabla[Columna] cuenta solo en su tabla
+        counts, unresolved = self.index.count_usage(self.df_visuals)
+        df_final['Conteo Visuales'] = counts
+        if unresolved: print(f"   {unresolved} campos de visuales no corresponden a ningún objeto del modelo.")
+
         # Primero por 'Tabla' (Ascendente A-Z)
         # Luego por 'Conteo Visuales' (Descendente: los más usados arriba)
         df_final = df_final.sort_values(by=['Tabla', 'Conteo Visuales'], ascending=[True, False])
-        # ---------------------------------
 
         return df_final
@@ -20,6 +20,43 @@ class DataExtractor:
         results.extend(filters)
         return results
 
+    @staticmethod
+    def _source_entity(expression: Optional[Dict[str, Any]], aliases: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """Tabla de {'SourceRef': {'Entity' | 'Source'}}; 'Source' es un alias del From (legacy y filtros)."""
+        ref = (expression or {}).get('SourceRef', {})
+        if ref.get('Entity'): return ref['Entity']
+        source = ref.get('Source')
+        return (aliases or {}).get(source, source)
+
+    @staticmethod
+    def field_ref(field_def: Dict[str, Any], aliases: Optional[Dict[str, str]] = None):
+        """
+        (tabla, campo, tipo) de una definición Column/Measure/Aggregation/HierarchyLevel de Power BI.
+        Un nivel de jerarquía de usuario se devuelve como 'Jerarquía.Nivel' con tipo "Jerarquía (Nivel)":
+        no es una columna, SymbolIndex lo resuelve con la definición de la jerarquía en el modelo.
+        """
+        if 'Measure' in field_def:
+            measure = field_def['Measure']
+            return DataExtractor._source_entity(measure.get('Expression'), aliases), measure.get('Property'), "Medida"
+        if 'Column' in field_def:
+            column = field_def['Column']
+            return DataExtractor._source_entity(column.get('Expression'), aliases), column.get('Property'), "Columna"
+        if 'Aggregation' in field_def:
+            # Sum(Tabla.Columna): el campo real es la columna agregada
+            table, field, _ = DataExtractor.field_ref(field_def['Aggregation'].get('Expression', {}), aliases)
+            return table, field, "Columna (Agregada)"
+        if 'HierarchyLevel' in field_def:
+            level = field_def['HierarchyLevel']
+            hierarchy = level.get('Expression', {}).get('Hierarchy', {}).get('Expression', {})
+            variation = hierarchy.get('PropertyVariationSource')
+            if variation:
+                # Jerarquía de fechas automática: el campo del modelo es la columna de fecha
+                return DataExtractor._source_entity(variation.get('Expression'), aliases), variation.get('Property'), "Jerarquía"
+            name = level.get('Expression', {}).get('Hierarchy', {}).get('Hierarchy')
+            field = f"{name}.{level.get('Level')}" if name and level.get('Level') else None
+            return DataExtractor._source_entity(hierarchy, aliases), field, "Jerarquía (Nivel)"
+        return None, None, "Desconocido"
+
     @staticmethod
     def _analyze_legacy(config: Dict[str, Any]) -> List:
         results = []
@@ -27,22 +64,15 @@ class DataExtractor:
         try:
             proto_query = config.get('singleVisual', {}).get('prototypeQuery', {})
             select_items = proto_query.get('Select', [])
+            # Alias del From (t0, t1...) -> tabla
+            aliases = {f.get('Name'): f.get('Entity') for f in proto_query.get('From', [])}
             
             for item in select_items:
                 name = item.get('Name')
-                if 'Measure' in item:
-                    display_name = item['Measure'].get('Property', name)
-                    type_val = "Medida"
-                elif 'Column' in item:
-                    display_name = item['Column'].get('Property', name)
-                    type_val = "Columna"
-                elif 'Aggregation' in item:
-                    display_name = item.get('Name')
-                    type_val = "Columna (Agregada)"
-                else:
-                    display_name = name
-                    type_val = "Desconocido"
-                definitions_map[name] = {'real_name': display_name, 'type': type_val}
+                table, field, type_val = DataExtractor.field_ref(item, aliases)
+                if type_val in ("Medida", "Columna"): display_name = field or name
+                else: display_name = name
+                definitions_map[name] = {'real_name': display_name, 'type': type_val, 'table': table, 'field': field or display_name}
                 
             projections = config.get('singleVisual', {}).get('projections', {})
             for role, refs in projections.items():
@@ -50,9 +80,10 @@ class DataExtractor:
                     query_ref = ref.get('queryRef')
                     if query_ref in definitions_map:
                         def_data = definitions_map[query_ref]
-                        results.append({'Valor': def_data['real_name'], 'Tipo_Valor': def_data['type']})
+                        results.append({'Valor': def_data['real_name'], 'Tipo_Valor': def_data['type'],
+                                        'Tabla': def_data['table'], 'Campo': def_data['field']})
                     else:
-                        results.append({'Valor': query_ref, 'Tipo_Valor': "Incierto (Posible Medida)"})
+                        results.append({'Valor': query_ref, 'Tipo_Valor': "Incierto (Posible Medida)", 'Tabla': None, 'Campo': query_ref})
         except Exception: pass
         return results
 
@@ -66,24 +97,13 @@ class DataExtractor:
                 for proj in projections:
                     query_ref = proj.get('queryRef')
                     field_def = proj.get('field', {})
+                    table, field, type_val = DataExtractor.field_ref(field_def)
                     
-                    if 'Measure' in field_def:
-                        type_val = "Medida"
-                        real_name = field_def['Measure'].get('Property', query_ref)
-                    elif 'Column' in field_def:
-                        type_val = "Columna"
-                        real_name = field_def['Column'].get('Property', query_ref)
-                    elif 'Aggregation' in field_def:
-                        type_val = "Columna (Agregada)"
-                        real_name = query_ref
-                    elif 'HierarchyLevel' in field_def:
-                         type_val = "Jerarquía"
-                         real_name = field_def['HierarchyLevel'].get('Level', query_ref)
-                    else:
-                        type_val = "Desconocido"
-                        real_name = query_ref
+                    if type_val in ("Medida", "Columna"): real_name = field or query_ref
+                    elif type_val in ("Jerarquía", "Jerarquía (Nivel)"): real_name = field_def['HierarchyLevel'].get('Level', query_ref)
+                    else: real_name = query_ref
                         
-                    results.append({'Valor': real_name, 'Tipo_Valor': type_val})
+                    results.append({'Valor': real_name, 'Tipo_Valor': type_val, 'Tabla': table, 'Campo': field or real_name})
         except Exception: pass
         return results
 
@@ -114,20 +134,18 @@ class DataExtractor:
             filter_def = filter_prop.get('filter')
             if not filter_def: return []
 
+            aliases = {f.get('Name'): f.get('Entity') for f in filter_def.get('From', [])}
             where_clauses = filter_def.get('Where', [])
             for clause in where_clauses:
                 condition = clause.get('Condition', {})
                 if 'In' in condition:
                     exprs = condition['In'].get('Expressions', [])
                     for expr in exprs:
-                        if 'Column' in expr:
-                            col_name = expr['Column'].get('Property')
-                            if col_name:
-                                filters_found.append({'Valor': col_name, 'Tipo_Valor': 'Filtro Visual'})
-                        elif 'Measure' in expr:
-                             meas_name = expr['Measure'].get('Property')
-                             if meas_name:
-                                filters_found.append({'Valor': meas_name, 'Tipo_Valor': 'Filtro Visual (Medida)'})
+                        if 'Column' in expr or 'Measure' in expr:
+                            table, name, kind = DataExtractor.field_ref(expr, aliases)
+                            if name:
+                                filters_found.append({'Valor': name, 'Tipo_Valor': 'Filtro Visual' if kind == "Columna" else 'Filtro Visual (Medida)',
+                                                      'Tabla': table, 'Campo': name})
         except Exception: pass
         return filters_found
 
@@ -0,0 +1,147 @@
+import os
+import time
+import traceback
+from .tmdl_parser import TmdlParser, parse_files, parse_tmdl_file, read_relationships
+from .excel_manager import ExcelManager
+
+# Segundos entre comprobaciones de las carpetas vigiladas
+POLL_INTERVAL = 0.5
+# Espera tras detectar un cambio hasta que la carpeta deja de cambiar (los editores guardan en varios pasos)
+DEBOUNCE = 0.1
+WATCH_EXTENSIONS = (".tmdl", ".json")
+
+
+class FolderPoller:
+    """
+    Detecta cambios en varias carpetas comparando mtime y tamaño de sus archivos .tmdl/.json.
+    Sondeo en lugar de inotify: funciona igual en Windows, OneDrive y unidades de red.
+    """
+    def __init__(self, roots, extensions=WATCH_EXTENSIONS):
+        self.roots = [r for r in roots if r and os.path.isdir(r)]
+        self.extensions = extensions
+        self.state = self._snapshot()
+
+    def _snapshot(self):
+        state = {}
+        for root in self.roots:
+            for subdir, dirs, files in os.walk(root):
+                for name in files:
+                    if not name.endswith(self.extensions): continue
+                    path = os.path.join(subdir, name)
+                    try: st = os.stat(path)
+                    except OSError: continue
+                    state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def poll(self):
+        """Rutas añadidas, modificadas o eliminadas desde la última llamada."""
+        current = self._snapshot()
+        changed = {p for p in current.keys() | self.state.keys() if current.get(p) != self.state.get(p)}
+        self.state = current
+        return changed
+
+
+class IncrementalModel:
+    """
+    Modelo semántico en memoria entre cambios: guarda el resultado parcial de cada archivo TMDL y,
+    ante un cambio, reparsea solo los archivos tocados y recombina el modelo (la combinación no
+    vuelve a parsear nada). self.model es siempre un TmdlParser completo.
+    """
+    def __init__(self, root, jobs=1, cache=None):
+        self.root = root
+        self.jobs = jobs
+        self.cache = cache
+        self.partials = {}      # ruta -> resultado parcial de parse_tmdl_file
+        self.relationships = []
+        self.model = None
+
+    def _files(self):
+        files = []
+        for subdir, dirs, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.tmdl') and "relationships.tmdl" not in name: files.append(os.path.join(subdir, name))
+        rel_file = os.path.join(self.root, "relationships.tmdl")
+        return files, rel_file if os.path.exists(rel_file) else None
+
+    def load(self):
+        """Primer parseo completo (con la caché persistente, si se indicó)."""
+        print(f"Iniciando análisis en: {self.root}")
+        files, rel_file = self._files()
+        print(f"Archivos TMDL encontrados: {len(files)}")
+        self.relationships = read_relationships(rel_file, self.cache) if rel_file else []
+        self.partials = dict(zip(files, parse_files(files, self.jobs, self.cache)))
+        self._build(files)
+        return self.model
+
+    def refresh(self, changed):
+        """Reparsea los archivos TMDL de changed que estén bajo la carpeta del modelo; False si no había ninguno."""
+        root = os.path.join(os.path.abspath(self.root), "")
+        touched = [p for p in changed if p.endswith('.tmdl') and os.path.abspath(p).startswith(root)]
+        if not touched: return False
+        files, rel_file = self._files()
+        if any("relationships.tmdl" in os.path.basename(p) for p in touched):
+            self.relationships = read_relationships(rel_file) if rel_file else []
+        current = set(files)
+        for path in touched:
+            if path in current: self.partials[path] = parse_tmdl_file(path)
+        # Archivos nuevos que no llegaron como cambio y archivos eliminados
+        self.partials = {f: self.partials[f] if f in self.partials else parse_tmdl_file(f) for f in files}
+        self._build(files)
+        return True
+
+    def _build(self, files):
+        # Nuevo TmdlParser combinando los parciales en el orden de descubrimiento (igual que parse_model)
+        model = TmdlParser(self.root)
+        model.load_partials([self.partials[f] for f in files], list(self.relationships))
+        self.model = model
+
+
+class SheetRefresher:
+    """
+    Escribe la salida solo cuando cambian sus hojas. En xlsx se reescribe el libro entero;
+    en csv/parquet (un archivo por hoja) solo los archivos de las hojas que han cambiado.
+    """
+    def __init__(self, output_path, output_format="xlsx"):
+        self.output_path = output_path
+        self.output_format = output_format
+        self.previous = {}
+
+    @staticmethod
+    def _same(a, b):
+        return a.shape == b.shape and list(a.columns) == list(b.columns) and a.equals(b)
+
+    def write(self, sheets):
+        changed = [n for n, df in sheets.items() if n not in self.previous or not self._same(df, self.previous[n])]
+        self.previous = dict(sheets)
+        if not changed:
+            print("Sin cambios en las hojas de salida.")
+            return changed
+        print(f"Hojas modificadas: {', '.join(changed)}")
+        target = sheets if self.output_format == "xlsx" else {n: sheets[n] for n in changed}
+        ExcelManager(self.output_path, self.output_format).write_sheets(target)
+        return changed
+
+
+def watch(poller, on_change, interval=POLL_INTERVAL):
+    """Bucle de vigilancia: llama a on_change(rutas cambiadas) tras cada cambio hasta Ctrl+C."""
+    print(f"\nModo vigilancia: comprobando cambios cada {interval} s en {', '.join(poller.roots)} (Ctrl+C para salir).")
+    try:
+        while True:
+            time.sleep(interval)
+            changed = poller.poll()
+            if not changed: continue
+            while True:
+                time.sleep(DEBOUNCE)
+                more = poller.poll()
+                if not more: break
+                changed |= more
+            names = sorted(os.path.basename(p) for p in changed)
+            print(f"\nCambios en {len(changed)} archivo(s): {', '.join(names[:5])}{' ...' if len(names) > 5 else ''}")
+            start = time.perf_counter()
+            try: on_change(changed)
+            except Exception as e:
+                print(f"ERROR: {e}")
+                traceback.print_exc()
+            print(f"Actualizado en {time.perf_counter() - start:.2f} s.")
+    except KeyboardInterrupt:
+        print("\nModo vigilancia terminado.")
@@ -1,8 +1,15 @@
+import argparse
 import os
 import pandas as pd
-from modules.report_logic import PBIPReport
-from modules.usage_integrator import UsageIntegrator
+from modules.report_logic import PBIPReport, IO_THREADS
+from modules.usage_integrator import SymbolIndex, UsageIntegrator
+from modules.multi_report import MultiReportAnalysis, discover_reports
 from modules.excel_manager import ExcelManager
+from modules.output_sinks import OUTPUT_FORMATS, missing_dependency
+from modules.audit_catalog import AuditCatalog, catalog_objects, DEFAULT_CATALOG_PATH
+from modules.parse_cache import MemoryCache, ParseCache, DEFAULT_CACHE_DIR
+from modules.watch import FolderPoller, IncrementalModel, SheetRefresher, POLL_INTERVAL, watch
+from modules.metrics import metrics, add_metrics_arguments, enable_from_args
 
 # IMPORTANTE: Intentamos importar la clase TmdlParser
 try:
@@ -20,64 +27,175 @@ input_report_path = r"C:\Users\uolv1a\OneDrive - Grupo Planeta\Documentos\Inform
 
 modelo_ruta = r"C:\Users\uolv1a\OneDrive - Grupo Planeta\Documentos\Informes PowerBi\Analizar\OBS\MODELO DATOS\MODELO DATOS OBS.SemanticModel\definition"
 
+# Varios informes contra el mismo modelo (rutas o globs de carpetas .Report; activable con --reports).
+# Si la lista no está vacía se ignora input_report_path
+informes = []
+
 # Output file
 
 output_file = "DOCUMENTACION UCMA SC.xlsx"
+# Formato de salida: "xlsx", "csv" o "parquet" (carpeta con un archivo por hoja)
+formato_salida = "xlsx"
+# Catálogo SQLite con el historial (None = no registrar; activable con --catalog)
+catalogo = None
+
+# Caché persistente de parseo (compartida con main.py). Desactivable con --no-cache
+usar_cache = True
+cache_dir = DEFAULT_CACHE_DIR
+# Hilos para leer los visual.json en paralelo (más hilos compensan la latencia de OneDrive/red)
+hilos_lectura = IO_THREADS
+
+def hojas_informe(raw_data, model_parser=None, index=None):
+    """Hojas de un informe: detalle de visuales, inventario con su uso (si hay modelo) y resumen por página."""
+    df_visuals = pd.DataFrame(raw_data)
+
+    # Ordenar y limpiar DF Visuales
+    columnas_finales = ['Nombre_Pag', 'Titulo', 'Objeto Visual', 'Tabla', 'Valor', 'Tipo_Valor']
+    for col in columnas_finales + ['Campo']:
+        if col not in df_visuals.columns: df_visuals[col] = None
+    # 'Campo' (nombre real en el modelo) solo se usa para el cruce con el inventario
+    df_fields = df_visuals
+    df_visuals = df_visuals[columnas_finales]
+
+    df_inventory = pd.DataFrame()
+    if model_parser is not None:
+        df_inventory = UsageIntegrator(df_fields, model_parser, index).generate_inventory_sheet()
+
+    # Hoja 3 (Opcional): Resumen por página
+    pivot_pag = df_visuals.pivot_table(index='Nombre_Pag', values='Valor', aggfunc='count').reset_index()
+
+    return {
+        "Detalle Visuales": df_visuals,
+        "Inventario y Uso": df_inventory,
+        "Resumen Páginas": pivot_pag
+    }
+
+
+def vigilar_informe(args, cache, input_model_path):
+    """
+    Modo vigilancia (--watch): el modelo y los visuales leídos quedan en memoria. Un cambio en el modelo
+    reparsea solo sus archivos tocados; en el informe, solo se releen los visual.json/page.json modificados.
+    """
+    modelo = None
+    if TmdlParser and input_model_path and os.path.exists(input_model_path):
+        modelo = IncrementalModel(input_model_path, cache=cache)
+        modelo.load()
+    else:
+        print("Saltando análisis de inventario (Falta ruta del modelo o librería main.py)")
+    memoria = MemoryCache()
+    refresher = SheetRefresher(args.output, args.format)
+    estado = {"indice": SymbolIndex(modelo.model) if modelo else None}
+
+    def refrescar(cambios=None):
+        if modelo is not None and cambios is not None and modelo.refresh(cambios):
+            estado["indice"] = SymbolIndex(modelo.model)
+        raw_data = PBIPReport(input_report_path, cache=memoria, io_threads=args.io_threads).run()
+        refresher.write(hojas_informe(raw_data, modelo.model if modelo else None, estado["indice"]))
+
+    refrescar()
+    # Solo se vigila la carpeta del modelo si se ha cargado
+    carpetas = [input_report_path] + ([input_model_path] if modelo is not None else [])
+    watch(FolderPoller(carpetas), refrescar, args.watch)
+
+
+def analizar_varios_informes(args, cache, input_model_path):
+    """Modo multi-informe: el modelo se parsea una vez y los informes se leen en paralelo."""
+    rutas = discover_reports(args.reports)
+    if not rutas: raise SystemExit("ERROR: No se encontró ninguna carpeta *.Report.")
+    model_parser = None
+    if TmdlParser and input_model_path and os.path.exists(input_model_path):
+        print(f"Analizando modelo semántico en: {input_model_path}")
+        model_parser = TmdlParser(input_model_path)
+        with metrics.stage("parseo_modelo"): model_parser.parse_model(cache=cache)
+    else:
+        print("Saltando matriz de uso (Falta ruta del modelo o librería main.py)")
+
+    analysis = MultiReportAnalysis(rutas, model_parser, cache=cache, io_threads=args.io_threads)
+    analysis.run()
+    with metrics.stage("escritura_excel"): ExcelManager(args.output, args.format).write_sheets(analysis.sheets())
+
+    if args.catalog:
+        catalog = AuditCatalog(args.catalog)
+        try:
+            # Clave 'Nombre.Report' como en el modo de un informe ('Nombre (2).Report' si dos carpetas se llaman igual)
+            for name, df in analysis.reports.items():
+                sheets = {"Detalle Visuales": df, "Inventario y Uso": analysis.inventory(name)}
+                catalog.record_run(f"{name}.Report", catalog_objects(sheets),
+                                   source=analysis.paths[name], script="objetos_visuales.py --reports")
+        finally: catalog.close()
+
 
 # ==========================================
 # PUNTO DE ENTRADA
 # ==========================================
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Documentación de objetos visuales de un informe PBIP")
+    arg_parser.add_argument("--reports", nargs="+", default=informes, metavar="RUTA",
+                            help="Varias carpetas .Report (o globs) contra el mismo modelo: matriz de uso objeto x informe")
+    arg_parser.add_argument("--model", default=modelo_ruta, help="Carpeta definition del modelo semántico")
+    arg_parser.add_argument("--output", default=output_file, help="Archivo (o carpeta, para csv/parquet) de salida")
+    arg_parser.add_argument("--watch", nargs="?", type=float, const=POLL_INTERVAL, metavar="SEGUNDOS",
+                            help="Mantener informe y modelo en memoria y regenerar la salida con cada cambio (Ctrl+C para salir)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Ignorar la caché de parseo y releer todos los archivos")
+    arg_parser.add_argument("--cache-dir", default=cache_dir, help="Carpeta de la caché de parseo")
+    arg_parser.add_argument("--io-threads", type=int, default=hilos_lectura, help="Hilos de lectura de los visual.json (PBIR)")
+    arg_parser.add_argument("--format", choices=OUTPUT_FORMATS, default=formato_salida,
+                            help="Formato de salida: libro xlsx, o carpeta con un csv/parquet por hoja")
+    arg_parser.add_argument("--catalog", nargs="?", const=DEFAULT_CATALOG_PATH, default=catalogo, metavar="SQLITE",
+                            help="Registrar el uso en visuales en el catálogo histórico (consultas con catalogo.py)")
+    add_metrics_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if missing_dependency(args.format): raise SystemExit(f"ERROR: {missing_dependency(args.format)}")
+    enable_from_args(args, script="objetos_visuales.py", cache=usar_cache and not args.no_cache)
+    cache = ParseCache(args.cache_dir) if usar_cache and not args.no_cache else None
+
     # INPUTS
    
     
     # IMPORTANTE: Pedir ruta del modelo para la nueva hoja
     # Si main.py no está importado, esto fallará controladamente
     if TmdlParser:
-        input_model_path = modelo_ruta
+        input_model_path = args.model
     else:
         input_model_path = None
 
     try:
-        # 1. Ejecutar análisis visual
-        report = PBIPReport(input_report_path)
-        raw_data = report.run()
-        df_visuals = pd.DataFrame(raw_data)
-        
-        # Ordenar y limpiar DF Visuales
-        columnas_finales = ['Nombre_Pag', 'Titulo', 'Objeto Visual', 'Valor', 'Tipo_Valor']
-        for col in columnas_finales:
-            if col not in df_visuals.columns: df_visuals[col] = None
-        df_visuals = df_visuals[columnas_finales]
-
-        # 2. Ejecutar análisis de modelo e integración (Si es posible)
-        df_inventory = pd.DataFrame()
-        
-        if TmdlParser and input_model_path and os.path.exists(input_model_path):
-            print(f"Analizando modelo semántico en: {input_model_path}")
-            model_parser = TmdlParser(input_model_path)
-            model_parser.parse_model()
-            
-            integrator = UsageIntegrator(df_visuals, model_parser)
-            df_inventory = integrator.generate_inventory_sheet()
+        if args.reports:
+            analizar_varios_informes(args, cache, input_model_path)
+        elif args.watch is not None:
+            vigilar_informe(args, cache, input_model_path)
         else:
-            print("Saltando análisis de inventario (Falta ruta del modelo o librería main.py)")
-
-        
-        # 3. Escritura Excel
-        excel_mgr = ExcelManager(output_file)
-        
-        # Hoja 3 (Opcional): Resumen por página
-        pivot_pag = df_visuals.pivot_table(index='Nombre_Pag', values='Valor', aggfunc='count').reset_index()
-        
-        sheets = {
-            "Detalle Visuales": df_visuals,
-            "Inventario y Uso": df_inventory,
-            "Resumen Páginas": pivot_pag
-        }
-        excel_mgr.write_sheets(sheets)
+            # 1. Ejecutar análisis visual
+            report = PBIPReport(input_report_path, cache=cache, io_threads=args.io_threads)
+            with metrics.stage("informe"): raw_data = report.run()
+
+            # 2. Ejecutar análisis de modelo e integración (Si es posible)
+            model_parser = None
+            if TmdlParser and input_model_path and os.path.exists(input_model_path):
+                print(f"Analizando modelo semántico en: {input_model_path}")
+                model_parser = TmdlParser(input_model_path)
+                with metrics.stage("parseo_modelo"): model_parser.parse_model(cache=cache)
+            else:
+                print("Saltando análisis de inventario (Falta ruta del modelo o librería main.py)")
+            with metrics.stage("integracion"): sheets = hojas_informe(raw_data, model_parser)
+
+            # 3. Escritura Excel
+            excel_mgr = ExcelManager(args.output, args.format)
+            with metrics.stage("escritura_excel"): excel_mgr.write_sheets(sheets)
+
+            # 4. Catálogo histórico (clave: carpeta del informe, 'Nombre.Report', distinta de la del modelo)
+            if args.catalog:
+                report_name = os.path.basename(os.path.normpath(input_report_path))
+                catalog = AuditCatalog(args.catalog)
+                try: catalog.record_run(report_name, catalog_objects(sheets), source=input_report_path, script="objetos_visuales.py")
+                finally: catalog.close()
 
     except Exception as e:
         print(f"\nERROR CRÍTICO: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+    finally:
+        if cache is not None:
+            metrics.count("cache.aciertos", cache.hits); metrics.count("cache.fallos", cache.misses)
+            cache.close()
+        metrics.finish(args.metrics)
\ No newline at end of file
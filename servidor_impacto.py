@@ -0,0 +1,58 @@
+import argparse
+from modules.impact_server import ImpactService, ROUTES, make_server
+from modules.multi_report import discover_reports
+from modules.parse_cache import ParseCache, DEFAULT_CACHE_DIR
+from modules.report_logic import IO_THREADS
+from modules.watch import POLL_INTERVAL
+
+# ==============================================================================
+# CONFIGURACIÓN
+# ==============================================================================
+MODEL_PATH = r"C:\Ruta\A\Tu\Modelo.SemanticModel\definition"
+# Informes conectados al modelo (rutas o globs de carpetas .Report); lista vacía = solo el modelo
+REPORTS = []
+# Solo escucha en local: las consultas no llevan autenticación
+HOST = "127.0.0.1"
+PORT = 8765
+# Segundos entre comprobaciones de cambios en disco (0 = recargar solo con POST /recargar)
+POLL_SECONDS = POLL_INTERVAL * 4
+USE_CACHE = True
+CACHE_DIR = DEFAULT_CACHE_DIR
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local de consultas de impacto (modelo + informes) en HTTP/JSON")
+    parser.add_argument("--model", default=MODEL_PATH, help="Carpeta definition del modelo semántico")
+    parser.add_argument("--reports", nargs="*", default=REPORTS, metavar="RUTA", help="Carpetas .Report (o globs)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, metavar="SEGUNDOS",
+                        help="Intervalo de comprobación de cambios en disco (0 = desactivado)")
+    parser.add_argument("--io-threads", type=int, default=IO_THREADS, help="Hilos de lectura de los visual.json")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de parseo en la primera carga")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Carpeta de la caché de parseo")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    service = ImpactService(args.model, discover_reports(args.reports) if args.reports else [], args.io_threads)
+    cache = ParseCache(args.cache_dir) if USE_CACHE and not args.no_cache else None
+    try: service.load(cache)
+    finally:
+        if cache is not None: cache.close()
+    if args.poll > 0: service.watch(args.poll)
+
+    server = make_server(service, args.host, args.port)
+    base = f"http://{args.host}:{args.port}"
+    print(f"\nServidor de impacto en {base} (Ctrl+C para salir). Consultas:")
+    print(f"  {base}/estado")
+    for route, (param, _) in ROUTES.items(): print(f"  {base}{route}?{param}=...")
+    print(f"  POST {base}/recargar")
+    try: server.serve_forever()
+    except KeyboardInterrupt: print("\nServidor detenido.")
+    finally: server.server_close()
+
+
+if __name__ == "__main__":
+    main()